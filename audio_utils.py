@@ -2,10 +2,16 @@ import threading
 import numpy as np
 import pygame
 import pygame.mixer
+from event_loop import IO_LOOP
 
 class AudioManager:
-    def __init__(self):
+    # Higher priority sounds interrupt lower ones; lower ones never cut off higher ones
+    PRIORITIES = {'red': 3, 'yellow': 2, 'green': 1}
+
+    def __init__(self, logger, loop=IO_LOOP):
+        self.logger = logger
         self.enabled = True
+        self.loop = loop
         # Initialize pygame mixer
         pygame.mixer.init(frequency=44100, size=-16, channels=1, buffer=512)
         # Sound configurations: frequency in Hz, duration in ms
@@ -14,34 +20,75 @@ class AudioManager:
             'yellow': {'freq': 1000, 'duration': 300}, # Short for yellow
             'green': {'freq': 1200, 'duration': 300}   # Short for green
         }
+        # Synthesize every beep once so playback is just a channel switch
+        self.sounds = {color: self._make_beep(config['freq'], config['duration'])
+                       for color, config in self.sound_configs.items()}
+        self.channel = pygame.mixer.Channel(0)
+        self.current_color = None
+
+        # Playback runs on the shared I/O loop; only the most urgent pending request is kept,
+        # and at most one flush is scheduled however many requests arrive
+        self._pending = None
+        self._lock = threading.Lock()
 
     def play_sound(self, color):
         """Play beep for the given color if audio is enabled"""
-        if not self.enabled or color not in self.sound_configs:
+        if not self.enabled or color not in self.sounds:
             return
-        config = self.sound_configs[color]
-        # Play in a separate thread to avoid blocking the UI
-        threading.Thread(target=self._play_beep, args=(config['freq'], config['duration'])).start()
+        with self._lock:
+            scheduled = self._pending is not None
+            if not scheduled or self.PRIORITIES[color] >= self.PRIORITIES[self._pending]:
+                self._pending = color
+        if not scheduled:
+            self.loop.call_soon(self._flush)
+
+    def stop(self):
+        """Stop whatever is playing and drop any pending request."""
+        with self._lock:
+            self._pending = None
+        self.channel.stop()
+        self.current_color = None
+
+    def close(self):
+        """Drop pending requests and silence the channel."""
+        self.stop()
 
-    def _play_beep(self, freq, duration):
+    def _make_beep(self, freq, duration):
+        sample_rate, _, channels = pygame.mixer.get_init()
+        t = np.linspace(0, duration / 1000, int(sample_rate * duration / 1000), False)
+        wave = np.sin(freq * 2 * np.pi * t) * 0.5  # 0.5 for volume
+        # Convert to 16-bit signed integers
+        wave = (wave * 32767).astype(np.int16)
+        if channels > 1:
+            wave = np.ascontiguousarray(np.repeat(wave[:, None], channels, axis=1))
+        return pygame.sndarray.make_sound(wave)
+
+    def _flush(self):
+        with self._lock:
+            color, self._pending = self._pending, None
+        if color is None:
+            return
         try:
-            # Generate beep sound using numpy and pygame
-            sample_rate = 44100
-            t = np.linspace(0, duration / 1000, int(sample_rate * duration / 1000), False)
-            wave = np.sin(freq * 2 * np.pi * t) * 0.5  # 0.5 for volume
-            # Convert to 16-bit signed integers
-            wave = (wave * 32767).astype(np.int16)
-            # Create stereo by duplicating mono
-            wave = np.column_stack((wave, wave))
-            # Create pygame Sound object
-            sound = pygame.sndarray.make_sound(wave)
-            sound.play()
-        except Exception as e:
-            print(f"Error playing beep: {e}")
+            self._play(color)
+        except Exception:
+            self.logger.exception("Error playing %s beep", color)
+
+    def _play(self, color):
+        busy = self.channel.get_busy()
+        if busy and self.current_color is not None:
+            if color == self.current_color:
+                return  # Already playing, don't restart the tone
+            if self.PRIORITIES[color] < self.PRIORITIES[self.current_color]:
+                return  # Never cut off a more urgent sound
+        # Channel.play interrupts whatever the channel is playing
+        self.channel.play(self.sounds[color])
+        self.current_color = color
 
     def toggle_audio(self):
         """Toggle audio on/off"""
         self.enabled = not self.enabled
+        if not self.enabled:
+            self.stop()
         return self.enabled
 
     def is_enabled(self):
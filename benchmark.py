@@ -0,0 +1,176 @@
+"""
+Headless benchmark for TrafficLightDetector.
+
+Feeds a video file or a directory of images through the detector and reports
+per-stage timings, latency percentiles, throughput and peak memory.
+
+    python benchmark.py drive.mp4 --backend onnx --imgsz 416 --output bench.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import cv2
+from config import INFERENCE_BACKEND, MODEL_INPUT_SIZE
+from detector import TrafficLightDetector
+from latency import summarize
+from logger import setup_logger
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def iter_frames(source):
+    """Yield (frame, decode_ms) from a video file or an image directory."""
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            start = time.perf_counter()
+            frame = cv2.imread(os.path.join(source, name))
+            decode_ms = (time.perf_counter() - start) * 1000
+            if frame is not None:
+                yield frame, decode_ms
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {source}")
+    try:
+        while True:
+            start = time.perf_counter()
+            ret, frame = cap.read()
+            decode_ms = (time.perf_counter() - start) * 1000
+            if not ret:
+                return
+            yield frame, decode_ms
+    finally:
+        cap.release()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return None
+
+
+def run_benchmark(detector, frames, batch_size=1, warmup=3, max_frames=None):
+    """Run the detector over frames and collect timings in milliseconds.
+
+    Warm-up runs in whole batches: a batch that starts before `warmup`
+    frames have been processed is left out of every statistic, so with
+    --batch 4 --warmup 3 the first four frames are excluded. max_frames
+    counts measured frames only.
+    """
+    stages = {'decode': [], 'preprocess': [], 'inference': [], 'postprocess': []}
+    latencies = []
+    detections = 0
+    processed = 0
+    batch, decode_times = [], []
+    started = None
+
+    def flush():
+        nonlocal detections, processed
+        start = time.perf_counter()
+        results = detector.detect_batch(batch)
+        elapsed = (time.perf_counter() - start) * 1000
+        if processed >= warmup:
+            # Per-frame share of the batch so runs with different batch sizes compare
+            latencies.extend([elapsed / len(batch)] * len(batch))
+            stages['decode'].extend(decode_times)
+            for stage, ms in detector.last_timings.items():
+                if stage in stages:
+                    stages[stage].append(ms / len(batch))
+            detections += sum(len(boxes) for boxes in results)
+        processed += len(batch)
+        batch.clear()
+        decode_times.clear()
+
+    for frame, decode_ms in frames:
+        # processed only moves between batches, so a batch is measured or warm-up as a whole
+        measuring = processed >= warmup
+        if measuring and max_frames is not None and len(latencies) + len(batch) >= max_frames:
+            break
+        if measuring and started is None:
+            started = time.perf_counter()
+        batch.append(frame)
+        decode_times.append(decode_ms)
+        if len(batch) == batch_size:
+            flush()
+    if batch:
+        flush()
+
+    measured = len(latencies)
+    wall = time.perf_counter() - started if started else 0.0
+    return {
+        'frames': measured,
+        'detections': detections,
+        'fps': measured / wall if wall > 0 else None,
+        'latency_ms': summarize(latencies),
+        'stages_ms': {stage: summarize(values) for stage, values in stages.items()},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the traffic light detector offline.')
+    parser.add_argument('source', help='video file or directory of images')
+    parser.add_argument('--backend', default=INFERENCE_BACKEND)
+    parser.add_argument('--imgsz', type=int, default=MODEL_INPUT_SIZE)
+    parser.add_argument('--auto-select', action='store_true',
+                        help='use the model variant picked for this device instead of --backend/--imgsz')
+    parser.add_argument('--batch', type=int, default=1, help='frames per model call')
+    parser.add_argument('--warmup', type=int, default=3,
+                        help='frames excluded from the statistics, rounded up to whole batches')
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--output', default='benchmark.json', help='where to write the JSON report')
+    args = parser.parse_args(argv)
+
+    logger = setup_logger(level=logging.WARNING)
+    detector = TrafficLightDetector(logger, backend=args.backend, imgsz=args.imgsz, auto_select=args.auto_select)
+    if detector.model is None:
+        print("Model failed to load, see logs/app.log")
+        return 1
+
+    report = run_benchmark(detector, iter_frames(args.source), args.batch, args.warmup, args.max_frames)
+    report['settings'] = {
+        'source': args.source,
+        'backend': detector.model.name,
+        'variant': detector.variant['name'] if detector.variant else None,
+        'imgsz': detector.imgsz,
+        'batch': args.batch,
+        'warmup': args.warmup,
+    }
+    report['system'] = {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+    }
+    report['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    latency = report['latency_ms'] or {}
+    print(f"{report['frames']} frames, {report['fps'] or 0:.1f} FPS, "
+          f"p50 {latency.get('p50', 0):.1f} ms, p95 {latency.get('p95', 0):.1f} ms, "
+          f"p99 {latency.get('p99', 0):.1f} ms, peak RSS {report['peak_rss_mb'] or 0:.0f} MB")
+    print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
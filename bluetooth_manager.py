@@ -1,137 +1,535 @@
 import platform
 import asyncio
+import importlib.util
+import json
+import os
 import threading
-from config import BLUETOOTH_DEVICE_NAME, BLUETOOTH_TIMEOUT
+import time
+from config import (BLUETOOTH_DEVICE_NAME, GATT_CACHE_PATH,
+                    BLUETOOTH_RECONNECT_DELAY, BLUETOOTH_RECONNECT_MAX_DELAY,
+                    HAPTIC_PROTOCOL, HAPTIC_PATTERNS, LATENCY_ACK_TIMEOUT)
+from device_registry import DeviceRegistry
+from event_loop import IO_LOOP
+from haptic_protocol import PacketEncoder
+from latency import LATENCY
+from metrics import REGISTRY
+from settings import SETTINGS
+
+SEND_MS = REGISTRY.histogram('bluetooth_send_ms', 'Time to write one command to every device in milliseconds')
+COMMANDS_SENT = REGISTRY.counter('bluetooth_commands_sent_total', 'Commands written to the device')
+COMMANDS_COALESCED = REGISTRY.counter('bluetooth_commands_coalesced_total', 'Commands replaced by a newer one before sending')
+CONNECT_FAILURES = REGISTRY.counter('bluetooth_connect_failures_total', 'Failed connection attempts')
+SEND_ERRORS = REGISTRY.counter('bluetooth_send_errors_total', 'Failed command writes')
+
+# Only check that bleak is installed; it is imported when a BLE session starts
+BLEAK_AVAILABLE = importlib.util.find_spec('bleak') is not None
+
+STATE_COMMANDS = ('RED', 'YELLOW', 'GREEN', 'OFF')
+
+
+def is_haptic_device(name):
+    """Units are named BLUETOOTH_DEVICE_NAME, optionally with a suffix like _WRIST or _BELT."""
+    return name is not None and (name == BLUETOOTH_DEVICE_NAME or name.startswith(BLUETOOTH_DEVICE_NAME + '_'))
+
+
+def read_in_thread(read, name):
+    """Call the blocking read() on a daemon thread and hand every result to the returned asyncio.Queue.
+
+    Stands in for BLE notifications on serial links: the thread sleeps in the
+    read instead of the loop polling, and the loop's small worker pool is
+    left to the writes. A None result (connection closed) ends the thread.
+    """
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue()
+
+    def run():
+        while True:
+            data = read()
+            try:
+                loop.call_soon_threadsafe(results.put_nowait, data)
+            except RuntimeError:
+                return  # loop closed
+            if data is None:
+                return
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return results
+
+
+class CommandQueue:
+    """Queue that keeps only the latest pending command per slot.
+
+    Light state commands (RED/YELLOW/GREEN/OFF) share one slot and the
+    vibration toggles share another, so a burst like RED -> YELLOW -> RED
+    queued while the link is busy is sent as a single RED. At most one
+    command per slot is ever pending, which bounds the backlog. Only used
+    from the event loop thread.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._ready = asyncio.Event()
+        self.coalesced = 0
+
+    @staticmethod
+    def slot_for(command):
+        return 'state' if command in STATE_COMMANDS else 'control'
+
+    def put(self, command):
+        slot = self.slot_for(command)
+        if self._pending.pop(slot, None) is not None:
+            self.coalesced += 1
+            COMMANDS_COALESCED.inc()
+        self._pending[slot] = command
+        self._ready.set()
+
+    def put_if_absent(self, command):
+        """Requeue a command unless a newer one for the same slot is already waiting."""
+        slot = self.slot_for(command)
+        if slot not in self._pending:
+            self._pending[slot] = command
+            self._ready.set()
+
+    async def get(self):
+        """Wait for and return the oldest pending command."""
+        while not self._pending:
+            self._ready.clear()
+            await self._ready.wait()
+        slot = next(iter(self._pending))
+        return self._pending.pop(slot)
+
+    async def get_batch(self):
+        """Wait for commands and return every pending one, oldest first."""
+        while not self._pending:
+            self._ready.clear()
+            await self._ready.wait()
+        commands = list(self._pending.values())
+        self._pending.clear()
+        return commands
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class MockTransport:
+    """Persistent connection through mock_bluetooth for desktops without Bleak."""
+
+    def __init__(self, logger, address):
+        self.logger = logger
+        self.address = address
+        self.socket = None
+        self._received = None
+
+    @property
+    def connected(self):
+        return self.socket is not None
+
+    @staticmethod
+    async def discover(logger):
+        import mock_bluetooth as bluetooth
+        names = {addr: bluetooth.lookup_name(addr) for addr in bluetooth.discover_devices()}
+        return [(addr, name) for addr, name in names.items() if is_haptic_device(name)]
+
+    async def connect(self):
+        await asyncio.to_thread(self._connect)
+
+    def _connect(self):
+        import mock_bluetooth as bluetooth
+        sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+        sock.connect((self.address, 1))
+        self.socket = sock
+
+    async def write(self, data):
+        await asyncio.to_thread(self.socket.send, data)
+
+    async def receive(self):
+        """Bytes sent back by the unit, or None once the connection is closed."""
+        if self._received is None:
+            if self.socket is None:
+                return None
+            sock = self.socket
+            self._received = read_in_thread(lambda: sock.recv() or None, f'mock-rx-{self.address}')
+        return await self._received.get()
+
+    async def close(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            finally:
+                self.socket = None
+                self._received = None
+
+
+class AndroidTransport:
+    """Persistent RFCOMM socket to a bonded device using the Android API via Pyjnius."""
+
+    def __init__(self, logger, address):
+        self.logger = logger
+        self.address = address
+        self.socket = None
+        self.output_stream = None
+        self.input_stream = None
+        self._received = None
+
+    @property
+    def connected(self):
+        return self.socket is not None and self.socket.isConnected()
+
+    @staticmethod
+    def _adapter():
+        from jnius import autoclass
+        adapter = autoclass('android.bluetooth.BluetoothAdapter').getDefaultAdapter()
+        if adapter is None or not adapter.isEnabled():
+            raise Exception("Bluetooth adapter not available or not enabled")
+        return adapter
+
+    @staticmethod
+    async def discover(logger):
+        def bonded():
+            # Only bonded devices are considered, so no discovery scan is needed
+            devices = AndroidTransport._adapter().getBondedDevices().toArray()
+            return [(device.getAddress(), device.getName()) for device in devices
+                    if is_haptic_device(device.getName())]
+        return await asyncio.to_thread(bonded)
+
+    async def connect(self):
+        # Pyjnius calls block, so they run on the loop's worker pool
+        await asyncio.to_thread(self._connect)
+
+    def _connect(self):
+        device = self._adapter().getRemoteDevice(self.address)
+        # Use RFCOMM for serial communication
+        sock = device.createRfcommSocketToServiceRecord(device.getUuids()[0].getUuid())
+        sock.connect()
+        self.socket = sock
+        self.output_stream = sock.getOutputStream()
+        self.input_stream = sock.getInputStream()
+
+    async def write(self, data):
+        await asyncio.to_thread(self._write, data)
+
+    def _write(self, data):
+        self.output_stream.write(data)
+        self.output_stream.flush()
+
+    async def receive(self):
+        """Bytes sent back by the unit, or None once the connection is closed."""
+        if self._received is None:
+            if self.input_stream is None:
+                return None
+            stream = self.input_stream
+            # A dedicated thread parks in the blocking read, not one of the loop's workers
+            self._received = read_in_thread(lambda: self._read(stream), f'rfcomm-rx-{self.address}')
+        return await self._received.get()
+
+    @staticmethod
+    def _read(stream):
+        """Block for the next byte, then take whatever else has arrived; None at end of stream."""
+        try:
+            byte = stream.read()
+            if byte < 0:
+                return None
+            data = bytearray([byte])
+            while stream.available() > 0:
+                data.append(stream.read())
+        except Exception:
+            # Closing the socket interrupts the read with an IOException
+            return None
+        return bytes(data)
+
+    async def close(self):
+        if self.socket is not None:
+            try:
+                await asyncio.to_thread(self.socket.close)
+            finally:
+                self.socket = None
+                self.output_stream = None
+                self.input_stream = None
+                self._received = None
+
+
+class BleakTransport:
+    """Persistent BLE session; one BleakClient is reused for every write.
+
+    The writable characteristic found for each address is cached in
+    GATT_CACHE_PATH, so reconnects look it up directly instead of walking
+    the services. Characteristics that support it are written without
+    response, which saves a round trip per command.
+    """
+
+    SERVICE_UUID = "00001101-0000-1000-8000-00805F9B34FB"
+    _gatt_cache = None
+
+    def __init__(self, logger, address):
+        self.logger = logger
+        self.address = address
+        self.client = None
+        self.char_uuid = None
+        self.response = True
+        self._notifications = None
+
+    @property
+    def connected(self):
+        return self.client is not None and self.client.is_connected
+
+    @staticmethod
+    async def discover(logger):
+        import bleak
+        devices = await bleak.BleakScanner.discover(timeout=SETTINGS['BLUETOOTH_TIMEOUT'])
+        return [(device.address, device.name) for device in devices if is_haptic_device(device.name)]
+
+    async def connect(self):
+        import bleak
+        client = bleak.BleakClient(self.address)
+        await client.connect(timeout=SETTINGS['BLUETOOTH_TIMEOUT'])
+        cache = self._load_gatt_cache()
+        char = None
+        if self.address in cache:
+            char = client.services.get_characteristic(cache[self.address])
+        if char is None:
+            char = self._find_write_characteristic(client.services)
+            if char is None:
+                await client.disconnect()
+                raise Exception("No writable characteristic found")
+            cache[self.address] = char.uuid
+            self._save_gatt_cache()
+        self.client = client
+        self.char_uuid = char.uuid
+        self.response = "write-without-response" not in char.properties
+        # Units that echo sequence numbers do so through a notify characteristic
+        service = client.services.get_service(char.service_uuid)
+        notify = next((c for c in service.characteristics if "notify" in c.properties), None)
+        if notify is not None:
+            self._notifications = asyncio.Queue()
+            await client.start_notify(notify.uuid, lambda _, data: self._notifications.put_nowait(bytes(data)))
+
+    def _find_write_characteristic(self, services):
+        for service in services:
+            if service.uuid.upper() == self.SERVICE_UUID:
+                writable = [char for char in service.characteristics
+                            if "write-without-response" in char.properties or "write" in char.properties]
+                # Prefer write-without-response: no ATT round trip per command
+                writable.sort(key=lambda char: "write-without-response" not in char.properties)
+                return writable[0] if writable else None
+        return None
+
+    @classmethod
+    def _load_gatt_cache(cls):
+        if cls._gatt_cache is None:
+            try:
+                with open(GATT_CACHE_PATH) as f:
+                    cls._gatt_cache = json.load(f)
+            except (OSError, ValueError):
+                cls._gatt_cache = {}
+        return cls._gatt_cache
+
+    def _save_gatt_cache(self):
+        try:
+            os.makedirs(os.path.dirname(GATT_CACHE_PATH) or '.', exist_ok=True)
+            with open(GATT_CACHE_PATH, 'w') as f:
+                json.dump(self._gatt_cache, f)
+        except OSError as e:
+            self.logger.warning("Could not cache GATT characteristics: %s", e)
+
+    async def write(self, data):
+        await self.client.write_gatt_char(self.char_uuid, data, response=self.response)
+
+    async def receive(self):
+        """Bytes notified by the unit, or None if it does not send any."""
+        if self._notifications is None:
+            return None
+        return await self._notifications.get()
+
+    async def close(self):
+        if self.client is not None:
+            try:
+                await self.client.disconnect()
+            finally:
+                self.client = None
+                self._notifications = None
 
-try:
-    import bleak
-    BLEAK_AVAILABLE = True
-except ImportError:
-    BLEAK_AVAILABLE = False
 
 class BluetoothManager:
-    def __init__(self, logger):
+    """Sends vibration commands from a single writer task on the shared I/O loop.
+
+    send_vibration_command() is safe to call from any thread and never
+    blocks: the command is handed to the loop and coalesced there, then
+    written to every connected haptic unit through a DeviceRegistry.
+    Connects and writes are bounded by timeouts, and close() cancels the
+    writer.
+    """
+
+    def __init__(self, logger, loop=IO_LOOP, protocol=HAPTIC_PROTOCOL):
         self.logger = logger
+        self.loop = loop
+        self.protocol = protocol
+        self.encoder = PacketEncoder(HAPTIC_PATTERNS)
         self.bluetooth_available = self.check_bluetooth_availability()
-        self.chroma_address = None
-        self.bluetooth_socket = None
         self.last_vibration_color = None
+        self.command_queue = None
+        self.registry = None
+        self._writer = None
+        # Latency traces waiting to be written (by queue slot) and echoed (by sequence number)
+        self._traces = {}
+        self._awaiting_echo = {}
+        self._reconnect_delay = BLUETOOTH_RECONNECT_DELAY
+
+    @property
+    def connected_addresses(self):
+        if self.registry is None:
+            return []
+        return [device.address for device in self.registry.connected_devices]
+
+    @property
+    def chroma_address(self):
+        """Address of the first connected unit, or None."""
+        addresses = self.connected_addresses
+        return addresses[0] if addresses else None
+
+    def device_status(self):
+        """Per-device connection, ack and latency statistics."""
+        return self.registry.status() if self.registry is not None else []
 
     def check_bluetooth_availability(self):
         """Check if Bluetooth libraries are available."""
-        try:
-            if platform.system() == 'Windows':
-                import bleak
-                return True
-            else:
-                from plyer import bluetooth
-                return True
-        except ImportError:
+        module = 'bleak' if platform.system() == 'Windows' else 'plyer'
+        if importlib.util.find_spec(module) is None:
             self.logger.warning("Bluetooth libraries not available.")
             return False
+        return True
 
-    def send_vibration_command(self, command):
-        """Send vibration command via Bluetooth."""
+    def send_vibration_command(self, command, trace=None):
+        """Queue a vibration command for the background writer.
+
+        A LatencyTrace passed along is completed with the write and echo
+        times and recorded once the command has gone out.
+        """
         if not self.bluetooth_available:
+            if trace is not None:
+                LATENCY.record(trace)
             return
-        if not self.check_bluetooth_availability():
-            return  # Bluetooth not available
-        # Run Bluetooth send in a separate thread to avoid blocking the UI
-        threading.Thread(target=self._send_bluetooth_command, args=(command,)).start()
+        self.loop.call_soon(self._enqueue, command, trace)
 
-    def _send_bluetooth_command(self, command):
+    def close(self):
+        """Cancel the writer task and close every connection."""
+        if self._writer is None or not self.loop.running:
+            return
         try:
-            if platform.system() == 'Windows':
-                # For Windows, use Bleak or mock
-                if BLEAK_AVAILABLE:
-                    # Run async Bleak operations synchronously
-                    asyncio.run(self._send_bleak_command(command))
-                else:
-                    import mock_bluetooth as bluetooth
-                    if self.bluetooth_socket is None:
-                        # Discover and connect to CHROMA_ESP32
-                        nearby_devices = bluetooth.discover_devices()
-                        for addr in nearby_devices:
-                            if bluetooth.lookup_name(addr) == BLUETOOTH_DEVICE_NAME:
-                                self.chroma_address = addr
-                                self.bluetooth_socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
-                                self.bluetooth_socket.connect((addr, 1))
-                                break
-                    if self.bluetooth_socket:
-                        self.bluetooth_socket.send((command + '\n').encode())
-                        self.last_vibration_color = command if command in ['RED', 'YELLOW', 'GREEN'] else self.last_vibration_color
-                        self.logger.info(f"Bluetooth command sent: {command}")
-            else:
-                # For Android, use Pyjnius to access Android Bluetooth API
-                from jnius import autoclass
-                BluetoothAdapter = autoclass('android.bluetooth.BluetoothAdapter')
-                BluetoothDevice = autoclass('android.bluetooth.BluetoothDevice')
-                BluetoothSocket = autoclass('android.bluetooth.BluetoothSocket')
-
-                adapter = BluetoothAdapter.getDefaultAdapter()
-                if adapter is None or not adapter.isEnabled():
-                    self.logger.error("Bluetooth adapter not available or not enabled")
-                    return
-
-                if self.chroma_address is None:
-                    # Discover paired devices
-                    paired_devices = adapter.getBondedDevices()
-                    for device in paired_devices.toArray():
-                        if device.getName() == BLUETOOTH_DEVICE_NAME:
-                            self.chroma_address = device.getAddress()
-                            break
-
-                if self.chroma_address:
-                    device = adapter.getRemoteDevice(self.chroma_address)
-                    # Use RFCOMM for serial communication
-                    socket = device.createRfcommSocketToServiceRecord(device.getUuids()[0].getUuid())
-                    socket.connect()
-                    output_stream = socket.getOutputStream()
-                    output_stream.write((command + '\n').encode())
-                    output_stream.flush()
-                    socket.close()
-                    self.last_vibration_color = command if command in ['RED', 'YELLOW', 'GREEN'] else self.last_vibration_color
-                    self.logger.info(f"Bluetooth command sent: {command}")
-                else:
-                    self.logger.error(f"Device {BLUETOOTH_DEVICE_NAME} not found")
+            self.loop.submit(self._shutdown(), timeout=SETTINGS['BLUETOOTH_TIMEOUT']).result()
         except Exception as e:
-            self.logger.error(f"Bluetooth error: {e}")
+            self.logger.error("Bluetooth shutdown error: %s", e)
+
+    def _create_registry(self):
+        if platform.system() == 'Windows':
+            transport_cls = BleakTransport if BLEAK_AVAILABLE else MockTransport
+        else:
+            transport_cls = AndroidTransport
+        return DeviceRegistry(self.logger, transport_cls)
+
+    def _enqueue(self, command, trace=None):
+        if self.command_queue is None:
+            self.command_queue = CommandQueue()
+        self.command_queue.put(command)
+        slot = CommandQueue.slot_for(command)
+        if trace is not None:
+            # A coalesced command never reaches the user, so its trace is dropped with it
+            self._traces[slot] = trace
+        else:
+            self._traces.pop(slot, None)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.ensure_future(self._writer_loop())
 
-    async def _send_bleak_command(self, command):
-        """Async function to send command via Bleak."""
+    async def _shutdown(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+
+    async def _writer_loop(self):
+        """Single long-lived writer: keeps the devices connected and drains the queue."""
+        if self.registry is None:
+            self.registry = self._create_registry()
+            self.registry.read_echoes = self.protocol == 'binary'
+            self.registry.on_echo = self._on_echo
+        try:
+            while True:
+                # Everything that piled up while the last write was in flight goes out together
+                commands = await self.command_queue.get_batch()
+                if not await self._ensure_connected():
+                    for command in commands:
+                        self.command_queue.put_if_absent(command)
+                    continue
+                await self._write_commands(commands)
+        finally:
+            await self.registry.close()
+
+    async def _ensure_connected(self):
+        """Make sure at least one device is connected, backing off when none are."""
         try:
-            import bleak
-            # Discover devices with timeout
-            scanner = bleak.BleakScanner()
-            devices = await asyncio.wait_for(scanner.discover(), timeout=BLUETOOTH_TIMEOUT)
-            target_device = None
-            for device in devices.values():
-                if device.name == BLUETOOTH_DEVICE_NAME:
-                    target_device = device
-                    break
-            if not target_device:
-                raise Exception(f"{BLUETOOTH_DEVICE_NAME} not found")
-
-            # Connect and send data
-            async with bleak.BleakClient(target_device.address) as client:
-                # Assuming RFCOMM service
-                service_uuid = "00001101-0000-1000-8000-00805F9B34FB"
-                char_uuid = None
-                for service in client.services:
-                    if service.uuid == service_uuid:
-                        for char in service.characteristics:
-                            if "write" in char.properties:
-                                char_uuid = char.uuid
-                                break
-                        break
-                if char_uuid:
-                    await client.write_gatt_char(char_uuid, (command + '\n').encode())
-                    self.last_vibration_color = command if command in ['RED', 'YELLOW', 'GREEN'] else self.last_vibration_color
-                    self.chroma_address = target_device.address
-                    self.logger.info(f"Bleak command sent: {command}")
-                else:
-                    raise Exception("No writable characteristic found")
-        except asyncio.TimeoutError:
-            self.logger.error("Bleak discovery timed out")
+            connected = await self.registry.ensure_connected()
         except Exception as e:
-            self.logger.error(f"Bleak error: {e}")
+            self.logger.error("Bluetooth discovery failed: %r, retrying in %.1fs", e, self._reconnect_delay)
+            CONNECT_FAILURES.inc()
+            await asyncio.sleep(self._reconnect_delay)
+            self._reconnect_delay = min(self._reconnect_delay * 2, BLUETOOTH_RECONNECT_MAX_DELAY)
+            return False
+        if connected:
+            self._reconnect_delay = BLUETOOTH_RECONNECT_DELAY
+            return True
+        CONNECT_FAILURES.inc()
+        await asyncio.sleep(self.registry.retry_delay())
+        return False
+
+    def _encode(self, commands):
+        """(seq, payload) pairs: numbered binary packets, or newline-terminated text for older firmware."""
+        if self.protocol == 'binary':
+            return self.encoder.encode(commands)
+        return [(None, ''.join(command + '\n' for command in commands).encode())]
+
+    async def _write_commands(self, commands):
+        started = time.monotonic()
+        state = [command for command in commands if command in STATE_COMMANDS]
+        trace = self._traces.pop('state', None) if state else None
+        if trace is not None:
+            trace.write_started = started
+        acked = 0
+        for seq, data in self._encode(commands):
+            acked = await self.registry.broadcast(data, state=bool(state), seq=seq)
+            if not acked:
+                break
+            if trace is not None and trace.seq is None and seq is not None:
+                trace.seq = seq
+        if not acked:
+            SEND_ERRORS.inc()
+            self.logger.error("Bluetooth commands %s were not acknowledged by any device", commands)
+            # Retry once a device reconnects
+            for command in commands:
+                self.command_queue.put_if_absent(command)
+            if trace is not None:
+                self._traces.setdefault('state', trace)
+            return
+        SEND_MS.observe((time.monotonic() - started) * 1000)
+        COMMANDS_SENT.inc(len(commands))
+        if state:
+            self.last_vibration_color = state[-1]
+        self.logger.info("Bluetooth commands sent: %s (%d device(s))", commands, acked)
+        if trace is not None:
+            trace.written = time.monotonic()
+            if trace.seq is None:
+                LATENCY.record(trace)
+            else:
+                self._awaiting_echo[trace.seq] = trace
+                asyncio.get_running_loop().call_later(LATENCY_ACK_TIMEOUT, self._expire_trace, trace.seq, trace)
+
+    def _on_echo(self, device, seq, received_at):
+        trace = self._awaiting_echo.pop(seq, None)
+        if trace is not None:
+            trace.acked = received_at
+            trace.device = device.name
+            LATENCY.record(trace)
+
+    def _expire_trace(self, seq, trace):
+        # No unit echoed in time; record what was measured
+        if self._awaiting_echo.get(seq) is trace:
+            del self._awaiting_echo[seq]
+            LATENCY.record(trace)
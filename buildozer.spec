@@ -16,7 +16,7 @@ source.dir = .
 source.include_exts = py,png,jpg,kv,atlas
 
 # (list) List of inclusions using pattern matching
-source.include_patterns = assets/*,images/*.png,*.pt
+source.include_patterns = assets/*,images/*.png,*.pt,models/*.onnx,models/variants.json
 
 # (list) Source files to exclude (let empty to not exclude anything)
 #source.exclude_exts = spec
@@ -36,7 +36,7 @@ version = 0.1
 
 # (list) Application requirements
 # comma separated e.g. requirements = sqlite3,kivy
-requirements = python3,kivy,opencv,numpy,plyer,ultralytics
+requirements = python3,kivy,opencv,numpy,plyer,ultralytics,onnxruntime
 
 # (str) Custom source folders for requirements
 # Sets custom source for any requirements with recipes
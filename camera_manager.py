@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from config import (CAMERA_INDEX_DEFAULT, CAMERA_MAX_INDEX, CAMERA_WIDTH, CAMERA_HEIGHT,
+                    CAMERA_FOURCC, CAMERA_BUFFER_SIZE, CAMERA_PROBE_WORKERS, CAMERA_CACHE_PATH, FPS_MAX)
+
+
+class FreshCapture:
+    """VideoCapture wrapper that skips frames the driver buffered while we were busy.
+
+    If the previous read was more than two frame intervals ago, grab() is
+    called until it blocks for a new frame (or the buffer size is reached)
+    and only that last frame is decoded with retrieve().
+    """
+
+    def __init__(self, cap, index, buffer_size=CAMERA_BUFFER_SIZE):
+        self.cap = cap
+        self.index = index
+        self.buffer_size = max(1, buffer_size)
+        fps = cap.get(cv2.CAP_PROP_FPS) or FPS_MAX
+        self.frame_interval = 1.0 / fps if fps > 0 else 1.0 / FPS_MAX
+        self.stale_frames_skipped = 0
+        self._last_read = None
+
+    def read(self):
+        now = time.monotonic()
+        if self._last_read is not None and now - self._last_read > 2 * self.frame_interval:
+            # Drain frames queued while we were away; a grab that waits is a fresh frame
+            grabs = 0
+            for _ in range(self.buffer_size + 1):
+                started = time.monotonic()
+                if not self.cap.grab():
+                    self._last_read = time.monotonic()
+                    return False, None
+                grabs += 1
+                if time.monotonic() - started > self.frame_interval / 2:
+                    break
+            self.stale_frames_skipped += grabs - 1
+        elif not self.cap.grab():
+            self._last_read = time.monotonic()
+            return False, None
+        self._last_read = time.monotonic()
+        return self.cap.retrieve()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class CameraManager:
+    """Finds and configures a camera off the UI thread.
+
+    The last working device and its negotiated settings are cached, so a
+    normal start opens one device directly. Only when that fails are all
+    indices probed in parallel, and the lowest working index wins.
+    """
+
+    def __init__(self, logger, cache_path=CAMERA_CACHE_PATH):
+        self.logger = logger
+        self.cache_path = cache_path
+        self.cache = self._load_cache()
+
+    def open_async(self, callback):
+        """Open a camera on a background thread and call callback(capture_or_None, error)."""
+        def run():
+            try:
+                callback(self.open(), None)
+            except Exception as e:
+                callback(None, e)
+        threading.Thread(target=run, name='camera-open', daemon=True).start()
+
+    def open(self):
+        """Return a configured FreshCapture, or None if no camera could be opened."""
+        cached_index = self.cache.get('index', CAMERA_INDEX_DEFAULT)
+        cap = self._try_open(cached_index)
+        if cap is not None:
+            self.logger.info("Camera %s opened successfully", cached_index)
+            return self._configure(cap, cached_index)
+
+        self.logger.warning("Camera %s failed to open, probing alternatives", cached_index)
+        candidates = [i for i in range(CAMERA_MAX_INDEX + 1) if i != cached_index]
+        with ThreadPoolExecutor(max_workers=CAMERA_PROBE_WORKERS) as pool:
+            opened = list(pool.map(self._try_open, candidates))
+        chosen = None
+        for index, cap in zip(candidates, opened):
+            if cap is None:
+                continue
+            if chosen is None:
+                chosen = (index, cap)
+            else:
+                cap.release()
+        if chosen is None:
+            self.logger.error("Failed to open any camera")
+            return None
+        index, cap = chosen
+        self.logger.info("Successfully opened camera %s", index)
+        return self._configure(cap, index)
+
+    @staticmethod
+    def _try_open(index):
+        cap = cv2.VideoCapture(index)
+        if cap.isOpened():
+            return cap
+        cap.release()
+        return None
+
+    def _configure(self, cap, index):
+        settings = self.cache if self.cache.get('index') == index else {}
+        fourcc = settings.get('fourcc', CAMERA_FOURCC)
+        if fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings.get('width', CAMERA_WIDTH))
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.get('height', CAMERA_HEIGHT))
+        cap.set(cv2.CAP_PROP_FPS, settings.get('fps', FPS_MAX))
+        # A short driver queue keeps frames from going stale
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, CAMERA_BUFFER_SIZE)
+
+        negotiated = {
+            'index': index,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': cap.get(cv2.CAP_PROP_FPS) or FPS_MAX,
+            'fourcc': fourcc,
+        }
+        self.logger.info("Camera settings: %s", negotiated)
+        self._save_cache(negotiated)
+        return FreshCapture(cap, index)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, settings):
+        self.cache = settings
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump(settings, f)
+        except OSError as e:
+            self.logger.warning("Could not cache camera settings: %s", e)
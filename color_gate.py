@@ -0,0 +1,142 @@
+import cv2
+import numpy as np
+from config import (COLOR_GATE_MODE, COLOR_GATE_WIDTH, COLOR_GATE_MIN_BLOB_AREA, COLOR_GATE_CROP_SCALE,
+                    COLOR_GATE_MAX_CROPS, COLOR_GATE_FORCE_INTERVAL, COLOR_GATE_CONFIRM_SCORE,
+                    COLOR_GATE_DISAGREE_PENALTY)
+from detector import CLS, CONF, EMPTY_DETECTIONS, detections_to_dicts
+from light_color import lit_color_masks, classify_light_color
+from metrics import REGISTRY
+
+GATE_SKIPPED = REGISTRY.counter('color_gate_skipped_total', 'Frames where the color gate skipped inference')
+GATE_PASSED = REGISTRY.counter('color_gate_passed_total', 'Frames the color gate sent to the model')
+GATE_REJECTED = REGISTRY.counter('color_gate_rejected_total', 'Detections whose class the HSV check disagreed with')
+
+
+def find_color_blobs(frame, width=COLOR_GATE_WIDTH, min_area=COLOR_GATE_MIN_BLOB_AREA):
+    """Find bright red/amber/green blobs on a downscaled copy of frame.
+
+    Returns an N x 4 array of blob boxes (x1, y1, x2, y2) in full-frame pixels.
+    """
+    h, w = frame.shape[:2]
+    scale = width / float(w)
+    small = cv2.resize(frame, (width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+    for color_mask in lit_color_masks(hsv).values():
+        mask[color_mask] = 255
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    # Row 0 is the background component
+    stats = stats[1:]
+    stats = stats[stats[:, cv2.CC_STAT_AREA] >= min_area]
+    if len(stats) == 0:
+        return np.zeros((0, 4), dtype=np.float32)
+    x, y = stats[:, cv2.CC_STAT_LEFT], stats[:, cv2.CC_STAT_TOP]
+    bw, bh = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    return (np.stack([x, y, x + bw, y + bh], axis=1) / scale).astype(np.float32)
+
+
+def candidate_regions(blobs, frame_shape, crop_scale=COLOR_GATE_CROP_SCALE):
+    """Grow lamp blobs to the size of a whole light housing and merge overlapping regions."""
+    h, w = frame_shape[:2]
+    regions = []
+    for x1, y1, x2, y2 in blobs:
+        # A housing is about three lamps tall; pad generously so the model sees context
+        size = max(x2 - x1, y2 - y1) * crop_scale
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        region = [max(0, cx - size), max(0, cy - 1.5 * size), min(w, cx + size), min(h, cy + 1.5 * size)]
+        for other in regions:
+            if region[0] < other[2] and other[0] < region[2] and region[1] < other[3] and other[1] < region[3]:
+                other[:] = [min(region[0], other[0]), min(region[1], other[1]),
+                            max(region[2], other[2]), max(region[3], other[3])]
+                break
+        else:
+            regions.append(region)
+    return [tuple(int(v) for v in region) for region in regions]
+
+
+class GatedDetector:
+    """Skips or narrows inference when a cheap HSV check finds no lit lamps.
+
+    In 'skip' mode frames without a candidate blob return no detections and
+    every other frame goes through the full model. In 'crops' mode only the
+    regions around candidate blobs are batched through the model. Every
+    COLOR_GATE_FORCE_INTERVAL frames the full frame is checked regardless, so
+    unusual lighting cannot hide a light forever. Model detections are then
+    cross-checked with the HSV color of their box, and ones that clearly
+    disagree are down-weighted below the confidence threshold.
+    """
+
+    def __init__(self, detector, logger, mode=COLOR_GATE_MODE, force_interval=COLOR_GATE_FORCE_INTERVAL):
+        self.detector = detector
+        self.logger = logger
+        self.mode = mode
+        self.force_interval = force_interval
+        self.frames_since_full = force_interval
+
+    def reset(self):
+        """Make the next frame a full-frame detection."""
+        self.frames_since_full = self.force_interval
+
+    @property
+    def model(self):
+        return self.detector.model
+
+    @property
+    def class_names(self):
+        return self.detector.class_names
+
+    def detect_traffic_lights(self, frame):
+        return detections_to_dicts(self.detect_batch([frame])[0], self.class_names)
+
+    def detect_batch(self, frames):
+        return [self._detect(frame) for frame in frames]
+
+    def _detect(self, frame):
+        self.frames_since_full += 1
+        if self.frames_since_full >= self.force_interval:
+            return self._full(frame)
+
+        blobs = find_color_blobs(frame)
+        if len(blobs) == 0:
+            GATE_SKIPPED.inc()
+            return EMPTY_DETECTIONS
+        GATE_PASSED.inc()
+        if self.mode != 'crops':
+            return self._full(frame)
+
+        regions = candidate_regions(blobs, frame.shape)
+        if len(regions) > COLOR_GATE_MAX_CROPS:
+            return self._full(frame)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+        results = self.detector.detect_batch(crops)
+        boxes = []
+        for (x1, y1, _, _), result in zip(regions, results):
+            if len(result):
+                result = result.copy()
+                result[:, [0, 2]] += x1
+                result[:, [1, 3]] += y1
+                boxes.append(result)
+        if not boxes:
+            return EMPTY_DETECTIONS
+        return self.confirm_colors(frame, np.concatenate(boxes))
+
+    def _full(self, frame):
+        self.frames_since_full = 0
+        return self.confirm_colors(frame, self.detector.detect_batch([frame])[0])
+
+    def confirm_colors(self, frame, boxes):
+        """Down-weight detections whose class contradicts a confident HSV reading of the box."""
+        if len(boxes) == 0:
+            return boxes
+        keep = np.ones(len(boxes), dtype=bool)
+        for i, box in enumerate(boxes):
+            name = self.class_names.get(int(box[CLS]))
+            if name not in ('Red', 'Yellow', 'Green'):
+                continue
+            x1, y1, x2, y2 = (int(v) for v in box[:4])
+            color, score = classify_light_color(frame[max(0, y1):y2, max(0, x1):x2])
+            if color in ('Red', 'Yellow', 'Green') and color != name and score >= COLOR_GATE_CONFIRM_SCORE:
+                GATE_REJECTED.inc()
+                box[CONF] *= COLOR_GATE_DISAGREE_PENALTY
+                keep[i] = box[CONF] >= self.detector.conf_threshold
+        return boxes[keep]
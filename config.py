@@ -6,21 +6,136 @@ import os
 MODEL_PATH = 'model.pt'
 CONFIDENCE_THRESHOLD = 0.7
 CLASS_NAMES = {0: 'Red', 1: 'Green', 2: 'Off', 3: 'Yellow'}
+IOU_THRESHOLD = 0.45
+MODEL_INPUT_SIZE = 640  # pixels, square
+
+# Inference backend: 'ultralytics' (PyTorch) or 'onnx' (ONNX Runtime)
+INFERENCE_BACKEND = 'ultralytics'
+ONNX_MODEL_PATH = 'model.onnx'  # exported from MODEL_PATH on first use
+ONNX_PROVIDERS = ['OpenVINOExecutionProvider', 'CPUExecutionProvider']
+ONNX_THREADS = 0  # intra-op threads, 0 lets ONNX Runtime use every core
+
+# Quantized / reduced-input variants built by model_variants.py
+MODEL_AUTO_SELECT = True  # use the best variant that fits LATENCY_BUDGET_MS when a manifest exists
+MODEL_VARIANTS_DIR = 'models'
+MODEL_VARIANTS_MANIFEST = os.path.join(MODEL_VARIANTS_DIR, 'variants.json')
+MODEL_VARIANT_SIZES = [640, 416, 320]
+
+# Tracking settings: full detection every N frames, template tracking in between
+TRACKING_ENABLED = True
+TRACKING_DETECT_INTERVAL = 5  # frames
+TRACKING_MIN_SCORE = 0.6  # template match score below which a full detection runs
+TRACKING_SEARCH_MARGIN = 0.5  # search window padding, as a fraction of the box size
+
+# Color pre-filter: skip the model when a downscaled HSV check finds no lit lamps
+COLOR_GATE_ENABLED = True
+COLOR_GATE_MODE = 'skip'  # 'skip' runs the full frame when lamps are seen, 'crops' only the regions around them
+COLOR_GATE_WIDTH = 160  # pixels, width of the frame the gate looks at
+COLOR_GATE_MIN_BLOB_AREA = 4  # pixels at gate resolution
+COLOR_GATE_CROP_SCALE = 3.0  # crop half-width, in lamp diameters
+COLOR_GATE_MAX_CROPS = 4  # more candidates than this fall back to the full frame
+COLOR_GATE_FORCE_INTERVAL = 30  # frames between unconditional full-frame detections
+COLOR_GATE_CONFIRM_SCORE = 0.6  # HSV score needed to contradict the model's class
+COLOR_GATE_DISAGREE_PENALTY = 0.5  # confidence multiplier for contradicted detections
+
+# Detection cache: reuse the last detections while the scene stays the same (detection_cache.py)
+DETECTION_CACHE_ENABLED = True
+DETECTION_CACHE_GRID = (32, 24)  # signature blocks across and down
+DETECTION_CACHE_THRESHOLD = 6  # largest block color change (0-255) that still counts as the same scene
+DETECTION_CACHE_MAX_AGE = 1.0  # seconds before a cached result is detected again
+DETECTION_CACHE_SIZE = 8  # scenes kept, least recently used evicted first
+
+# Light state smoothing
+STATE_WINDOW = 8  # frames of confidence-weighted votes
+STATE_CONFIRM_FRAMES = 2  # consecutive frames a new state must lead before switching
+STATE_SWITCH_MARGIN = 0.2  # lead over the current state, as a fraction of total vote weight
+STATE_NONE_WEIGHT = 0.5  # vote weight for OFF on frames without a light
 
 # Camera settings
 CAMERA_INDEX_DEFAULT = 0
+CAMERA_MAX_INDEX = 10  # highest index probed when the cached camera fails
+CAMERA_PROBE_WORKERS = 4  # cameras opened in parallel while probing
+CAMERA_WIDTH = 640
+CAMERA_HEIGHT = 480
+CAMERA_FOURCC = 'MJPG'  # compressed USB transfer; '' keeps the driver default
+CAMERA_BUFFER_SIZE = 1  # driver-side frame queue
+CACHE_DIR = '.cache'
+CAMERA_CACHE_PATH = os.path.join(CACHE_DIR, 'camera.json')  # last working camera and settings
+VARIANT_SELECTION_CACHE = os.path.join(CACHE_DIR, 'variants.json')  # measured variant latency per device
 FPS = 15
+DECISION_QUEUE_SIZE = 32  # finished frames waiting for the decision stage before the oldest are dropped
+
+# Headless multi-camera inference server (inference_server.py)
+INFERENCE_WORKERS = 0  # detector processes, 0 means one per core minus one
+INFERENCE_SLOTS_PER_STREAM = 2  # shared-memory frame buffers per camera
+INFERENCE_WORKER_THREADS = 1  # compute threads inside each worker process
+INFERENCE_WORKER_START_TIMEOUT = 120  # seconds to wait for the models to load
+
+# Adaptive rate/resolution governor
+GOVERNOR_ENABLED = True
+FPS_MIN = 5  # no light seen for a while
+FPS_MAX = 24  # light is close or changing
+GOVERNOR_IDLE_AFTER = 5.0  # seconds without a light before dropping to FPS_MIN
+GOVERNOR_NEAR_AREA = 0.01  # box area, as a fraction of the frame, that counts as close
+GOVERNOR_ACTIVE_HOLD = 3.0  # seconds to stay at FPS_MAX after a close or changing light
+LATENCY_BUDGET_MS = 66  # per-frame inference budget, one frame at 15 FPS
+GOVERNOR_IMGSZ_OPTIONS = [320, 416, 512, 640]
+GOVERNOR_COOLDOWN_FRAMES = 30  # frames between input size changes
+THERMAL_LIMIT_C = 70  # throttle above this temperature
+
+# Recording settings: store camera input and decisions for later replay
+RECORDING_ENABLED = False
+RECORDING_DIR = 'recordings'
+RECORDING_CHUNK_FRAMES = 300  # frames per chunk file
+RECORDING_JPEG_QUALITY = 80
+RECORDING_QUEUE_SIZE = 8  # frames waiting for the encoder before new ones are dropped
 
 # Audio settings
 AUDIO_INTERVAL_RED = 0.3  # seconds
 
 # Bluetooth settings
-BLUETOOTH_DEVICE_NAME = 'CHROMA_ESP32'
+BLUETOOTH_DEVICE_NAME = 'CHROMA_ESP32'  # units may add a suffix, e.g. CHROMA_ESP32_WRIST
+BLUETOOTH_MAX_DEVICES = 4  # haptic units driven at once
+BLUETOOTH_CACHE_PATH = os.path.join(CACHE_DIR, 'bluetooth.json')  # discovered units, reused on restart
+BLUETOOTH_REDISCOVER_AFTER = 3  # failed connects per cached unit before scanning again
+GATT_CACHE_PATH = os.path.join(CACHE_DIR, 'gatt.json')  # writable characteristic per BLE address
+# Wire format: 'binary' (haptic_protocol packets) or 'text' (newline-terminated commands).
+# Switch to 'binary' once every unit runs firmware that understands it.
+HAPTIC_PROTOCOL = 'text'
+HAPTIC_PATTERNS = {  # intensity 0-255, duration in ms; binary protocol only
+    'RED': (255, 400),
+    'YELLOW': (160, 250),
+    'GREEN': (96, 150),
+}
 BLUETOOTH_TIMEOUT = 5.0  # seconds for discovery
+BLUETOOTH_CONNECT_TIMEOUT = 15.0  # seconds for scan plus connect
+BLUETOOTH_WRITE_TIMEOUT = 2.0  # seconds per command write
+BLUETOOTH_RECONNECT_DELAY = 0.5  # initial reconnect backoff in seconds
+BLUETOOTH_RECONNECT_MAX_DELAY = 30.0  # backoff cap in seconds
 
-# UI settings
-IDLE_TIMEOUT = 30  # seconds
+# Low-power watch mode (power.py): cheap checks only until something changes
+WATCH_ENABLED = True
+IDLE_TIMEOUT = 30  # seconds without a light before switching to watch mode
+WATCH_FPS = 2  # capture rate while watching
+WATCH_WAKE_THRESHOLD = 12  # largest block color change (0-255) between watch frames that wakes detection
+WATCH_CHECK_INTERVAL = 10.0  # seconds between full detections while watching
+
+# Background asyncio loop that owns Bluetooth, audio and timers
+EVENT_LOOP_WORKERS = 2  # threads for blocking calls made from the loop
+
+# Runtime settings (settings.py): overrides for the tunables above, reloaded while running
+SETTINGS_PATH = 'settings.json'  # JSON object of overrides, e.g. {"CONFIDENCE_THRESHOLD": 0.6}
+SETTINGS_ENV_PREFIX = 'TRAFFICLIGHT_'  # e.g. TRAFFICLIGHT_FPS=12, applied over the file
+SETTINGS_POLL_INTERVAL = 1.0  # seconds between checks of the settings file
 
 # Logging settings
 LOG_LEVEL = 'INFO'
 LOG_DIR = 'logs'
+LOG_MAX_BYTES = 1024 * 1024  # rotate app.log at 1 MB
+LOG_BACKUP_COUNT = 3
+
+# Metrics settings
+METRICS_PORT = 9108  # local Prometheus/JSON endpoint, None to disable
+METRICS_DUMP_PATH = os.path.join(LOG_DIR, 'metrics.json')  # written on exit
+LATENCY_LOG_PATH = os.path.join(LOG_DIR, 'latency.jsonl')  # one line per light change, see latency.py
+LATENCY_ACK_TIMEOUT = 2.0  # seconds to wait for a unit to echo a command
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import time
+import cv2
+import numpy as np
+from config import (DETECTION_CACHE_GRID, DETECTION_CACHE_THRESHOLD, DETECTION_CACHE_MAX_AGE,
+                    DETECTION_CACHE_SIZE)
+from detector import detections_to_dicts
+from metrics import REGISTRY
+
+CACHE_HITS = REGISTRY.counter('detection_cache_hits_total', 'Frames answered from the detection cache')
+CACHE_MISSES = REGISTRY.counter('detection_cache_misses_total', 'Frames the detection cache passed on to detection')
+
+
+def frame_signature(frame, grid=DETECTION_CACHE_GRID):
+    """Mean color of each block of a grid over the frame, as a small int16 array.
+
+    Color is kept so that a lamp switching from red to green changes its
+    block even when the brightness barely moves.
+    """
+    return cv2.resize(frame, grid, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def signature_distance(a, b):
+    """Largest per-block, per-channel change between two signatures (0-255)."""
+    if a.shape != b.shape:
+        return 255
+    return int(np.abs(a - b).max())
+
+
+class CachedDetector:
+    """Reuses detections for frames that look the same as a recent one.
+
+    Each frame is reduced to a block signature (frame_signature). If it is
+    within `threshold` of a cached entry that is younger than `max_age`
+    seconds, that entry's detections are returned and the wrapped detector
+    is not called. The largest block change is used rather than the average,
+    so a small lamp changing color is not lost in an otherwise still scene.
+    `max_age` counts from when the detections were computed, so even a
+    perfectly still scene is re-detected at least that often. At most `size`
+    entries are kept and the least recently used one is evicted first.
+    """
+
+    def __init__(self, detector, logger, threshold=DETECTION_CACHE_THRESHOLD, max_age=DETECTION_CACHE_MAX_AGE,
+                 size=DETECTION_CACHE_SIZE, clock=time.monotonic):
+        self.detector = detector
+        self.logger = logger
+        self.threshold = threshold
+        self.max_age = max_age
+        self.size = size
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (signature, boxes, stored_at)
+        self.hits = 0
+        self.misses = 0
+        self._next_key = 0
+
+    @property
+    def model(self):
+        return self.detector.model
+
+    @property
+    def class_names(self):
+        return self.detector.class_names
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        """Forget every cached result, e.g. when the camera changes."""
+        self.entries.clear()
+
+    def detect_traffic_lights(self, frame):
+        return detections_to_dicts(self.detect_batch([frame])[0], self.class_names)
+
+    def detect_batch(self, frames):
+        now = self.clock()
+        self._expire(now)
+        signatures = [frame_signature(frame) for frame in frames]
+        results = [self._lookup(signature) for signature in signatures]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            detected = self.detector.detect_batch([frames[i] for i in missing])
+            for i, boxes in zip(missing, detected):
+                results[i] = boxes
+                self._store(signatures[i], boxes, now)
+        self.hits += len(frames) - len(missing)
+        self.misses += len(missing)
+        CACHE_HITS.inc(len(frames) - len(missing))
+        CACHE_MISSES.inc(len(missing))
+        return results
+
+    def _lookup(self, signature):
+        # Most recently used first; the current scene is almost always the newest entry
+        for key in reversed(self.entries):
+            cached, boxes, _ = self.entries[key]
+            if signature_distance(signature, cached) <= self.threshold:
+                self.entries.move_to_end(key)
+                return boxes
+        return None
+
+    def _store(self, signature, boxes, now):
+        self.entries[self._next_key] = (signature, boxes, now)
+        self._next_key += 1
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def _expire(self, now):
+        for key in [key for key, (_, _, stored_at) in self.entries.items() if now - stored_at > self.max_age]:
+            del self.entries[key]
@@ -1,47 +1,109 @@
-import cv2
+import time
 import numpy as np
-from ultralytics import YOLO
-from config import MODEL_PATH, CONFIDENCE_THRESHOLD, CLASS_NAMES
+from config import CONFIDENCE_THRESHOLD, CLASS_NAMES, INFERENCE_BACKEND, MODEL_INPUT_SIZE, MODEL_AUTO_SELECT
+from inference_backends import create_backend, EMPTY_DETECTIONS
+
+# Column layout of the arrays returned by detect_batch
+X1, Y1, X2, Y2, CONF, CLS = range(6)
+
+
+def detections_to_dicts(boxes, class_names=CLASS_NAMES):
+    """Convert an N x 6 detection array into the list-of-dicts format used by the UI."""
+    detections = []
+    for x1, y1, x2, y2, conf, cls in boxes.tolist():
+        cls = int(cls)
+        detections.append({
+            'color': class_names.get(cls, f'class_{cls}'),
+            'confidence': conf,
+            'bbox': (x1, y1, x2, y2)
+        })
+    return detections
+
 
 class TrafficLightDetector:
-    def __init__(self, logger):
+    def __init__(self, logger, backend=INFERENCE_BACKEND, imgsz=MODEL_INPUT_SIZE, auto_select=MODEL_AUTO_SELECT):
         self.logger = logger
         self.conf_threshold = CONFIDENCE_THRESHOLD
         self.class_names = CLASS_NAMES
+        self.variant = None
+        # Model calls so far and the duration of the latest one; frames answered
+        # by the gate, tracker or cache in front of the detector touch neither
+        self.model_calls = 0
+        self.last_call_ms = None
         try:
-            self.model = YOLO(MODEL_PATH)
-            self.logger.info(f"Model loaded successfully from {MODEL_PATH}")
+            self.model = None
+            if auto_select:
+                self.model = self._load_variant()
+            if self.model is None:
+                self.model = create_backend(logger, backend, imgsz=imgsz)
+                self.logger.info("Model loaded successfully with the %s backend", backend)
         except Exception as e:
-            self.logger.error(f"Failed to load model: {e}")
+            self.logger.error("Failed to load model: %s", e)
             self.model = None
 
+    def _load_variant(self):
+        """Load the best model variant for this device's latency budget, if variants were built."""
+        from model_variants import select_variant, backend_kwargs
+        variant, backend = select_variant(self.logger)
+        if variant is None:
+            return None
+        self.variant = variant
+        if backend is None:
+            backend = create_backend(self.logger, variant['backend'], **backend_kwargs(variant))
+        self.logger.info("Model loaded successfully from variant %s", variant['name'])
+        return backend
+
     def detect_traffic_lights(self, frame):
         """Detect traffic lights using YOLO model."""
         if self.model is None:
             self.logger.error("Model not loaded, cannot perform detection")
             return []
+        return detections_to_dicts(self.detect_batch([frame])[0], self.class_names)
+
+    def detect_batch(self, frames):
+        """Run a single model call over a list of frames.
+
+        Returns one float32 array per frame with a row per detection laid out
+        as (x1, y1, x2, y2, conf, cls).
+        """
+        if self.model is None:
+            self.logger.error("Model not loaded, cannot perform detection")
+            return [EMPTY_DETECTIONS for _ in frames]
+        if len(frames) == 0:
+            return []
 
         try:
-            # Run inference
-            results = self.model(frame, conf=CONFIDENCE_THRESHOLD)
-
-            detections = []
-            for result in results:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    conf = box.conf[0].cpu().numpy()
-                    cls = int(box.cls[0].cpu().numpy())
-
-                    # Map class to color name
-                    color = CLASS_NAMES.get(cls, f'class_{cls}')
-
-                    detections.append({
-                        'color': color,
-                        'confidence': float(conf),
-                        'bbox': (float(x1), float(y1), float(x2), float(y2))
-                    })
-
-            return detections
+            started = time.perf_counter()
+            boxes = self.model.predict(frames, self.conf_threshold)
         except Exception as e:
-            self.logger.error(f"Error during detection: {e}")
-            return []
+            self.logger.error("Error during detection: %s", e)
+            return [EMPTY_DETECTIONS for _ in frames]
+        self.last_call_ms = (time.perf_counter() - started) * 1000
+        self.model_calls += 1
+        return boxes
+
+    def warm_up(self, shape=(480, 640, 3)):
+        """Run a dummy inference so graph building and kernel selection happen before the first real frame."""
+        self.detect_batch([np.zeros(shape, dtype=np.uint8)])
+
+    @property
+    def imgsz(self):
+        return self.model.imgsz if self.model is not None else None
+
+    def set_imgsz(self, imgsz):
+        """Change the inference input size. Returns False if the backend has a fixed size."""
+        if self.model is None or not self.model.resizable:
+            return False
+        self.model.imgsz = imgsz
+        return True
+
+    @property
+    def last_timings(self):
+        """Per-stage timings in milliseconds of the most recent model call."""
+        return self.model.last_timings if self.model is not None else {}
+
+    def detect_streams(self, frames_by_stream):
+        """Batch frames from several cameras, keyed by stream id, into one model call."""
+        stream_ids = list(frames_by_stream)
+        boxes = self.detect_batch([frames_by_stream[stream_id] for stream_id in stream_ids])
+        return dict(zip(stream_ids, boxes))
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import time
+from config import (BLUETOOTH_CACHE_PATH, BLUETOOTH_MAX_DEVICES, BLUETOOTH_RECONNECT_DELAY,
+                    BLUETOOTH_RECONNECT_MAX_DELAY, BLUETOOTH_REDISCOVER_AFTER)
+from haptic_protocol import ProtocolError, split_packets
+from metrics import REGISTRY
+from settings import SETTINGS
+
+DEVICES_CONNECTED = REGISTRY.gauge('bluetooth_devices_connected', 'Haptic devices currently connected')
+DEVICE_SEND_MS = REGISTRY.histogram('bluetooth_device_send_ms', 'Time for one device to acknowledge a write')
+BROADCAST_MS = REGISTRY.histogram('bluetooth_broadcast_ms', 'Time for every connected device to acknowledge a command')
+DEVICE_CONNECT_FAILURES = REGISTRY.counter('bluetooth_device_connect_failures_total', 'Failed per-device connection attempts')
+DEVICE_SEND_ERRORS = REGISTRY.counter('bluetooth_device_send_errors_total', 'Failed per-device writes')
+ECHO_RTT_MS = REGISTRY.histogram('bluetooth_echo_rtt_ms', 'Write start to the unit echoing the sequence number')
+
+
+class Device:
+    """One haptic peripheral with its own connection, backoff and ack statistics."""
+
+    def __init__(self, transport, name):
+        self.transport = transport
+        self.name = name
+        self.connect_task = None
+        self.next_attempt = 0.0
+        self.reconnect_delay = BLUETOOTH_RECONNECT_DELAY
+        self.failures = 0
+        self.acked = 0
+        self.errors = 0
+        self.last_ack = None
+        self.last_latency_ms = None
+        # Sequence number -> write start, until the unit echoes it back
+        self.sent_at = {}
+        self.reader_task = None
+        self.echoes = 0
+        self.last_echo_ms = None
+
+    @property
+    def address(self):
+        return self.transport.address
+
+    @property
+    def connected(self):
+        return self.transport.connected
+
+    def status(self):
+        return {
+            'address': self.address,
+            'name': self.name,
+            'connected': self.connected,
+            'acked': self.acked,
+            'errors': self.errors,
+            'last_ack': self.last_ack,
+            'last_latency_ms': self.last_latency_ms,
+            'echoes': self.echoes,
+            'last_echo_ms': self.last_echo_ms,
+        }
+
+
+class DeviceRegistry:
+    """Keeps concurrent connections to every haptic unit and fans commands out to them.
+
+    Scan results are cached in BLUETOOTH_CACHE_PATH so a restart connects to
+    the known addresses without scanning. Each device reconnects on its own
+    backoff in a background task, so one unit dropping out never delays the
+    others. Writes go to all connected devices at once, so a command costs
+    the slowest device's ack time rather than the sum. Only used from the
+    event loop thread.
+    """
+
+    def __init__(self, logger, transport_cls, cache_path=BLUETOOTH_CACHE_PATH, max_devices=BLUETOOTH_MAX_DEVICES):
+        self.logger = logger
+        self.transport_cls = transport_cls
+        self.cache_path = cache_path
+        self.max_devices = max_devices
+        self.devices = {}
+        self.last_state = None
+        # Only binary-protocol firmware echoes packets; text units are never read from
+        self.read_echoes = False
+        # Called as on_echo(device, seq, received_at) when a unit echoes a packet
+        self.on_echo = None
+        self._from_cache = False
+        for entry in self._load_cache():
+            self._add(entry['address'], entry.get('name'))
+            self._from_cache = True
+
+    @property
+    def connected_devices(self):
+        return [device for device in self.devices.values() if device.connected]
+
+    def status(self):
+        return [device.status() for device in self.devices.values()]
+
+    async def discover(self):
+        """Scan for haptic units and remember them; raises when none are found."""
+        found = await self.transport_cls.discover(self.logger)
+        if not found:
+            raise Exception("No haptic devices found")
+        found = dict(found[:self.max_devices])
+        for address in list(self.devices):
+            if address not in found and not self.devices[address].connected:
+                del self.devices[address]
+        for address, name in found.items():
+            if address not in self.devices:
+                self._add(address, name)
+        self._from_cache = False
+        self._save_cache()
+        self.logger.info("Discovered haptic devices: %s", list(found.values()))
+
+    async def ensure_connected(self):
+        """Start reconnects for missing devices and return the connected ones.
+
+        Only when nothing is connected does this wait for the attempts, so a
+        partially connected set keeps sending while the rest catch up.
+        """
+        if not self.devices or self._needs_rediscovery():
+            await self.discover()
+        now = time.monotonic()
+        for device in self.devices.values():
+            if not device.connected and device.connect_task is None and now >= device.next_attempt:
+                device.connect_task = asyncio.ensure_future(self._connect(device))
+        connected = self.connected_devices
+        if not connected:
+            pending = [device.connect_task for device in self.devices.values() if device.connect_task]
+            if pending:
+                await asyncio.wait(pending)
+            connected = self.connected_devices
+        DEVICES_CONNECTED.set(len(connected))
+        return connected
+
+    def retry_delay(self):
+        """Seconds until the next device is due for a reconnect attempt."""
+        if not self.devices:
+            return BLUETOOTH_RECONNECT_DELAY
+        return max(0.0, min(device.next_attempt for device in self.devices.values()) - time.monotonic())
+
+    async def broadcast(self, data, state=False, seq=None):
+        """Write data to every connected device in parallel; returns how many acknowledged.
+
+        With a sequence number, the write time is kept per device until the
+        unit echoes it, for round-trip measurement.
+        """
+        if state:
+            # Devices that reconnect later are brought up to date with this
+            self.last_state = data
+        devices = self.connected_devices
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._send(device, data, seq) for device in devices))
+        if devices:
+            BROADCAST_MS.observe((time.monotonic() - started) * 1000)
+        return sum(results)
+
+    async def close(self):
+        for device in self.devices.values():
+            if device.connect_task is not None:
+                device.connect_task.cancel()
+        await asyncio.gather(*(self._disconnect(device) for device in self.devices.values()))
+        DEVICES_CONNECTED.set(0)
+
+    def _add(self, address, name):
+        self.devices[address] = Device(self.transport_cls(self.logger, address), name)
+
+    def _needs_rediscovery(self):
+        # Cached addresses that keep failing may belong to replaced or re-paired units
+        return self._from_cache and all(device.failures >= BLUETOOTH_REDISCOVER_AFTER
+                                        for device in self.devices.values())
+
+    async def _connect(self, device):
+        try:
+            await asyncio.wait_for(device.transport.connect(), SETTINGS['BLUETOOTH_CONNECT_TIMEOUT'])
+            device.failures = 0
+            device.reconnect_delay = BLUETOOTH_RECONNECT_DELAY
+            self.logger.info("Bluetooth connected to %s (%s)", device.name, device.address)
+            if self.read_echoes:
+                device.reader_task = asyncio.ensure_future(self._read_echoes(device))
+            if self.last_state is not None:
+                await self._send(device, self.last_state)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            device.failures += 1
+            DEVICE_CONNECT_FAILURES.inc()
+            self.logger.error("Bluetooth connection to %s failed: %r, retrying in %.1fs",
+                              device.name, e, device.reconnect_delay)
+            await self._disconnect(device)
+            device.next_attempt = time.monotonic() + device.reconnect_delay
+            device.reconnect_delay = min(device.reconnect_delay * 2, BLUETOOTH_RECONNECT_MAX_DELAY)
+        finally:
+            device.connect_task = None
+
+    async def _send(self, device, data, seq=None):
+        started = time.monotonic()
+        if seq is not None:
+            device.sent_at[seq] = started
+        try:
+            await asyncio.wait_for(device.transport.write(data), SETTINGS['BLUETOOTH_WRITE_TIMEOUT'])
+        except Exception as e:
+            device.errors += 1
+            DEVICE_SEND_ERRORS.inc()
+            self.logger.error("Bluetooth write to %s failed: %r", device.name, e)
+            # Drop the broken connection; the next ensure_connected() reconnects it
+            await self._disconnect(device)
+            return False
+        device.last_latency_ms = (time.monotonic() - started) * 1000
+        device.last_ack = time.time()
+        device.acked += 1
+        DEVICE_SEND_MS.observe(device.last_latency_ms)
+        return True
+
+    async def _read_echoes(self, device):
+        """Collect the sequence numbers a unit echoes back until its connection closes."""
+        buffer = bytearray()
+        while True:
+            data = await device.transport.receive()
+            if data is None:
+                return
+            buffer += data
+            try:
+                packets = split_packets(buffer)
+            except ProtocolError as e:
+                self.logger.warning("Unreadable data from %s: %s", device.name, e)
+                buffer.clear()
+                continue
+            for packet in packets:
+                if any(command.name == 'ACK' for command in packet.commands):
+                    self._on_echo(device, packet.seq)
+
+    def _on_echo(self, device, seq):
+        received_at = time.monotonic()
+        sent = device.sent_at.pop(seq, None)
+        if sent is None:
+            return
+        device.echoes += 1
+        device.last_echo_ms = (received_at - sent) * 1000
+        ECHO_RTT_MS.observe(device.last_echo_ms)
+        if self.on_echo is not None:
+            self.on_echo(device, seq, received_at)
+
+    async def _disconnect(self, device):
+        if device.reader_task is not None and device.reader_task is not asyncio.current_task():
+            device.reader_task.cancel()
+        device.reader_task = None
+        try:
+            await asyncio.wait_for(device.transport.close(), SETTINGS['BLUETOOTH_CONNECT_TIMEOUT'])
+        except Exception as e:
+            self.logger.error("Bluetooth close error on %s: %r", device.name, e)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if cache.get('transport') != self.transport_cls.__name__:
+            return []
+        return cache.get('devices', [])[:self.max_devices]
+
+    def _save_cache(self):
+        cache = {
+            'transport': self.transport_cls.__name__,
+            'devices': [{'address': address, 'name': device.name} for address, device in self.devices.items()],
+        }
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump(cache, f)
+        except OSError as e:
+            self.logger.warning("Could not cache Bluetooth devices: %s", e)
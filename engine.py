@@ -0,0 +1,298 @@
+"""
+Capture -> detect -> decide -> actuate, independent of any UI.
+
+DetectionEngine owns the detection stack, the frame pipeline, the smoothed
+light state and the actuators (haptic units, audio, decision log). The Kivy
+app in main.py is a view on top of it, headless.py runs it from the command
+line and replay.py uses it to play recordings back. This module does not
+import Kivy, cv2 or an inference runtime; build_detection_stack pulls those
+in when it is called.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from config import COLOR_GATE_ENABLED, TRACKING_ENABLED, DETECTION_CACHE_ENABLED, GOVERNOR_ENABLED, WATCH_ENABLED
+from governor import AdaptiveGovernor
+from latency import LatencyTrace
+from light_state import LightStateTracker
+from metrics import REGISTRY
+from pipeline import FramePacket, FramePipeline
+from settings import SETTINGS
+
+STATE_TRANSITIONS = REGISTRY.counter('light_state_transitions_total', 'Confirmed light state changes')
+DECISION_LATENCY_MS = REGISTRY.histogram('decision_latency_ms', 'First vote for a state to its confirmation in milliseconds')
+
+
+class DetectionStack:
+    """The model and the optional layers in front of it: color gate, tracker and cache."""
+
+    def __init__(self, detector, gate=None, tracker=None, cache=None):
+        self.detector = detector
+        # Skips the model on frames with no lit lamps in them
+        self.gate = gate
+        # Tracks lights between periodic full detections
+        self.tracker = tracker
+        # Reuses the last detections while the scene stands still
+        self.cache = cache
+
+    @property
+    def head(self):
+        """The outermost layer; the one frames are given to."""
+        return self.cache or self.tracker or self.gate or self.detector
+
+    @property
+    def ready(self):
+        return self.detector is not None and self.detector.model is not None
+
+    def reset(self):
+        """Forget per-scene state, e.g. when a new camera or recording starts."""
+        for layer in (self.gate, self.tracker, self.cache):
+            if layer:
+                layer.reset()
+
+    @contextmanager
+    def clocked(self, clock):
+        """Give clock to the time-based layers (the cache's max_age) inside the block, then restore theirs."""
+        layers = [layer for layer in (self.gate, self.tracker, self.cache) if hasattr(layer, 'clock')]
+        saved = [layer.clock for layer in layers]
+        for layer in layers:
+            layer.clock = clock
+        try:
+            yield
+        finally:
+            for layer, previous in zip(layers, saved):
+                layer.clock = previous
+
+    def bind_settings(self):
+        """Let every layer follow runtime setting changes."""
+        SETTINGS.bind(self.detector, 'conf_threshold', 'CONFIDENCE_THRESHOLD')
+        if self.gate:
+            SETTINGS.bind(self.gate, 'force_interval', 'COLOR_GATE_FORCE_INTERVAL')
+        if self.tracker:
+            SETTINGS.bind(self.tracker, 'detect_interval', 'TRACKING_DETECT_INTERVAL')
+        if self.cache:
+            SETTINGS.bind(self.cache, 'threshold', 'DETECTION_CACHE_THRESHOLD')
+            SETTINGS.bind(self.cache, 'max_age', 'DETECTION_CACHE_MAX_AGE')
+
+
+class FrameClock:
+    """The capture time of the frame being processed, for layers that would otherwise read the wall clock."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def build_detection_stack(logger, gate=COLOR_GATE_ENABLED, tracking=TRACKING_ENABLED, cache=DETECTION_CACHE_ENABLED):
+    """Load and warm up the model and wrap it in the enabled layers."""
+    from detector import TrafficLightDetector
+    from tracker import TrafficLightTracker
+    from color_gate import GatedDetector
+    from detection_cache import CachedDetector
+    started = time.monotonic()
+    detector = TrafficLightDetector(logger)
+    if detector.model is None:
+        return DetectionStack(detector)
+    detector.warm_up()
+    stack = DetectionStack(detector)
+    stack.gate = GatedDetector(detector, logger) if gate else None
+    stack.tracker = TrafficLightTracker(stack.head, logger) if tracking else None
+    stack.cache = CachedDetector(stack.head, logger) if cache else None
+    logger.info("Model ready in %.1fs", time.monotonic() - started)
+    return stack
+
+
+class DetectionEngine:
+    """Runs the detection stack on a frame source and acts on light state changes.
+
+    Live sources go through start()/poll()/stop(): capture and inference run
+    on the pipeline threads and the caller polls for results at its own pace,
+    so the UI thread, or the headless main loop, never waits on the model.
+    While no light is around, live detection drops to the low-power watch
+    mode of power.PowerManager and wakes up by itself.
+    run() instead processes every frame of a finite source in order on the
+    calling thread, without watch mode, so replaying a recording always gives
+    the same decisions.
+    """
+
+    def __init__(self, stack, logger, bluetooth_manager=None, audio_manager=None, governor=GOVERNOR_ENABLED,
+                 watch=WATCH_ENABLED):
+        self.stack = stack
+        self.logger = logger
+        self.bluetooth_manager = bluetooth_manager
+        self.audio_manager = audio_manager
+        # Adapts capture rate and input size to the scene and the device
+        self.governor = AdaptiveGovernor(stack.detector, logger) if governor and stack.ready else None
+        # Skips the model entirely while nothing is happening
+        self.power = None
+        if watch and stack.ready:
+            from power import PowerManager
+            self.power = PowerManager(stack.head, logger, on_wake=self._on_wake)
+        # Smoothed light state; actuators only fire on its transitions
+        self.light_state = LightStateTracker()
+        self.cap = None
+        self.pipeline = None
+        self.recorder = None
+        self.decision_log = None
+        self.last_audio_at = None
+        self._bind_settings()
+
+    def _bind_settings(self):
+        SETTINGS.bind(self.light_state, 'confirm_frames', 'STATE_CONFIRM_FRAMES')
+        SETTINGS.bind(self.light_state, 'switch_margin', 'STATE_SWITCH_MARGIN')
+        if self.stack.ready:
+            self.stack.bind_settings()
+        if self.governor:
+            SETTINGS.bind(self.governor, 'fps_min', 'FPS_MIN')
+            SETTINGS.bind(self.governor, 'fps_base', 'FPS')
+            SETTINGS.bind(self.governor, 'fps_max', 'FPS_MAX')
+            SETTINGS.bind(self.governor, 'latency_budget_ms', 'LATENCY_BUDGET_MS')
+        if self.power:
+            SETTINGS.bind(self.power, 'idle_after', 'IDLE_TIMEOUT')
+            SETTINGS.bind(self.power, 'watch_fps', 'WATCH_FPS')
+            SETTINGS.bind(self.power, 'wake_threshold', 'WATCH_WAKE_THRESHOLD')
+            SETTINGS.bind(self.power, 'check_interval', 'WATCH_CHECK_INTERVAL')
+
+    @property
+    def running(self):
+        return self.pipeline is not None
+
+    @property
+    def capture_failed(self):
+        return self.pipeline is not None and self.pipeline.capture_failed
+
+    @property
+    def poll_interval(self):
+        """Seconds between polls: the highest rate the governor may choose. Polls without a new frame are no-ops."""
+        return 1.0 / (SETTINGS['FPS_MAX'] if self.governor else SETTINGS['FPS'])
+
+    def start(self, cap, decisions_path=None, recording_dir=None):
+        """Start the capture and inference threads on cap.
+
+        With recording_dir the camera input is recorded there for replay.py,
+        together with the decisions unless decisions_path says otherwise.
+        """
+        from frame_source import FrameRecorder, DecisionLog
+        self.stop()
+        self.cap = cap
+        if recording_dir:
+            self.recorder = FrameRecorder(recording_dir, self.logger)
+            decisions_path = decisions_path or os.path.join(recording_dir, 'decisions.jsonl')
+            self.logger.info("Recording to %s", recording_dir)
+        self.decision_log = DecisionLog(decisions_path) if decisions_path else None
+        self._reset()
+        self.pipeline = FramePipeline(cap, self.power or self.stack.head, self.logger, governor=self.governor,
+                                      recorder=self.recorder, power=self.power)
+        SETTINGS.bind(self.pipeline, 'fps', 'FPS')
+        self.pipeline.start()
+
+    def stop(self):
+        """Stop the pipeline, release the camera and close the recording and decision log."""
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline = None
+            if self.power:
+                report = self.power.report()
+                self.logger.info("Power: %.0fs active, %.0fs watching, %d wake-ups",
+                                 report['active'], report['watch'], report['wakeups'])
+        if self.cap:
+            self.cap.release()
+            self.cap = None
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
+        if self.decision_log:
+            self.decision_log.close()
+            self.decision_log = None
+
+    def poll(self):
+        """Process every finished pipeline result in order; returns the newest FramePacket to show, if any."""
+        if self.pipeline is None:
+            return None
+        for packet in self.pipeline.get_completed():
+            self.process(packet)
+        return self.pipeline.get_latest()
+
+    def run(self, source, decisions_path=None, max_frames=None):
+        """Process every frame of source in order on this thread; returns (frames, seconds).
+
+        Votes are stamped with source.timestamp (a recording's capture time,
+        a video file's position) or else with the frame count at FPS, never
+        with the wall clock, so the decisions do not depend on how fast the
+        host gets through the frames. The stack's time-based layers follow
+        the same timestamps for the same reason.
+        """
+        from frame_source import DecisionLog
+        self.decision_log = DecisionLog(decisions_path) if decisions_path else None
+        self._reset()
+        frames = 0
+        clock = FrameClock()
+        started = time.monotonic()
+        try:
+            with self.stack.clocked(clock):
+                while max_frames is None or frames < max_frames:
+                    ret, frame = source.read()
+                    if not ret:
+                        break
+                    timestamp = getattr(source, 'timestamp', None)
+                    packet = FramePacket(frames, frame, frames / SETTINGS['FPS'] if timestamp is None else timestamp)
+                    clock.now = packet.captured_at
+                    packet.detections = self.stack.head.detect_traffic_lights(frame)
+                    self.process(packet)
+                    frames += 1
+        finally:
+            if self.decision_log:
+                self.decision_log.close()
+                self.decision_log = None
+        return frames, time.monotonic() - started
+
+    def process(self, packet):
+        """Feed one frame's detections to the light state; returns the new state on a transition."""
+        transition = self.light_state.update(packet.detections, packet.captured_at)
+        if transition:
+            self.on_light_state_changed(transition, packet)
+        return transition
+
+    def on_light_state_changed(self, state, packet):
+        """Drive the haptic units, audio and decision log from a confirmed state transition."""
+        latency = self.light_state.last_decision_latency
+        self.logger.info("Light state changed to %s (decided in %.2fs)", state, latency)
+        STATE_TRANSITIONS.inc()
+        DECISION_LATENCY_MS.observe(latency * 1000)
+        if self.decision_log:
+            self.decision_log.log('vibration', state, frame=packet.frame_id, timestamp=packet.captured_at,
+                                  decision_latency=latency)
+        if self.bluetooth_manager:
+            trace = None
+            if self.running:
+                trace = LatencyTrace(state, onset=packet.captured_at - latency, captured=packet.captured_at,
+                                     inferred=packet.completed_at, decided=time.monotonic())
+            self.bluetooth_manager.send_vibration_command(state, trace=trace)
+
+        # Play the red sound once per red phase, with interval check
+        if state == 'RED' and (self.last_audio_at is None
+                               or packet.captured_at - self.last_audio_at >= SETTINGS['AUDIO_INTERVAL_RED']):
+            try:
+                if self.audio_manager:
+                    self.audio_manager.play_sound('red')
+                if self.decision_log:
+                    self.decision_log.log('audio', 'red', frame=packet.frame_id, timestamp=packet.captured_at)
+            except Exception as e:
+                self.logger.error("Error playing audio: %s", e)
+            self.last_audio_at = packet.captured_at
+
+    def _on_wake(self, now):
+        # Runs on the inference thread, which is the only one using the stack
+        self.stack.reset()
+        if self.governor:
+            self.governor.boost(now)
+
+    def _reset(self):
+        self.stack.reset()
+        if self.power:
+            self.power.reset()
+        self.light_state.reset()
+        self.last_audio_at = None
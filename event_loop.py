@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import EVENT_LOOP_WORKERS
+
+
+class EventLoop:
+    """A single asyncio loop on a background thread that owns the app's I/O.
+
+    Other threads (Kivy, the pipeline) never touch the loop directly: they
+    hand it coroutines with submit() or callbacks with call_soon(), both of
+    which are thread safe. Blocking calls made from coroutines through
+    asyncio.to_thread() share a small fixed pool instead of spawning threads.
+    """
+
+    def __init__(self, name='io-loop', workers=EVENT_LOOP_WORKERS):
+        self.name = name
+        self.workers = workers
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the loop thread if it is not already running."""
+        with self._lock:
+            if self.running:
+                return self
+            self.loop = asyncio.new_event_loop()
+            self.loop.set_default_executor(ThreadPoolExecutor(max_workers=self.workers,
+                                                              thread_name_prefix=f'{self.name}-blocking'))
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+        return self
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+            self.loop.close()
+
+    def submit(self, coro, timeout=None):
+        """Schedule coro on the loop and return a concurrent.futures.Future.
+
+        With a timeout the coroutine is cancelled on the loop when it runs
+        over, and the future raises TimeoutError. Cancelling the returned
+        future cancels the coroutine as well.
+        """
+        self.start()
+        if timeout is not None:
+            coro = asyncio.wait_for(coro, timeout)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Run callback(*args) on the loop thread."""
+        self.start()
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) on the loop thread after delay seconds; returns a cancellable future."""
+        async def delayed():
+            await asyncio.sleep(delay)
+            callback(*args)
+        return self.submit(delayed())
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    def stop(self, timeout=2.0):
+        """Cancel all outstanding tasks and stop the loop thread."""
+        with self._lock:
+            if not self.running:
+                return
+            future = asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop)
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+            self._thread = None
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Shared loop used by Bluetooth, audio and timers
+IO_LOOP = EventLoop()
@@ -0,0 +1,155 @@
+"""
+Stand-ins shared by the test scripts: detectors that return what they are
+told to, a clock that only moves when the test moves it, a frame source that
+plays a list of frames like a recording, and synthetic street frames.
+"""
+
+import logging
+import time
+import cv2
+import numpy as np
+from config import CLASS_NAMES
+from detector import detections_to_dicts
+
+RED = (20, 20, 255)
+GREEN = (120, 255, 40)
+YELLOW = (0, 200, 255)
+CLASS_IDS = {name: cls for cls, name in CLASS_NAMES.items()}
+LAMP_BOX = [300, 180, 340, 220]  # around the default make_frame lamp
+RED_BOX = LAMP_BOX + [0.9, CLASS_IDS['Red']]
+GREEN_BOX = LAMP_BOX + [0.9, CLASS_IDS['Green']]
+
+
+class FakeDetector:
+    """Returns `box` (or nothing) for every frame and records the frame shapes it was given."""
+
+    def __init__(self, box=None):
+        self.model = object()
+        self.class_names = CLASS_NAMES
+        self.conf_threshold = 0.7
+        self.imgsz = 640
+        self.box = box
+        self.calls = []
+        # Reported duration of every model call, as TrafficLightDetector measures it
+        self.last_call_ms = 20.0
+
+    @property
+    def frames(self):
+        """Frames detected so far."""
+        return sum(len(call) for call in self.calls)
+
+    @property
+    def model_calls(self):
+        return len(self.calls)
+
+    def detect_batch(self, frames):
+        self.calls.append([frame.shape for frame in frames])
+        return [self._boxes(self.box) for _ in frames]
+
+    @staticmethod
+    def _boxes(box):
+        return np.array([box] if box is not None else [], dtype=np.float32).reshape(-1, 6)
+
+    def detect_traffic_lights(self, frame):
+        return detections_to_dicts(self.detect_batch([frame])[0], self.class_names)
+
+    def set_imgsz(self, imgsz):
+        self.imgsz = imgsz
+        return True
+
+
+def frame_index(frame):
+    """The index ListSource stamps into a frame's first pixel."""
+    return int(frame[0, 0, 0])
+
+
+class ScriptedDetector(FakeDetector):
+    """Returns script[key(frame)] (a box or None) for every frame.
+
+    key defaults to the index ListSource stamps into each frame. Frames whose
+    key is in `failing` raise instead, and every model call takes `delay`
+    seconds, to stand in for a slow host.
+    """
+
+    def __init__(self, script, key=frame_index, delay=0.0, failing=()):
+        super().__init__()
+        self.script = script
+        self.key = key
+        self.delay = delay
+        self.failing = set(failing)
+        self.failed = 0
+
+    def detect_batch(self, frames):
+        keys = [self.key(frame) for frame in frames]
+        if self.failing.intersection(keys):
+            self.failed += 1
+            raise RuntimeError('scripted failure')
+        time.sleep(self.delay)
+        self.calls.append([frame.shape for frame in frames])
+        return [self._boxes(self.script[key]) for key in keys]
+
+
+class ListSource:
+    """Plays frames back like a recording: each one stamped with its index, timestamps at `fps`.
+
+    `delay` seconds per read stand in for a slow camera or disk.
+    """
+
+    def __init__(self, frames, fps=15, delay=0.0):
+        self.frames = [stamp(frame, index) for index, frame in enumerate(frames)]
+        self.fps = fps
+        self.delay = delay
+        self.index = 0
+        self.timestamp = None
+
+    def read(self):
+        if self.index >= len(self.frames):
+            return False, None
+        time.sleep(self.delay)
+        frame = self.frames[self.index]
+        self.timestamp = 1000.0 + self.index / self.fps
+        self.index += 1
+        return True, frame
+
+    def isOpened(self):
+        return self.index < len(self.frames)
+
+    def release(self):
+        self.index = len(self.frames)
+
+
+class FakeClock:
+    """Monotonic clock stand-in; tests advance `now` themselves."""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_frame(color=None, center=(320, 200), radius=10, lamps=(), shift=0, noise=0, seed=0):
+    """A dark street with a gray block (moved right by `shift`), one lamp of `color` and red `lamps`."""
+    frame = np.full((480, 640, 3), 40, dtype=np.uint8)
+    cv2.rectangle(frame, (100 + shift, 300), (200 + shift, 400), (90, 90, 90), -1)
+    if color is not None:
+        cv2.circle(frame, center, radius, color, -1)
+    for lamp in lamps:
+        cv2.circle(frame, lamp, 8, RED, -1)
+    if noise:
+        jitter = np.random.default_rng(seed).integers(-noise, noise + 1, frame.shape)
+        frame = np.clip(frame.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+    return frame
+
+
+def stamp(frame, index):
+    """A copy of frame with index in its first pixel; too small a change for the gate, tracker or cache to notice."""
+    frame = frame.copy()
+    frame[0, 0, 0] = index
+    return frame
+
+
+def make_layer(layer_class, box=None, **kwargs):
+    """Wrap a FakeDetector in layer_class with a FakeClock; returns (layer, detector, clock)."""
+    detector, clock = FakeDetector(box), FakeClock()
+    return layer_class(detector, logging.getLogger('test'), clock=clock, **kwargs), detector, clock
@@ -0,0 +1,234 @@
+"""
+Frame sources, recording and decision logs.
+
+Anything with cv2.VideoCapture's read()/isOpened()/release() methods can
+feed the frame pipeline; ReplaySource plays a recording back that way and
+VideoFileSource stamps video file frames with their position in the video.
+
+A recording is a directory of chunk files plus an index.json. Each chunk
+holds up to RECORDING_CHUNK_FRAMES JPEG frames, each stored as a
+little-endian (float64 timestamp, uint32 length) header followed by the
+encoded bytes. The index is rewritten whenever a chunk is closed, so an
+interrupted recording loses at most the chunk being written.
+"""
+
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+from config import RECORDING_CHUNK_FRAMES, RECORDING_JPEG_QUALITY, RECORDING_QUEUE_SIZE, FPS
+
+FORMAT_VERSION = 1
+RECORD_HEADER = struct.Struct('<dI')
+INDEX_NAME = 'index.json'
+
+
+class FrameRecorder:
+    """Stores frames and timestamps to disk from a background thread.
+
+    record() copies the frame onto a small bounded queue and JPEG encoding
+    happens on the writer thread. If the encoder falls behind, new frames are
+    dropped and counted instead of stalling capture, so recording can stay on
+    during live detection.
+    """
+
+    def __init__(self, directory, logger, chunk_frames=RECORDING_CHUNK_FRAMES,
+                 jpeg_quality=RECORDING_JPEG_QUALITY, queue_size=RECORDING_QUEUE_SIZE):
+        self.directory = directory
+        self.logger = logger
+        self.chunk_frames = chunk_frames
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.chunks = []
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._chunk = None
+        self._chunk_info = None
+        os.makedirs(directory, exist_ok=True)
+        self._writer = threading.Thread(target=self._write_loop, name='recorder', daemon=True)
+        self._writer.start()
+
+    def record(self, frame, timestamp):
+        if self._queue.full():
+            self.frames_dropped += 1
+            return
+        # The preview draws on the captured frame later, so keep a clean copy
+        try:
+            self._queue.put_nowait((frame.copy(), timestamp))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def close(self):
+        """Flush queued frames, close the last chunk and write the index."""
+        self._queue.put(None)
+        self._writer.join()
+        self.logger.info("Recording saved to %s: %d frames, %d dropped",
+                         self.directory, self.frames_written, self.frames_dropped)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame, timestamp = item
+            try:
+                ok, encoded = cv2.imencode('.jpg', frame, self.encode_params)
+                if not ok:
+                    raise ValueError("JPEG encoding failed")
+                self._write(encoded.tobytes(), timestamp)
+            except Exception as e:
+                self.frames_dropped += 1
+                self.logger.error("Recording error: %s", e)
+        self._close_chunk()
+
+    def _write(self, data, timestamp):
+        if self._chunk is None:
+            name = f'chunk_{len(self.chunks):05d}.bin'
+            self._chunk = open(os.path.join(self.directory, name), 'wb')
+            self._chunk_info = {'file': name, 'frames': 0, 'start': timestamp, 'end': timestamp}
+        self._chunk.write(RECORD_HEADER.pack(timestamp, len(data)))
+        self._chunk.write(data)
+        self._chunk_info['frames'] += 1
+        self._chunk_info['end'] = timestamp
+        self.frames_written += 1
+        if self._chunk_info['frames'] >= self.chunk_frames:
+            self._close_chunk()
+
+    def _close_chunk(self):
+        if self._chunk is None:
+            return
+        self._chunk.close()
+        self.chunks.append(self._chunk_info)
+        self._chunk = None
+        self._chunk_info = None
+        index = {'version': FORMAT_VERSION, 'frames': self.frames_written, 'chunks': self.chunks}
+        tmp_path = os.path.join(self.directory, INDEX_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_NAME))
+
+
+def iter_recording(directory):
+    """Yield (timestamp, encoded_jpeg_bytes) for every frame of a recording."""
+    with open(os.path.join(directory, INDEX_NAME)) as f:
+        index = json.load(f)
+    if index.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recording version {index.get('version')}")
+    for chunk in index['chunks']:
+        with open(os.path.join(directory, chunk['file']), 'rb') as f:
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                timestamp, length = RECORD_HEADER.unpack(header)
+                yield timestamp, f.read(length)
+
+
+class ReplaySource:
+    """Plays a recording back through the same read() interface as a camera.
+
+    With realtime=True frames are released on the original schedule;
+    otherwise they are returned as fast as they can be decoded.
+    """
+
+    def __init__(self, directory, realtime=True):
+        self.directory = directory
+        self.realtime = realtime
+        self.timestamp = None
+        self._frames = iter_recording(directory)
+        self._opened = True
+        self._offset = None
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        try:
+            timestamp, data = next(self._frames)
+        except StopIteration:
+            self._opened = False
+            return False, None
+        if self.realtime:
+            now = time.monotonic()
+            if self._offset is None:
+                self._offset = now - timestamp
+            delay = timestamp + self._offset - now
+            if delay > 0:
+                time.sleep(delay)
+        self.timestamp = timestamp
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+    def isOpened(self):
+        return self._opened
+
+    def release(self):
+        self._opened = False
+        self._frames.close()
+
+
+class VideoFileSource:
+    """Reads a video file and stamps each frame with its position in the video.
+
+    Timestamps come from CAP_PROP_POS_MSEC, or from the frame count and the
+    file's frame rate when the backend does not report positions, so the
+    same file always gives the same timestamps however fast it is read.
+    """
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else FPS
+        self.index = 0
+        self.timestamp = None
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return ret, frame
+        position = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if self.timestamp is not None and position <= self.timestamp:
+            position = self.index / self.fps
+        self.timestamp = position
+        self.index += 1
+        return ret, frame
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+def open_source(spec, realtime=False):
+    """Camera index, recording directory or video file -> (source, drop_frames)."""
+    if spec.isdigit():
+        return cv2.VideoCapture(int(spec)), True
+    if os.path.isdir(spec):
+        return ReplaySource(spec, realtime=realtime), False
+    return VideoFileSource(spec), False
+
+
+class DecisionLog:
+    """Appends actuator decisions as JSON lines so runs can be compared. A path of '-' writes to stdout."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = sys.stdout if path == '-' else open(path, 'a')
+        self._lock = threading.Lock()
+
+    def log(self, event, value, **fields):
+        entry = {'time': time.monotonic(), 'event': event, 'value': value}
+        entry.update(fields)
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not sys.stdout:
+                self._file.close()
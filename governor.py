@@ -0,0 +1,163 @@
+import glob
+import os
+import time
+from config import (FPS, FPS_MIN, FPS_MAX, GOVERNOR_IDLE_AFTER, GOVERNOR_NEAR_AREA,
+                    GOVERNOR_ACTIVE_HOLD, LATENCY_BUDGET_MS, GOVERNOR_IMGSZ_OPTIONS,
+                    GOVERNOR_COOLDOWN_FRAMES, THERMAL_LIMIT_C)
+from light_state import select_primary
+
+
+def read_cpu_load():
+    """Fraction of CPU capacity in use (0-1), or None if it cannot be measured."""
+    try:
+        import psutil
+        return psutil.cpu_percent(interval=None) / 100.0
+    except ImportError:
+        pass
+    try:
+        return min(1.0, os.getloadavg()[0] / (os.cpu_count() or 1))
+    except (AttributeError, OSError):
+        return None
+
+
+def read_temperature():
+    """Hottest thermal zone in degrees Celsius on Linux/Android, or None."""
+    temps = []
+    for path in glob.glob('/sys/class/thermal/thermal_zone*/temp'):
+        try:
+            with open(path) as f:
+                value = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        # Most kernels report millidegrees, a few report degrees
+        temps.append(value / 1000.0 if value > 1000 else float(value))
+    return max(temps) if temps else None
+
+
+class AdaptiveGovernor:
+    """Chooses the capture rate and inference input size at runtime.
+
+    The rate drops to FPS_MIN when no light has been seen for
+    GOVERNOR_IDLE_AFTER seconds, returns to FPS while lights are around, and
+    goes up to FPS_MAX when a light is close or its color is changing. The
+    input size steps down through GOVERNOR_IMGSZ_OPTIONS while the smoothed
+    inference latency is over LATENCY_BUDGET_MS and steps back up once there
+    is comfortable headroom. Only frames the model itself ran on count
+    towards the latency; the gate, tracker and cache answer most frames
+    far faster than the model and would hide its real cost. High CPU load
+    or temperature caps both.
+    """
+
+    def __init__(self, detector, logger, latency_budget_ms=LATENCY_BUDGET_MS,
+                 imgsz_options=GOVERNOR_IMGSZ_OPTIONS):
+        self.detector = detector
+        self.logger = logger
+        self.latency_budget_ms = latency_budget_ms
+        self.imgsz_options = sorted(imgsz_options)
+        self.imgsz = detector.imgsz if detector.imgsz in self.imgsz_options else self.imgsz_options[-1]
+        # Rate limits; plain attributes so runtime settings can change them
+        self.fps_min = FPS_MIN
+        self.fps_base = FPS
+        self.fps_max = FPS_MAX
+        self.fps = FPS
+        self.latency_ema = None
+        self.last_seen = None
+        self.active_until = 0.0
+        self.last_color = None
+        self.frames_since_resize = 0
+        self.model_calls = detector.model_calls
+        self.cpu_load = None
+        self.temperature = None
+        self._last_headroom_check = 0.0
+
+    def observe(self, detections, frame_shape, inference_ms=None, now=None):
+        """Update the governor with one frame's detections.
+
+        inference_ms defaults to the detector's last_call_ms when the model
+        ran since the previous frame; without a model call the input size is
+        left alone.
+        """
+        now = time.monotonic() if now is None else now
+        self._update_headroom(now)
+        self._update_rate(detections, frame_shape, now)
+        if inference_ms is None and self.detector.model_calls != self.model_calls:
+            inference_ms = self.detector.last_call_ms
+        self.model_calls = self.detector.model_calls
+        if inference_ms is not None:
+            self._update_imgsz(inference_ms)
+
+    def boost(self, now=None):
+        """Run at FPS_MAX for a while, e.g. when waking up from watch mode."""
+        now = time.monotonic() if now is None else now
+        self.active_until = now + GOVERNOR_ACTIVE_HOLD
+        self.fps = self.fps_max
+
+    def _update_headroom(self, now):
+        # Reading /sys and load averages is cheap but not free; once a second is plenty
+        if now - self._last_headroom_check < 1.0:
+            return
+        self._last_headroom_check = now
+        self.cpu_load = read_cpu_load()
+        self.temperature = read_temperature()
+
+    @property
+    def throttled(self):
+        hot = self.temperature is not None and self.temperature >= THERMAL_LIMIT_C
+        busy = self.cpu_load is not None and self.cpu_load >= 0.9
+        return hot or busy
+
+    def _update_rate(self, detections, frame_shape, now):
+        primary = select_primary(detections)
+        if primary is not None:
+            self.last_seen = now
+            x1, y1, x2, y2 = primary['bbox']
+            area = (x2 - x1) * (y2 - y1) / float(frame_shape[0] * frame_shape[1])
+            changing = self.last_color is not None and primary['color'] != self.last_color
+            if area >= GOVERNOR_NEAR_AREA or changing:
+                self.active_until = now + GOVERNOR_ACTIVE_HOLD
+            self.last_color = primary['color']
+
+        if now < self.active_until:
+            fps = self.fps_max
+        elif self.last_seen is not None and now - self.last_seen < GOVERNOR_IDLE_AFTER:
+            fps = self.fps_base
+        else:
+            fps = self.fps_min
+        if self.throttled:
+            fps = min(fps, self.fps_base)
+        if fps != self.fps:
+            self.logger.debug("Governor: capture rate %s -> %s FPS", self.fps, fps)
+            self.fps = fps
+
+    def _update_imgsz(self, inference_ms):
+        self.latency_ema = inference_ms if self.latency_ema is None else 0.8 * self.latency_ema + 0.2 * inference_ms
+        self.frames_since_resize += 1
+        if self.frames_since_resize < GOVERNOR_COOLDOWN_FRAMES:
+            return
+
+        index = self.imgsz_options.index(self.imgsz)
+        if (self.latency_ema > self.latency_budget_ms or self.throttled) and index > 0:
+            new_imgsz = self.imgsz_options[index - 1]
+        elif (self.latency_ema < 0.5 * self.latency_budget_ms and not self.throttled
+              and index < len(self.imgsz_options) - 1):
+            new_imgsz = self.imgsz_options[index + 1]
+        else:
+            return
+        if self.detector.set_imgsz(new_imgsz):
+            self.logger.info("Governor: input size %s -> %s (latency %.0f ms)",
+                             self.imgsz, new_imgsz, self.latency_ema)
+            self.imgsz = new_imgsz
+            # Let the new size settle before judging it
+            self.latency_ema = None
+            self.frames_since_resize = 0
+
+    def report(self):
+        return {
+            'fps': self.fps,
+            'imgsz': self.imgsz,
+            'latency_ms': self.latency_ema,
+            'latency_budget_ms': self.latency_budget_ms,
+            'cpu_load': self.cpu_load,
+            'temperature_c': self.temperature,
+            'throttled': self.throttled,
+        }
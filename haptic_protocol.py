@@ -0,0 +1,158 @@
+"""
+Compact binary framing for commands sent to the haptic units.
+
+A packet is a one-byte header (protocol version in the high nibble, command
+count in the low nibble) and a one-byte sequence number, followed by the
+commands. Each command is a one-byte opcode; when the opcode has
+FLAG_PARAMS set it is followed by an intensity byte (0-255) and a duration
+byte in 10 ms steps. A light change with a vibration toggle fits in 4-8
+bytes, well inside a single 20-byte BLE write.
+
+    RED, intensity 255, 400 ms, seq 7  ->  11 07 81 ff 28
+"""
+
+from collections import namedtuple
+
+VERSION = 1
+FLAG_PARAMS = 0x80
+DURATION_STEP_MS = 10
+MAX_COMMANDS = 15
+MAX_PACKET_SIZE = 20  # ATT payload with the default 23-byte MTU
+
+OPCODES = {
+    'RED': 0x01,
+    'YELLOW': 0x02,
+    'GREEN': 0x03,
+    'OFF': 0x04,
+    'VIB_ON': 0x10,
+    'VIB_OFF': 0x11,
+    'PING': 0x20,
+    'ACK': 0x7F,  # sent by the unit; echoes the sequence number it received
+}
+NAMES = {code: name for name, code in OPCODES.items()}
+
+Command = namedtuple('Command', ['name', 'intensity', 'duration_ms'], defaults=(None, None))
+Packet = namedtuple('Packet', ['version', 'seq', 'commands'])
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def is_packet(data):
+    """True if data looks like a binary packet rather than a legacy text command."""
+    return len(data) >= 2 and data[0] >> 4 == VERSION and 0 < data[0] & 0x0F <= MAX_COMMANDS
+
+
+def encode_packet(commands, seq):
+    """Encode Commands (or plain command names) into one packet."""
+    commands = [Command(c) if isinstance(c, str) else c for c in commands]
+    if not 0 < len(commands) <= MAX_COMMANDS:
+        raise ProtocolError(f"A packet carries 1-{MAX_COMMANDS} commands, got {len(commands)}")
+    out = bytearray([(VERSION << 4) | len(commands), seq & 0xFF])
+    for command in commands:
+        if command.name not in OPCODES:
+            raise ProtocolError(f"Unknown command {command.name!r}")
+        opcode = OPCODES[command.name]
+        if command.intensity is None and command.duration_ms is None:
+            out.append(opcode)
+            continue
+        intensity = 255 if command.intensity is None else command.intensity
+        duration = 0 if command.duration_ms is None else command.duration_ms
+        if not 0 <= intensity <= 255:
+            raise ProtocolError(f"Intensity {intensity} out of range 0-255")
+        steps = round(duration / DURATION_STEP_MS)
+        if not 0 <= steps <= 255:
+            raise ProtocolError(f"Duration {duration} ms out of range 0-{255 * DURATION_STEP_MS}")
+        out += bytes([opcode | FLAG_PARAMS, intensity, steps])
+    return bytes(out)
+
+
+def decode_packet(data):
+    """Decode a packet into a Packet; raises ProtocolError on malformed input."""
+    if len(data) < 2:
+        raise ProtocolError("Packet too short")
+    version, count = data[0] >> 4, data[0] & 0x0F
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    commands = []
+    pos = 2
+    for _ in range(count):
+        if pos >= len(data):
+            raise ProtocolError("Packet truncated")
+        opcode = data[pos]
+        name = NAMES.get(opcode & ~FLAG_PARAMS)
+        if name is None:
+            raise ProtocolError(f"Unknown opcode 0x{opcode:02x}")
+        if opcode & FLAG_PARAMS:
+            if pos + 3 > len(data):
+                raise ProtocolError("Packet truncated")
+            commands.append(Command(name, data[pos + 1], data[pos + 2] * DURATION_STEP_MS))
+            pos += 3
+        else:
+            commands.append(Command(name))
+            pos += 1
+    if pos != len(data):
+        raise ProtocolError(f"{len(data) - pos} trailing bytes")
+    return Packet(version, data[1], commands)
+
+
+def packet_length(data):
+    """Length of the packet at the start of data, or None if it is not complete yet."""
+    if len(data) < 2:
+        return None
+    pos = 2
+    for _ in range(data[0] & 0x0F):
+        if pos >= len(data):
+            return None
+        pos += 3 if data[pos] & FLAG_PARAMS else 1
+    return pos if pos <= len(data) else None
+
+
+def split_packets(buffer):
+    """Decode complete packets from the front of a bytearray, removing them; partial data stays."""
+    packets = []
+    while True:
+        length = packet_length(buffer)
+        if length is None:
+            return packets
+        data = bytes(buffer[:length])
+        del buffer[:length]
+        packets.append(decode_packet(data))
+
+
+def encode_ack(seq):
+    return encode_packet([Command('ACK')], seq)
+
+
+class PacketEncoder:
+    """Numbers packets and splits batches that would not fit in one write."""
+
+    def __init__(self, patterns=None, max_size=MAX_PACKET_SIZE):
+        self.patterns = patterns or {}
+        self.max_size = max_size
+        self.seq = 0
+
+    def command(self, name):
+        """Command for name, with the configured intensity and duration if any."""
+        pattern = self.patterns.get(name)
+        return Command(name, *pattern) if pattern else Command(name)
+
+    def encode(self, names):
+        """Encode command names into as few packets as fit in max_size; returns [(seq, bytes)]."""
+        packets = []
+        batch = []
+        for name in names:
+            command = self.command(name)
+            if batch and (len(batch) == MAX_COMMANDS or len(encode_packet(batch + [command], 0)) > self.max_size):
+                packets.append(self._next(batch))
+                batch = []
+            batch.append(command)
+        if batch:
+            packets.append(self._next(batch))
+        return packets
+
+    def _next(self, commands):
+        seq = self.seq
+        self.seq = (self.seq + 1) & 0xFF
+        return seq, encode_packet(commands, seq)
@@ -0,0 +1,119 @@
+"""
+Run traffic light detection without a display.
+
+Live cameras go through the threaded frame pipeline and always work on the
+newest frame, like the app. Video files and recordings are processed frame
+by frame, so their decisions are reproducible. Decisions are written as JSON
+lines; settings.json is watched and reloaded while running.
+
+    python headless.py                          # cached or first working camera
+    python headless.py 1 --bluetooth            # camera 1, drive the haptic units
+    python headless.py drive.mp4 --decisions out.jsonl
+"""
+
+import argparse
+import signal
+import sys
+import time
+from config import TRACKING_ENABLED, COLOR_GATE_ENABLED, DETECTION_CACHE_ENABLED, GOVERNOR_ENABLED, METRICS_DUMP_PATH
+from engine import DetectionEngine, build_detection_stack
+from event_loop import IO_LOOP
+from latency import LATENCY
+from logger import setup_logger, shutdown_logging
+from metrics import REGISTRY
+from settings import SETTINGS, SettingsError
+
+
+def open_camera(spec, logger, realtime=False):
+    """(source, live) for a camera index, video file or recording; the cached camera when spec is None."""
+    from frame_source import open_source
+    if spec is None:
+        from camera_manager import CameraManager
+        return CameraManager(logger).open(), True
+    return open_source(spec, realtime=realtime)
+
+
+def run_live(engine, cap, decisions_path, recording_dir=None):
+    """Poll the engine until the camera goes away or the process is interrupted."""
+    engine.start(cap, decisions_path=decisions_path, recording_dir=recording_dir)
+    try:
+        while not (engine.capture_failed and not cap.isOpened()):
+            engine.poll()
+            time.sleep(engine.poll_interval)
+    finally:
+        engine.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect traffic lights and log decisions without a UI.')
+    parser.add_argument('source', nargs='?', help='camera index, video file or recording directory')
+    parser.add_argument('--decisions', default='-', help="JSON-lines output of decisions, '-' for stdout")
+    parser.add_argument('--record', metavar='DIR', help='record the camera input to DIR for replay.py')
+    parser.add_argument('--realtime', action='store_true', help='play recordings back on their original schedule')
+    parser.add_argument('--bluetooth', action='store_true', help='send decisions to the haptic units')
+    parser.add_argument('--audio', action='store_true', help='play the red light sound')
+    parser.add_argument('--no-gate', action='store_true', help='run the model even on frames with no lit lamps')
+    parser.add_argument('--no-tracking', action='store_true', help='run full detection on every frame')
+    parser.add_argument('--no-cache', action='store_true', help='detect again even when the scene has not changed')
+    args = parser.parse_args(argv)
+
+    logger = setup_logger()
+    try:
+        SETTINGS.load()
+    except SettingsError as e:
+        logger.error("Settings ignored, using defaults: %s", e)
+
+    stack = build_detection_stack(logger, gate=COLOR_GATE_ENABLED and not args.no_gate,
+                                  tracking=TRACKING_ENABLED and not args.no_tracking,
+                                  cache=DETECTION_CACHE_ENABLED and not args.no_cache)
+    if not stack.ready:
+        logger.error("Model failed to load, see logs/app.log")
+        return 1
+
+    bluetooth_manager = audio_manager = None
+    if args.bluetooth:
+        from bluetooth_manager import BluetoothManager
+        bluetooth_manager = BluetoothManager(logger)
+    if args.audio:
+        try:
+            from audio_utils import AudioManager
+            audio_manager = AudioManager(logger)
+        except Exception as e:
+            logger.error("Audio initialization failed: %s", e)
+
+    source, live = open_camera(args.source, logger, realtime=args.realtime)
+    if source is None or not source.isOpened():
+        logger.error("Cannot open %s", args.source if args.source is not None else 'any camera')
+        return 1
+
+    engine = DetectionEngine(stack, logger, bluetooth_manager, audio_manager, governor=GOVERNOR_ENABLED and live)
+    # Stop cleanly on SIGTERM as well as Ctrl+C, e.g. when run as a service
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    SETTINGS.watch(logger)
+    try:
+        if live:
+            run_live(engine, source, args.decisions, args.record)
+        else:
+            frames, elapsed = engine.run(source, decisions_path=args.decisions)
+            logger.info("Processed %d frames in %.1fs", frames, elapsed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.release()
+        SETTINGS.stop_watching()
+        if bluetooth_manager:
+            bluetooth_manager.close()
+        if audio_manager:
+            audio_manager.close()
+        IO_LOOP.stop()
+        LATENCY.close()
+        try:
+            REGISTRY.dump(METRICS_DUMP_PATH)
+        except OSError as e:
+            logger.error("Could not write metrics dump: %s", e)
+        shutdown_logging()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+Inference backends for TrafficLightDetector.
+
+Every backend exposes predict(frames, conf) returning one N x 6 float32
+array per frame laid out as (x1, y1, x2, y2, conf, cls) in frame pixel
+coordinates, and records per-stage timings in last_timings (milliseconds).
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+from config import (MODEL_PATH, ONNX_MODEL_PATH, MODEL_INPUT_SIZE,
+                    IOU_THRESHOLD, ONNX_PROVIDERS, ONNX_THREADS, INFERENCE_BACKEND)
+
+EMPTY_DETECTIONS = np.zeros((0, 6), dtype=np.float32)
+
+
+def letterbox(frame, size, pad_value=114):
+    """Resize keeping aspect ratio and pad to a size x size square.
+
+    Returns the padded image, the scale factor and the (x, y) padding so boxes
+    can be mapped back to the original frame.
+    """
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    pad_x, pad_y = (size - new_w) // 2, (size - new_h) // 2
+    canvas = np.full((size, size, 3), pad_value, dtype=np.uint8)
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = frame
+    return canvas, scale, (pad_x, pad_y)
+
+
+def preprocess_batch(frames, size):
+    """Letterbox BGR frames into a normalized RGB NCHW float32 batch."""
+    batch = np.empty((len(frames), 3, size, size), dtype=np.float32)
+    metas = []
+    for i, frame in enumerate(frames):
+        image, scale, pad = letterbox(frame, size)
+        # BGR HWC uint8 -> RGB CHW float in [0, 1]
+        batch[i] = image[:, :, ::-1].transpose(2, 0, 1)
+        metas.append((scale, pad, frame.shape[:2]))
+    batch *= 1.0 / 255.0
+    return batch, metas
+
+
+def non_max_suppression(boxes, scores, iou_threshold):
+    """Greedy NMS over xyxy boxes. Returns the indices of the kept boxes."""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-7)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(output, metas, conf_threshold, iou_threshold=IOU_THRESHOLD):
+    """Decode raw YOLOv8 output of shape (B, 4 + num_classes, anchors)."""
+    detections = []
+    for pred, (scale, (pad_x, pad_y), (h, w)) in zip(output, metas):
+        pred = pred.T  # anchors x (4 + num_classes)
+        class_scores = pred[:, 4:]
+        cls = class_scores.argmax(axis=1)
+        conf = class_scores[np.arange(len(cls)), cls]
+        mask = conf >= conf_threshold
+        if not mask.any():
+            detections.append(EMPTY_DETECTIONS)
+            continue
+        cx, cy, bw, bh = pred[mask, :4].T
+        boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+        conf, cls = conf[mask], cls[mask]
+
+        # Class-aware NMS: shift each class into its own coordinate range
+        offsets = cls[:, None].astype(np.float32) * 4096.0
+        keep = non_max_suppression(boxes + offsets, conf, iou_threshold)
+        boxes, conf, cls = boxes[keep], conf[keep], cls[keep]
+
+        # Undo the letterbox
+        boxes -= (pad_x, pad_y, pad_x, pad_y)
+        boxes /= scale
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        detections.append(np.column_stack([boxes, conf, cls]).astype(np.float32))
+    return detections
+
+
+def export_onnx(model_path=MODEL_PATH, onnx_path=ONNX_MODEL_PATH, imgsz=MODEL_INPUT_SIZE, logger=None):
+    """Export a PyTorch model to ONNX, reusing the cached file if it is up to date."""
+    if os.path.exists(onnx_path) and (not os.path.exists(model_path)
+                                      or os.path.getmtime(onnx_path) >= os.path.getmtime(model_path)):
+        return onnx_path
+    from ultralytics import YOLO
+    if logger:
+        logger.info("Exporting %s to ONNX (%spx)", model_path, imgsz)
+    exported = YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    if os.path.abspath(exported) != os.path.abspath(onnx_path):
+        os.replace(exported, onnx_path)
+    return onnx_path
+
+
+class UltralyticsBackend:
+    """PyTorch inference through ultralytics."""
+
+    name = 'ultralytics'
+    resizable = True
+
+    def __init__(self, logger, model_path=MODEL_PATH, imgsz=MODEL_INPUT_SIZE):
+        from ultralytics import YOLO
+        self.logger = logger
+        self.imgsz = imgsz
+        self.model = YOLO(model_path)
+        self.last_timings = {}
+
+    def predict(self, frames, conf):
+        results = self.model(list(frames), conf=conf, imgsz=self.imgsz, verbose=False)
+        # ultralytics reports per-image stage times in milliseconds
+        self.last_timings = {stage: ms * len(results) for stage, ms in results[0].speed.items()} if results else {}
+        # One device-to-host transfer per frame instead of one per box attribute
+        return [result.boxes.data[:, :6].cpu().numpy().astype(np.float32, copy=False)
+                for result in results]
+
+
+class OnnxBackend:
+    """ONNX Runtime inference with NumPy pre/post-processing and NMS.
+
+    ONNX_PROVIDERS lists the execution providers in order of preference; the
+    OpenVINO provider is used when the installed onnxruntime build has it.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, logger, onnx_path=ONNX_MODEL_PATH, imgsz=MODEL_INPUT_SIZE, providers=ONNX_PROVIDERS,
+                 auto_export=True):
+        import onnxruntime as ort
+        self.logger = logger
+        if auto_export:
+            # Re-exports only when model.pt is newer than the cached ONNX file
+            export_onnx(MODEL_PATH, onnx_path, imgsz, logger)
+        available = ort.get_available_providers()
+        providers = [p for p in providers if p in available] or ['CPUExecutionProvider']
+        options = ort.SessionOptions()
+        # Read at construction so multi-process callers can lower it per worker
+        options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=providers)
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Static exports fix the input size; dynamic ones accept the configured size
+        static_size = model_input.shape[-1]
+        self.imgsz = static_size if isinstance(static_size, int) else imgsz
+        self.resizable = not isinstance(static_size, int)
+        self.batch_dynamic = not isinstance(model_input.shape[0], int)
+        self.last_timings = {}
+        self.logger.info("ONNX Runtime session ready with %s", self.session.get_providers())
+
+    def predict(self, frames, conf):
+        start = time.perf_counter()
+        batch, metas = preprocess_batch(frames, self.imgsz)
+        preprocessed = time.perf_counter()
+        if self.batch_dynamic:
+            output = self.session.run(None, {self.input_name: batch})[0]
+        else:
+            output = np.concatenate([self.session.run(None, {self.input_name: batch[i:i + 1]})[0]
+                                     for i in range(len(batch))])
+        inferred = time.perf_counter()
+        detections = postprocess(output, metas, conf)
+        done = time.perf_counter()
+        self.last_timings = {
+            'preprocess': (preprocessed - start) * 1000,
+            'inference': (inferred - preprocessed) * 1000,
+            'postprocess': (done - inferred) * 1000,
+        }
+        return detections
+
+
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def create_backend(logger, name=INFERENCE_BACKEND, **kwargs):
+    """Instantiate the inference backend selected in config.py."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](logger, **kwargs)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Export model.pt to a cached ONNX file.')
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--output', default=ONNX_MODEL_PATH)
+    parser.add_argument('--imgsz', type=int, default=MODEL_INPUT_SIZE)
+    args = parser.parse_args()
+    print(export_onnx(args.model, args.output, args.imgsz))
@@ -0,0 +1,475 @@
+"""
+Headless multi-camera inference on a pool of detector processes.
+
+Each worker process loads the model once. Frames travel to the workers
+through shared-memory slots (multiprocessing.shared_memory), so only a few
+bytes of metadata are pickled per frame. Any idle worker takes the next
+frame from any stream, and the results are routed back to a per-stream
+LightStateTracker, in frame order for files and recordings. Every worker has its own interpreter and GIL, so
+throughput grows with the number of cores. A worker that dies has its
+pending frames handed to the others.
+
+    python inference_server.py 0 1 drive.mp4 --workers 4 --decisions decisions.jsonl
+"""
+
+import argparse
+import functools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from config import (INFERENCE_BACKEND, MODEL_INPUT_SIZE, INFERENCE_WORKERS, INFERENCE_SLOTS_PER_STREAM,
+                    INFERENCE_WORKER_THREADS, INFERENCE_WORKER_START_TIMEOUT, COLOR_GATE_ENABLED)
+from detector import detections_to_dicts
+from light_state import LightStateTracker
+from metrics import REGISTRY
+
+SERVER_FRAMES = REGISTRY.counter('server_frames_total', 'Frames processed by the inference workers')
+SERVER_DROPPED = REGISTRY.counter('server_frames_dropped_total', 'Frames dropped because every slot of the stream was busy')
+SERVER_STALE = REGISTRY.counter('server_results_stale_total', 'Results that arrived after a newer frame of the same stream')
+SERVER_LATENCY_MS = REGISTRY.histogram('server_frame_latency_ms', 'Capture to routed result in milliseconds')
+SERVER_WORKER_DEATHS = REGISTRY.counter('server_worker_deaths_total', 'Inference worker processes that exited unexpectedly')
+SERVER_FAILED = REGISTRY.counter('server_frames_failed_total', 'Frames lost because no inference worker was left')
+
+# Thread pools inside each worker; one per process avoids oversubscribing the cores
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+
+def create_detector(backend=INFERENCE_BACKEND, imgsz=MODEL_INPUT_SIZE, auto_select=False):
+    """Build the detector inside a worker process."""
+    from detector import TrafficLightDetector
+    logger = logging.getLogger('TrafficLightApp')
+    return TrafficLightDetector(logger, backend=backend, imgsz=imgsz, auto_select=auto_select)
+
+
+class StreamDetectors:
+    """A worker's model with one color gate per stream in front of it.
+
+    The gate decides from the frames it has seen when the next full-frame
+    detection is due, so sharing one between cameras would let one scene
+    decide for another.
+    """
+
+    def __init__(self, detector, logger, gate=COLOR_GATE_ENABLED):
+        self.detector = detector
+        self.logger = logger
+        self.gate = gate and detector.model is not None
+        self.gates = {}
+
+    def get(self, stream_id):
+        if not self.gate:
+            return self.detector
+        if stream_id not in self.gates:
+            from color_gate import GatedDetector
+            self.gates[stream_id] = GatedDetector(self.detector, self.logger)
+        return self.gates[stream_id]
+
+
+def _worker_main(worker_id, tasks, results, detector_factory, threads, gate):
+    import cv2
+    cv2.setNumThreads(threads)
+    import inference_backends
+    inference_backends.ONNX_THREADS = threads
+    detector = detector_factory()
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+    detectors = StreamDetectors(detector, logging.getLogger('TrafficLightApp'), gate)
+    results.put(('ready', worker_id, detector.model is not None))
+
+    attached = {}
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            stream_id, shm_name, shape, slot, frame_id, captured_at = task
+            if shm_name not in attached:
+                # Workers share the parent's resource tracker, which unlinks the block once the parent does
+                attached[shm_name] = shared_memory.SharedMemory(name=shm_name)
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=attached[shm_name].buf)
+            started = time.perf_counter()
+            boxes = detectors.get(stream_id).detect_batch([frame])[0]
+            inference_ms = (time.perf_counter() - started) * 1000
+            results.put(('result', worker_id, stream_id, slot, frame_id, captured_at, np.asarray(boxes),
+                         inference_ms))
+    finally:
+        for shm in attached.values():
+            shm.close()
+
+
+class SharedFrameSlots:
+    """A fixed set of shared-memory frame buffers for one stream.
+
+    A slot is busy from the moment a frame is written into it until the
+    worker's result comes back, so a frame is never overwritten mid-inference.
+    """
+
+    def __init__(self, shape, count):
+        self.shape = tuple(shape)
+        nbytes = int(np.prod(self.shape))
+        self.blocks = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(count)]
+        self.views = [np.ndarray(self.shape, dtype=np.uint8, buffer=block.buf) for block in self.blocks]
+        self._free = queue.Queue()
+        for index in range(count):
+            self._free.put(index)
+
+    def acquire(self, timeout=None):
+        """Index of a free slot, or None if none frees up in time (timeout=0 never waits)."""
+        try:
+            if timeout == 0:
+                return self._free.get_nowait()
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def write(self, index, frame):
+        if frame.shape != self.shape:
+            import cv2
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
+        np.copyto(self.views[index], frame)
+        return self.blocks[index].name
+
+    def release(self, index):
+        self._free.put(index)
+
+    def close(self):
+        self.views = []
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+class Stream:
+    """One camera or video feed with its own slots and decision state."""
+
+    def __init__(self, stream_id, source, drop_frames):
+        self.stream_id = stream_id
+        self.source = source
+        self.drop_frames = drop_frames
+        self.slots = None
+        self.light_state = LightStateTracker()
+        self.frames_read = 0
+        self.frames_done = 0
+        self.frames_dropped = 0
+        # Newest frame applied to light_state
+        self.last_frame_id = -1
+        # frame_id -> (captured_at, boxes), or None for a lost frame, waiting for an earlier frame
+        self.held = {}
+        self.route_lock = threading.Lock()
+        self.finished = False
+        self.started = None
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            'frames': self.frames_done,
+            'dropped': self.frames_dropped,
+            'fps': self.frames_done / elapsed if elapsed > 0 else None,
+            'state': self.light_state.state,
+            'transitions': self.light_state.transitions,
+        }
+
+
+class InferenceServer:
+    """Feeds several streams through a pool of detector processes.
+
+    on_decision(stream_id, state, frame_id) is called from the collector
+    thread whenever a stream's light state changes.
+
+    Every worker has its own task queue and frames go to the live worker with
+    the fewest pending, so the server knows which frames a worker held when
+    it dies and can give them to another one. With no worker left, wait()
+    raises instead of waiting for results that will never come.
+    """
+
+    def __init__(self, logger, workers=INFERENCE_WORKERS, detector_factory=create_detector,
+                 slots_per_stream=INFERENCE_SLOTS_PER_STREAM, threads=INFERENCE_WORKER_THREADS, on_decision=None,
+                 gate=COLOR_GATE_ENABLED):
+        self.logger = logger
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.detector_factory = detector_factory
+        self.slots_per_stream = slots_per_stream
+        self.threads = threads
+        self.on_decision = on_decision
+        self.gate = gate
+        self.streams = {}
+        self.error = None
+        # spawn: forking a process that already runs threads and a model is unsafe
+        self._ctx = mp.get_context('spawn')
+        self._tasks = []
+        # worker_id -> {(stream_id, frame_id): task} sent to it and not answered yet
+        self._pending = {}
+        self._results = self._ctx.Queue()
+        self._processes = []
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_stream(self, stream_id, source, drop_frames=True):
+        """Register a source with a read() -> (ret, frame) method.
+
+        Live cameras should drop frames when the workers fall behind; files
+        and recordings should wait so every frame is processed.
+        """
+        self.streams[stream_id] = Stream(stream_id, source, drop_frames)
+
+    def start(self):
+        self._start_workers()
+        collector = threading.Thread(target=self._collect_loop, name='server-collector', daemon=True)
+        collector.start()
+        self._threads.append(collector)
+        for stream in self.streams.values():
+            stream.started = time.monotonic()
+            thread = threading.Thread(target=self._capture_loop, args=(stream,),
+                                      name=f'capture-{stream.stream_id}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _start_workers(self):
+        saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+        # Children inherit the environment at spawn time
+        os.environ.update({name: str(self.threads) for name in THREAD_ENV_VARS})
+        try:
+            for worker_id in range(self.workers):
+                tasks = self._ctx.Queue()
+                process = self._ctx.Process(target=_worker_main, name=f'detector-{worker_id}', daemon=True,
+                                            args=(worker_id, tasks, self._results,
+                                                  self.detector_factory, self.threads, self.gate))
+                process.start()
+                self._tasks.append(tasks)
+                self._pending[worker_id] = {}
+                self._processes.append(process)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        ready = 0
+        deadline = time.monotonic() + INFERENCE_WORKER_START_TIMEOUT
+        while ready < self.workers:
+            try:
+                _, worker_id, loaded = self._results.get(timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Empty:
+                raise RuntimeError(f"Only {ready} of {self.workers} inference workers started")
+            if not loaded:
+                self.logger.error("Worker %s failed to load the model", worker_id)
+            ready += 1
+        self.logger.info("%d inference workers ready", self.workers)
+
+    def _capture_loop(self, stream):
+        frame_id = 0
+        while not self._stop_event.is_set():
+            ret, frame = stream.source.read()
+            if not ret:
+                break
+            captured_at = time.monotonic()
+            if stream.slots is None:
+                stream.slots = SharedFrameSlots(frame.shape, self.slots_per_stream)
+            slot = stream.slots.acquire(timeout=0 if stream.drop_frames else 1.0)
+            while slot is None and not stream.drop_frames and not self._stop_event.is_set():
+                slot = stream.slots.acquire(timeout=1.0)
+            if slot is None:
+                stream.frames_dropped += 1
+                SERVER_DROPPED.inc()
+                continue
+            shm_name = stream.slots.write(slot, frame)
+            with self._lock:
+                stream.frames_read += 1
+                sent = self._dispatch((stream.stream_id, shm_name, stream.slots.shape, slot, frame_id, captured_at))
+            if not sent:
+                self._fail(stream, slot, frame_id)
+                break
+            frame_id += 1
+        with self._lock:
+            stream.finished = True
+
+    def _dispatch(self, task):
+        """Send task to the live worker with the fewest pending frames; False when none is left. Needs _lock."""
+        alive = [worker_id for worker_id, pending in self._pending.items() if pending is not None]
+        if not alive:
+            return False
+        worker_id = min(alive, key=lambda w: len(self._pending[w]))
+        stream_id, _, _, _, frame_id, _ = task
+        self._pending[worker_id][(stream_id, frame_id)] = task
+        self._tasks[worker_id].put(task)
+        return True
+
+    def _fail(self, stream, slot, frame_id):
+        """Give up on a frame that no worker can take."""
+        stream.slots.release(slot)
+        with self._lock:
+            stream.frames_done += 1
+        SERVER_FAILED.inc()
+        self._apply(stream, frame_id, None)
+
+    def _check_workers(self):
+        """Hand the pending frames of workers that died to the live ones."""
+        for worker_id, process in enumerate(self._processes):
+            # Workers exit on purpose once stop() has been called
+            if self._stop_event.is_set() or self._pending.get(worker_id) is None or process.is_alive():
+                continue
+            SERVER_WORKER_DEATHS.inc()
+            with self._lock:
+                orphans = list(self._pending[worker_id].values())
+                # None marks the worker as dead for _dispatch
+                self._pending[worker_id] = None
+                failed = [task for task in orphans if not self._dispatch(task)]
+            self.logger.error("Inference worker %d exited with code %s, requeued %d of %d pending frames",
+                              worker_id, process.exitcode, len(orphans) - len(failed), len(orphans))
+            for stream_id, _, _, slot, frame_id, _ in failed:
+                self._fail(self.streams[stream_id], slot, frame_id)
+            if all(pending is None for pending in self._pending.values()):
+                self.error = RuntimeError("Every inference worker has exited")
+
+    def _collect_loop(self):
+        while not self._stop_event.is_set():
+            self._check_workers()
+            try:
+                message = self._results.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if message[0] != 'result':
+                continue
+            _, worker_id, stream_id, slot, frame_id, captured_at, boxes, inference_ms = message
+            with self._lock:
+                pending = self._pending.get(worker_id)
+                if pending is None or pending.pop((stream_id, frame_id), None) is None:
+                    # Already handed to another worker after this one was declared dead
+                    continue
+            stream = self.streams[stream_id]
+            stream.slots.release(slot)
+            self._route(stream, frame_id, captured_at, boxes)
+
+    def _route(self, stream, frame_id, captured_at, boxes):
+        with self._lock:
+            stream.frames_done += 1
+        SERVER_FRAMES.inc()
+        SERVER_LATENCY_MS.observe((time.monotonic() - captured_at) * 1000)
+        self._apply(stream, frame_id, (captured_at, boxes))
+
+    def _apply(self, stream, frame_id, result):
+        """Feed a frame's result, or None for a lost frame, to the stream's light state.
+
+        Live streams skip results older than one already applied. Streams
+        that keep every frame hold a result back until all earlier frames are
+        in, so their decisions do not depend on which worker finishes first.
+        """
+        with stream.route_lock:
+            if stream.drop_frames:
+                if frame_id < stream.last_frame_id:
+                    # Another worker already delivered a newer frame of this stream
+                    SERVER_STALE.inc()
+                    return
+                ready = [(frame_id, result)]
+            else:
+                stream.held[frame_id] = result
+                ready = []
+                while stream.last_frame_id + 1 in stream.held:
+                    next_id = stream.last_frame_id + 1
+                    ready.append((next_id, stream.held.pop(next_id)))
+                    stream.last_frame_id = next_id
+            for frame_id, result in ready:
+                if result is None:
+                    continue
+                stream.last_frame_id = max(stream.last_frame_id, frame_id)
+                captured_at, boxes = result
+                transition = stream.light_state.update(detections_to_dicts(boxes), captured_at)
+                if transition is not None and self.on_decision is not None:
+                    self.on_decision(stream.stream_id, transition, frame_id)
+
+    @property
+    def done(self):
+        """True once every stream has ended and all of its frames came back."""
+        with self._lock:
+            return all(stream.finished and stream.frames_done >= stream.frames_read
+                       for stream in self.streams.values())
+
+    def wait(self, timeout=None):
+        """Wait until done; False on timeout. Raises RuntimeError once no worker is left."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.error is not None:
+                raise self.error
+            if self.done:
+                return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+
+    def stop(self):
+        self._stop_event.set()
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        for stream in self.streams.values():
+            if stream.slots is not None:
+                stream.slots.close()
+            release = getattr(stream.source, 'release', None)
+            if release:
+                release()
+        self._processes = []
+        self._tasks = []
+        self._pending = {}
+        self._threads = []
+
+    def stats(self):
+        return {stream_id: stream.stats() for stream_id, stream in self.streams.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run detection for several cameras on a process pool.')
+    parser.add_argument('sources', nargs='+', help='camera indices, video files or recording directories')
+    parser.add_argument('--workers', type=int, default=INFERENCE_WORKERS, help='detector processes (0: cores - 1)')
+    parser.add_argument('--backend', default=INFERENCE_BACKEND)
+    parser.add_argument('--imgsz', type=int, default=MODEL_INPUT_SIZE)
+    parser.add_argument('--no-gate', action='store_true', help='run the model even on frames with no lit lamps')
+    parser.add_argument('--decisions', default=None, help='JSON-lines output of decisions')
+    args = parser.parse_args(argv)
+
+    from frame_source import DecisionLog, open_source
+    from logger import setup_logger
+    logger = setup_logger(level=logging.WARNING)
+    decision_log = DecisionLog(args.decisions) if args.decisions else None
+
+    def on_decision(stream_id, state, frame_id):
+        print(f"[{stream_id}] {state} (frame {frame_id})")
+        if decision_log:
+            decision_log.log('vibration', state, stream=stream_id, frame=frame_id)
+
+    factory = functools.partial(create_detector, backend=args.backend, imgsz=args.imgsz)
+    server = InferenceServer(logger, workers=args.workers, detector_factory=factory, on_decision=on_decision,
+                             gate=COLOR_GATE_ENABLED and not args.no_gate)
+    for spec in args.sources:
+        source, drop_frames = open_source(spec)
+        server.add_stream(spec, source, drop_frames)
+    try:
+        server.start()
+        server.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if decision_log:
+            decision_log.close()
+    for stream_id, stats in server.stats().items():
+        print(f"{stream_id}: {stats['frames']} frames, {stats['fps'] or 0:.1f} FPS, "
+              f"{stats['dropped']} dropped, {stats['transitions']} transitions, final state {stats['state']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
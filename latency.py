@@ -0,0 +1,148 @@
+"""
+End-to-end latency from a light changing to the haptic unit acknowledging it.
+
+A LatencyTrace is created when the light state changes and collects
+monotonic timestamps as the decision moves through the app:
+
+    onset          capture time of the first frame that voted for the new state
+    captured       capture time of the frame that confirmed it
+    inferred       inference finished for that frame
+    decided        the UI thread acted on the transition
+    write_started  the Bluetooth writer took the command off the queue
+    written        every connected unit accepted the write
+    acked          the first unit echoed the command's sequence number
+
+The time between the physical light change and onset is at most one
+frame interval and is not included. Acks need the binary protocol; with text
+commands the trace ends at written.
+
+    python latency.py logs/latency.jsonl
+"""
+
+import json
+import os
+import sys
+import threading
+from config import LATENCY_LOG_PATH
+from metrics import REGISTRY
+
+# (stage, from, to); total runs from onset to the last timestamp present
+STAGES = [
+    ('confirm', 'onset', 'captured'),
+    ('inference', 'captured', 'inferred'),
+    ('handoff', 'inferred', 'decided'),
+    ('queue', 'decided', 'write_started'),
+    ('write', 'write_started', 'written'),
+    ('ack', 'written', 'acked'),
+]
+STAGE_HISTOGRAMS = {stage: REGISTRY.histogram(f'latency_{stage}_ms', f'End-to-end latency: {start} to {end}')
+                    for stage, start, end in STAGES}
+TOTAL_MS = REGISTRY.histogram('latency_total_ms', 'Light change to haptic acknowledgement in milliseconds')
+
+
+class LatencyTrace:
+    """Timestamps of one light state change on its way to the haptic units."""
+
+    def __init__(self, state, onset=None, captured=None, inferred=None, decided=None):
+        self.state = state
+        self.onset = onset
+        self.captured = captured
+        self.inferred = inferred
+        self.decided = decided
+        self.write_started = None
+        self.written = None
+        self.acked = None
+        self.seq = None
+        self.device = None
+
+    def stages_ms(self):
+        """Duration of every stage whose two timestamps are known, in milliseconds."""
+        stages = {}
+        for stage, start, end in STAGES:
+            start, end = getattr(self, start), getattr(self, end)
+            if start is not None and end is not None:
+                stages[stage] = (end - start) * 1000
+        last = self.acked or self.written or self.decided
+        if self.onset is not None and last is not None:
+            stages['total'] = (last - self.onset) * 1000
+        return stages
+
+
+class LatencyRecorder:
+    """Feeds finished traces into the metrics registry and a JSON-lines log."""
+
+    def __init__(self, path=LATENCY_LOG_PATH):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, trace):
+        stages = trace.stages_ms()
+        for stage, ms in stages.items():
+            if stage == 'total':
+                TOTAL_MS.observe(ms)
+            else:
+                STAGE_HISTOGRAMS[stage].observe(ms)
+        if self.path is None:
+            return stages
+        entry = {'state': trace.state, 'seq': trace.seq, 'device': trace.device, 'acked': trace.acked is not None}
+        entry.update(stages)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+        return stages
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Shared recorder for the app
+LATENCY = LatencyRecorder()
+
+
+def summarize(values):
+    """Mean, percentiles and maximum of a list of timings, or None if it is empty."""
+    if not values:
+        return None
+    # Only reports need numpy; the app imports this module at startup for the recorder
+    import numpy as np
+    values = np.asarray(values)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'mean': float(values.mean()),
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+        'max': float(values.max()),
+    }
+
+
+def report(path):
+    """Per-stage latency distribution of a latency log."""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            for stage in [stage for stage, _, _ in STAGES] + ['total']:
+                if stage in entry:
+                    values.setdefault(stage, []).append(entry[stage])
+    return {stage: dict(summarize(ms), n=len(ms)) for stage, ms in values.items()}
+
+
+def main(argv=None):
+    path = (argv or sys.argv[1:] or [LATENCY_LOG_PATH])[0]
+    print(f"{'stage':<10} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for stage, summary in report(path).items():
+        print(f"{stage:<10} {summary['n']:>5} {summary['p50']:>8.1f} {summary['p95']:>8.1f} "
+              f"{summary['p99']:>8.1f} {summary['max']:>8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
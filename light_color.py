@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+
+# OpenCV hue runs 0-179. Red wraps around both ends of the range.
+HUE_RANGES = {
+    'Red': ((0, 10), (160, 179)),
+    'Yellow': ((15, 35),),
+    'Green': ((40, 95),),
+}
+MIN_SATURATION = 100
+MIN_VALUE = 150
+
+
+def lit_color_masks(hsv):
+    """Return a boolean mask per color marking bright, saturated pixels of that hue."""
+    hue, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    lit = (sat >= MIN_SATURATION) & (val >= MIN_VALUE)
+    masks = {}
+    for color, ranges in HUE_RANGES.items():
+        in_range = np.zeros(hue.shape, dtype=bool)
+        for low, high in ranges:
+            in_range |= (hue >= low) & (hue <= high)
+        masks[color] = lit & in_range
+    return masks
+
+
+def classify_light_color(crop, min_fraction=0.02):
+    """Classify the lit color of a traffic light crop from its HSV histogram.
+
+    Returns (color, score) where color is one of the CLASS_NAMES values and
+    score is the share of lit pixels that agree with it. Crops without enough
+    lit pixels are reported as 'Off'.
+    """
+    if crop is None or crop.size == 0:
+        return 'Off', 0.0
+    hsv = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+    counts = {color: int(mask.sum()) for color, mask in lit_color_masks(hsv).items()}
+    total = sum(counts.values())
+    if total < min_fraction * crop.shape[0] * crop.shape[1]:
+        return 'Off', 0.0
+    color = max(counts, key=counts.get)
+    return color, counts[color] / total
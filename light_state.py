@@ -0,0 +1,87 @@
+import time
+from collections import deque
+from config import STATE_WINDOW, STATE_CONFIRM_FRAMES, STATE_SWITCH_MARGIN, STATE_NONE_WEIGHT
+
+# Detector color names mapped to the states sent to the vibration module
+STATE_FOR_COLOR = {'Red': 'RED', 'Yellow': 'YELLOW', 'Green': 'GREEN'}
+
+
+def select_primary(detections):
+    """Pick the light the user is most likely facing: the biggest, most confident box."""
+    best, best_score = None, 0.0
+    for detection in detections:
+        if detection['color'] not in STATE_FOR_COLOR:
+            continue
+        x1, y1, x2, y2 = detection['bbox']
+        area = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+        score = detection['confidence'] * area ** 0.5
+        if best is None or score > best_score:
+            best, best_score = detection, score
+    return best
+
+
+class LightStateTracker:
+    """Turns per-frame detections into a stable RED/YELLOW/GREEN/OFF state.
+
+    Each frame votes for the color of its primary light, weighted by
+    confidence; frames without a light vote OFF with STATE_NONE_WEIGHT.
+    The state only changes when another color leads the sliding window by
+    STATE_SWITCH_MARGIN of the total weight for STATE_CONFIRM_FRAMES frames
+    in a row, so single-frame misdetections never reach the actuators.
+    """
+
+    def __init__(self, window=STATE_WINDOW, confirm_frames=STATE_CONFIRM_FRAMES,
+                 switch_margin=STATE_SWITCH_MARGIN, none_weight=STATE_NONE_WEIGHT):
+        self.votes = deque(maxlen=window)
+        self.confirm_frames = confirm_frames
+        self.switch_margin = switch_margin
+        self.none_weight = none_weight
+        self.reset()
+
+    def reset(self):
+        self.votes.clear()
+        self.state = 'OFF'
+        self.primary = None
+        self.candidate = None
+        self.candidate_frames = 0
+        self.transitions = 0
+        self.last_decision_latency = None
+
+    def scores(self):
+        """Total vote weight per state over the window."""
+        totals = {}
+        for state, weight, _ in self.votes:
+            totals[state] = totals.get(state, 0.0) + weight
+        return totals
+
+    def update(self, detections, now=None):
+        """Add one frame of detections. Returns the new state on a transition, else None."""
+        now = time.monotonic() if now is None else now
+        self.primary = select_primary(detections)
+        if self.primary is not None:
+            self.votes.append((STATE_FOR_COLOR[self.primary['color']], self.primary['confidence'], now))
+        else:
+            self.votes.append(('OFF', self.none_weight, now))
+
+        scores = self.scores()
+        winner = max(scores, key=scores.get)
+        lead = scores[winner] - scores.get(self.state, 0.0)
+        if winner == self.state or lead < self.switch_margin * sum(scores.values()):
+            self.candidate = None
+            self.candidate_frames = 0
+            return None
+
+        if winner != self.candidate:
+            self.candidate = winner
+            self.candidate_frames = 0
+        self.candidate_frames += 1
+        if self.candidate_frames < self.confirm_frames:
+            return None
+
+        # Latency from the first vote for the new state still in the window
+        self.last_decision_latency = now - min(ts for state, _, ts in self.votes if state == winner)
+        self.state = winner
+        self.transitions += 1
+        self.candidate = None
+        self.candidate_frames = 0
+        return winner
@@ -1,30 +1,61 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+from config import LOG_DIR, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT
 
-def setup_logger(name='traffic_light_app', level=logging.INFO):
-    """Set up a logger with file and console handlers."""
+# One background listener per logger name; records are formatted and written there
+_listeners = {}
+
+
+def setup_logger(name='traffic_light_app', level=None):
+    """Set up a logger whose file and console output is written on a background thread.
+
+    The logger itself only gets a QueueHandler, so logging from the UI or
+    pipeline threads costs a queue put. Calling this again for the same name
+    just updates the level instead of adding duplicate handlers.
+    """
+    if level is None:
+        level = getattr(logging, LOG_LEVEL, logging.INFO)
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    if name in _listeners:
+        return logger
 
     # Create logs directory if it doesn't exist
-    log_dir = 'logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+    os.makedirs(LOG_DIR, exist_ok=True)
 
-    # File handler
-    file_handler = logging.FileHandler(os.path.join(log_dir, 'app.log'))
-    file_handler.setLevel(level)
+    # Rotating file handler
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(LOG_DIR, 'app.log'), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
     file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     file_handler.setFormatter(file_formatter)
 
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setLevel(level)
     console_formatter = logging.Formatter('%(levelname)s - %(message)s')
     console_handler.setFormatter(console_formatter)
 
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    log_queue = queue.Queue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    listener.start()
+    _listeners[name] = listener
 
+    # Drop the queue handler of a listener that was already shut down
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.propagate = False
     return logger
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background listeners."""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+
+
+atexit.register(shutdown_logging)
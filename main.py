@@ -5,18 +5,25 @@ from kivy.uix.button import Button
 from kivy.uix.image import Image
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
-from kivy.clock import Clock
-from kivy.graphics.texture import Texture
-import cv2
+from kivy.clock import Clock, mainthread
+import os
 import time
 import threading
-from audio_utils import AudioManager
-from logger import setup_logger
-from config import CLASS_NAMES, CAMERA_INDEX_DEFAULT, FPS, AUDIO_INTERVAL_RED, IDLE_TIMEOUT
-from detector import TrafficLightDetector
+from logger import setup_logger, shutdown_logging
+from metrics import REGISTRY, MetricsServer
+from config import CAMERA_INDEX_DEFAULT, METRICS_PORT, METRICS_DUMP_PATH, RECORDING_ENABLED, RECORDING_DIR, CAMERA_MAX_INDEX
 from bluetooth_manager import BluetoothManager
+from engine import DetectionEngine
+from event_loop import IO_LOOP
+from latency import LATENCY
+from settings import SETTINGS, SettingsError
 import platform
 
+# cv2, numpy, pygame and the inference runtime are imported on the loader
+# thread (see _load_components) so the window shows up immediately.
+# Capture, detection and the actuators live in engine.DetectionEngine;
+# this widget only starts it, polls it and shows its results.
+
 class TrafficLightAppUI(GridLayout):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -28,8 +35,20 @@ class TrafficLightAppUI(GridLayout):
         # Set up logger
         self.logger = setup_logger()
 
-        # Initialize detector
-        self.detector = TrafficLightDetector(self.logger)
+        # Runtime settings: settings.json and TRAFFICLIGHT_* variables over config.py, reloaded on change
+        try:
+            SETTINGS.load()
+        except SettingsError as e:
+            self.logger.error("Settings ignored, using defaults: %s", e)
+        SETTINGS.watch(self.logger)
+        SETTINGS.subscribe(self._on_rate_setting_changed, 'FPS', 'FPS_MAX')
+
+        # The engine, preview and audio are created by the loader thread
+        self.engine = None
+        self.preview = None
+        self.camera_manager = None
+        self.audio_manager = None
+        self.audio_enabled = True
 
         # Initialize Bluetooth manager
         self.bluetooth_manager = BluetoothManager(self.logger)
@@ -42,7 +61,7 @@ class TrafficLightAppUI(GridLayout):
         controls = BoxLayout(orientation='vertical', size_hint=(1, 0.1))
 
         # Button to start detection
-        self.detect_button = Button(text='Start Detection', size_hint_y=None, height=50, background_color=(0.2, 0.6, 1, 1), color=(1, 1, 1, 1), font_size=18)
+        self.detect_button = Button(text='Loading model...', disabled=True, size_hint_y=None, height=50, background_color=(0.2, 0.6, 1, 1), color=(1, 1, 1, 1), font_size=18)
         self.detect_button.bind(on_press=self.start_detection)
         controls.add_widget(self.detect_button)
 
@@ -62,27 +81,15 @@ class TrafficLightAppUI(GridLayout):
         controls.add_widget(self.bluetooth_button)
 
         # Label for results
-        self.result_label = Label(text='Detections will appear here', size_hint_y=None, height=50, font_size=16, color=(0, 0, 0, 1))
+        self.result_label = Label(text='Loading model, please wait...', size_hint_y=None, height=50, font_size=16, color=(0, 0, 0, 1))
         controls.add_widget(self.result_label)
 
         self.add_widget(controls)
 
         self.detection_active = False
-        self.cap = None
-        self.conf_threshold = 0.7  # Default confidence threshold
-        self.idle_timer = None  # Timer for idle timeout
-
-
 
         # Vibration module settings
         self.vibration_enabled = True
-        self.last_audio_time = None  # Track last audio play time
-
-        # Audio manager
-        self.audio_manager = AudioManager()
-
-        # Flag to track if red beep has been played for current red light detection
-        self.red_beep_played = False
 
         # Check Bluetooth availability at startup
         self.bluetooth_available = self.bluetooth_manager.bluetooth_available
@@ -92,134 +99,137 @@ class TrafficLightAppUI(GridLayout):
             self.vibration_button.text = 'Vibration: DISABLED'
             self.vibration_button.disabled = True
 
+        # Load and warm up the model without blocking the first frame
+        threading.Thread(target=self._load_components, name='model-loader', daemon=True).start()
+
+    def _load_components(self):
+        """Import the heavy libraries, load the model and run a warm-up inference."""
+        try:
+            from engine import build_detection_stack
+            import preview  # noqa: F401 - imports cv2 off the UI thread
+            import camera_manager  # noqa: F401
+            stack = build_detection_stack(self.logger)
+        except Exception as e:
+            self.logger.error("Model loading failed: %s", e)
+            stack = None
+
+        audio_manager = None
+        try:
+            from audio_utils import AudioManager
+            audio_manager = AudioManager(self.logger)
+        except Exception as e:
+            self.logger.error("Audio initialization failed: %s", e)
+        self._on_components_ready(stack, audio_manager)
+
+    @mainthread
+    def _on_components_ready(self, stack, audio_manager):
+        from preview import PreviewRenderer
+        from camera_manager import CameraManager
+        self.camera_manager = CameraManager(self.logger)
+        self.preview = PreviewRenderer(self.image)
+        self.audio_manager = audio_manager
+        if self.audio_manager:
+            self.audio_manager.enabled = self.audio_enabled
+        if stack is None or not stack.ready:
+            self.detect_button.text = 'Model Unavailable'
+            self.result_label.text = 'Model not loaded. Cannot start detection.'
+            return
+        self.engine = DetectionEngine(stack, self.logger, self.bluetooth_manager, self.audio_manager)
+        self.detect_button.text = 'Start Detection'
+        self.detect_button.disabled = False
+        self.result_label.text = 'Model ready. Detections will appear here'
+
+    @mainthread
+    def _on_rate_setting_changed(self, name, value):
+        if self.engine and self.engine.running:
+            Clock.unschedule(self.detect_traffic_lights)
+            Clock.schedule_interval(self.detect_traffic_lights, self.engine.poll_interval)
+
     def start_detection(self, instance):
-        if self.detector.model is None:
+        if self.engine is None:
             self.result_label.text = 'Model not loaded. Cannot start detection.'
             return
         if not self.detection_active:
             self.detection_active = True
             self.detect_button.text = 'Stop Detection'
-            # Ensure any previous capture is released
-            if self.cap:
-                self.cap.release()
-                self.cap = None
-            # Default to camera 0 with fallback
-            camera_index = CAMERA_INDEX_DEFAULT
-            try:
-                self.cap = cv2.VideoCapture(camera_index)
-                self.logger.info(f"Attempting to open camera {camera_index}")
-                if not self.cap.isOpened():
-                    self.logger.warning(f"Camera {camera_index} failed to open, trying alternatives")
-                    # Try alternative camera indices
-                    for alt_index in range(1, 11):
-                        self.cap = cv2.VideoCapture(alt_index)
-                        if self.cap.isOpened():
-                            self.result_label.text = f'Opened camera {alt_index} instead of {camera_index}.'
-                            self.logger.info(f"Successfully opened camera {alt_index}")
-                            break
-                    if not self.cap.isOpened():
-                        self.result_label.text = 'Cannot open any camera. Check if camera is connected, not in use by another app, and try different camera indices (0-10).'
-                        self.logger.error("Failed to open any camera")
-                        self.detection_active = False
-                        self.detect_button.text = 'Start Detection'
-                        return
-                else:
-                    self.logger.info(f"Camera {camera_index} opened successfully")
-            except Exception as e:
-                self.result_label.text = f'Camera initialization error: {e}'
-                self.logger.error(f"Camera initialization error: {e}")
-                self.detection_active = False
-                self.detect_button.text = 'Start Detection'
-                if self.cap:
-                    self.cap.release()
-                    self.cap = None
-                return
-            Clock.schedule_interval(self.detect_traffic_lights, 1.0 / FPS)  # FPS from config
+            # Ensure any previous pipeline and capture are released
+            self.stop_pipeline()
+            # Probing cameras can block for seconds, so it happens off the UI thread
+            self.result_label.text = 'Opening camera...'
+            self.camera_manager.open_async(self._on_camera_opened)
         else:
             self.detection_active = False
             self.detect_button.text = 'Start Detection'
-            if self.cap:
-                self.cap.release()
-                self.cap = None
-            Clock.unschedule(self.detect_traffic_lights)
+            self.stop_pipeline()
+
+    @mainthread
+    def _on_camera_opened(self, cap, error):
+        if not self.detection_active:
+            # Detection was stopped while the camera was opening
+            if cap:
+                cap.release()
+            return
+        if cap is None:
+            if error:
+                self.result_label.text = f'Camera initialization error: {error}'
+                self.logger.error("Camera initialization error: %s", error)
+            else:
+                self.result_label.text = f'Cannot open any camera. Check if camera is connected, not in use by another app, and try different camera indices (0-{CAMERA_MAX_INDEX}).'
+            self.detection_active = False
+            self.detect_button.text = 'Start Detection'
+            return
+        if cap.index != CAMERA_INDEX_DEFAULT:
+            self.result_label.text = f'Opened camera {cap.index} instead of {CAMERA_INDEX_DEFAULT}.'
+        else:
+            self.result_label.text = 'Detections will appear here'
+
+        # Capture and inference run on the engine's threads; the UI only consumes results
+        recording_dir = os.path.join(RECORDING_DIR, time.strftime('%Y%m%d-%H%M%S')) if RECORDING_ENABLED else None
+        self.engine.start(cap, recording_dir=recording_dir)
+        Clock.schedule_interval(self.detect_traffic_lights, self.engine.poll_interval)
+
+    def stop_pipeline(self):
+        """Stop the capture/inference threads and release the camera."""
+        Clock.unschedule(self.detect_traffic_lights)
+        if self.engine:
+            self.engine.stop()
 
     def detect_traffic_lights(self, dt):
+        """Show the newest result from the engine."""
         try:
-            if self.cap and self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if ret and frame is not None:
-                    # Run inference using detector
-                    detections = self.detector.detect_traffic_lights(frame)
-
-                    # Annotate the frame with detections
-                    annotated_frame = frame.copy()
-                    for detection in detections:
-                        x1, y1, x2, y2 = detection['bbox']
-                        color_name = detection['color']
-                        conf = detection['confidence']
-                        # Draw bounding box
-                        cv2.rectangle(annotated_frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-                        # Draw label
-                        label = f"{color_name}: {conf:.2f}"
-                        cv2.putText(annotated_frame, label, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-                    # Convert to texture for Kivy
+            if self.engine.running and self.engine.cap.isOpened():
+                packet = self.engine.poll()
+                if packet is not None:
+                    frame = packet.frame
+                    detections = packet.detections
+
+                    # Annotate and upload into the reused preview texture
                     try:
-                        buf = cv2.flip(annotated_frame, 0).tobytes()
-                        texture = Texture.create(size=(annotated_frame.shape[1], annotated_frame.shape[0]), colorfmt='bgr')
-                        texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-                        self.image.texture = texture
+                        self.preview.render(frame, detections)
                     except Exception as e:
                         self.result_label.text = f"Texture error: {e}"
                         return
 
                     # Process detections
-                    colors = [d['color'] for d in detections]
                     detection_strings = [f"{d['color']}: {d['confidence']:.2f}" for d in detections]
 
                     if detections:
                         self.result_label.text = f"Detections: {len(detections)} - {', '.join(detection_strings)}"
-                        # Reset idle timer on detection
-                        if self.idle_timer:
-                            self.idle_timer.cancel()
-                        self.idle_timer = Clock.schedule_once(self.pause_detection, IDLE_TIMEOUT)
-                        # Send vibration commands based on detected colors
-                        current_time = time.time()
-                        for color in colors:
-                            if color == 'Red' and self.bluetooth_manager.last_vibration_color != 'RED':
-                                self.bluetooth_manager.send_vibration_command('RED')
-                            elif color == 'Yellow' and self.bluetooth_manager.last_vibration_color != 'YELLOW':
-                                self.bluetooth_manager.send_vibration_command('YELLOW')
-                            elif color == 'Green' and self.bluetooth_manager.last_vibration_color != 'GREEN':
-                                self.bluetooth_manager.send_vibration_command('GREEN')
-
-                        # Play red sound only once per red light detection, with interval check
-                        if 'Red' in colors and not self.red_beep_played and (self.last_audio_time is None or (current_time - self.last_audio_time) >= AUDIO_INTERVAL_RED):
-                            try:
-                                self.audio_manager.play_sound('red')
-                                self.red_beep_played = True
-                            except Exception as e:
-                                self.logger.error(f"Error playing audio: {e}")
-                            self.last_audio_time = current_time
-                        elif 'Red' not in colors:
-                            self.red_beep_played = False
                     else:
                         self.result_label.text = "No traffic lights detected"
-                        if self.bluetooth_manager.last_vibration_color != 'OFF':
-                            self.bluetooth_manager.send_vibration_command('OFF')
-                else:
+                elif self.engine.capture_failed:
                     self.result_label.text = "Failed to capture frame from camera."
             else:
                 self.result_label.text = "Camera not opened."
+            if self.engine.power and self.engine.power.watching:
+                self.result_label.text = "No lights nearby, watching in low-power mode"
         except Exception as e:
             self.result_label.text = f"Unexpected error: {e}"
-            self.logger.error(f"Detection error: {e}")
+            self.logger.error("Detection error: %s", e)
             # Stop detection to prevent further crashes
             self.detection_active = False
             self.detect_button.text = 'Start Detection'
-            if self.cap:
-                self.cap.release()
-            Clock.unschedule(self.detect_traffic_lights)
+            self.stop_pipeline()
 
     def toggle_vibration(self, instance):
         self.vibration_enabled = not self.vibration_enabled
@@ -229,18 +239,12 @@ class TrafficLightAppUI(GridLayout):
         else:
             self.bluetooth_manager.send_vibration_command('VIB_ON')
 
-    def pause_detection(self, dt):
-        """Pause detection after idle timeout"""
-        self.detection_active = False
-        self.detect_button.text = 'Start Detection'
-        if self.cap:
-            self.cap.release()
-        Clock.unschedule(self.detect_traffic_lights)
-        self.result_label.text = 'Detection paused due to inactivity. Tap Start Detection to resume.'
-        self.idle_timer = None
-
     def toggle_audio(self, instance):
-        enabled = self.audio_manager.toggle_audio()
+        if self.audio_manager:
+            self.audio_enabled = self.audio_manager.toggle_audio()
+        else:
+            self.audio_enabled = not self.audio_enabled
+        enabled = self.audio_enabled
         self.audio_button.text = f'Audio: {"ON" if enabled else "OFF"}'
 
     def check_bluetooth_availability(self):
@@ -262,8 +266,10 @@ class TrafficLightAppUI(GridLayout):
 
     def show_bluetooth_info(self, instance):
         """Show Bluetooth connection information"""
-        if self.bluetooth_manager.bluetooth_available and self.bluetooth_manager.chroma_address:
-            message = f"Connected to: {self.bluetooth_manager.chroma_address}"
+        devices = [d for d in self.bluetooth_manager.device_status() if d['connected']]
+        if self.bluetooth_manager.bluetooth_available and devices:
+            message = "Connected to:\n" + "\n".join(
+                f"{d['name']} ({d['address']}), last ack {d['last_latency_ms'] or 0:.0f} ms" for d in devices)
         else:
             message = "No Bluetooth device connected.\nBluetooth libraries not available or device not found."
         self.show_popup("Bluetooth Status", message)
@@ -272,7 +278,31 @@ class TrafficLightAppUI(GridLayout):
 
 class TrafficLightApp(App):
     def build(self):
-        return TrafficLightAppUI()
+        self.ui = TrafficLightAppUI()
+        self.metrics_server = None
+        if METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(METRICS_PORT).start()
+                self.ui.logger.info("Metrics available at http://127.0.0.1:%d/metrics", self.metrics_server.port)
+            except OSError as e:
+                self.ui.logger.warning("Metrics endpoint disabled: %s", e)
+        return self.ui
+
+    def on_stop(self):
+        self.ui.stop_pipeline()
+        SETTINGS.stop_watching()
+        self.ui.bluetooth_manager.close()
+        if self.ui.audio_manager:
+            self.ui.audio_manager.close()
+        IO_LOOP.stop()
+        LATENCY.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        try:
+            REGISTRY.dump(METRICS_DUMP_PATH)
+        except OSError as e:
+            self.ui.logger.error("Could not write metrics dump: %s", e)
+        shutdown_logging()
 
 if __name__ == '__main__':
     TrafficLightApp().run()
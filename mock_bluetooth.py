@@ -1,39 +1,92 @@
 """
 Mock Bluetooth module for testing when pybluez is not available.
-Simulates discovery and connection for CHROMA_ESP32.
+Simulates discovery and connection for CHROMA_ESP32 units.
 """
 
+import os
+import threading
+import time
+import haptic_protocol
+
+# Seconds between a unit receiving a packet and its ACK becoming readable; simulates link and firmware delay
+SIMULATED_DELAY = float(os.environ.get('MOCK_BLUETOOTH_DELAY', '0'))
+
+# Address -> name of the simulated haptic units (wrist and belt)
+MOCK_DEVICES = {
+    "MOCK_CHROMA_ADDR": "CHROMA_ESP32",
+    "MOCK_CHROMA_BELT_ADDR": "CHROMA_ESP32_BELT",
+}
+
 class BluetoothSocket:
     def __init__(self, protocol):
         self.connected = False
         self.protocol = protocol
+        # Loopback: decoded binary packets, and the ACKs a unit would send back
+        self.received = []
+        self._replies = []
+        self._timeout = None
+        self._changed = threading.Condition()
 
     def connect(self, addr_port):
         # Simulate connection to CHROMA_ESP32
         addr, port = addr_port
-        if addr == "MOCK_CHROMA_ADDR":  # Mock address
+        if addr in MOCK_DEVICES:
             self.connected = True
             print(f"Mock Bluetooth: Connected to {addr} on port {port}")
         else:
             raise Exception("Mock Bluetooth: Device not found")
 
     def send(self, data):
-        if self.connected:
-            print(f"Mock Bluetooth: Sent {data.decode().strip()}")
-        else:
+        if not self.connected:
             raise Exception("Mock Bluetooth: Not connected")
+        if haptic_protocol.is_packet(data):
+            packet = haptic_protocol.decode_packet(data)
+            self.received.append(packet)
+            with self._changed:
+                self._replies.append((time.monotonic() + SIMULATED_DELAY, haptic_protocol.encode_ack(packet.seq)))
+                self._changed.notify_all()
+            print(f"Mock Bluetooth: Sent #{packet.seq} {[c.name for c in packet.commands]}")
+        else:
+            print(f"Mock Bluetooth: Sent {data.decode().strip()}")
+
+    def settimeout(self, timeout):
+        self._timeout = timeout
+
+    def recv(self, bufsize=1024):
+        """Block until replies from the simulated unit are due and return them.
+
+        Returns b'' once the socket is closed, or when nothing is due within
+        the settimeout() timeout.
+        """
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        with self._changed:
+            while self.connected:
+                now = time.monotonic()
+                if self._replies and self._replies[0][0] <= now:
+                    break
+                due = [self._replies[0][0]] if self._replies else []
+                if deadline is not None:
+                    if now >= deadline:
+                        break
+                    due.append(deadline)
+                self._changed.wait(min(due) - now if due else None)
+            now = time.monotonic()
+            data = b''
+            while self._replies and self._replies[0][0] <= now and len(data) < bufsize:
+                data += self._replies.pop(0)[1]
+            return data
 
     def close(self):
-        self.connected = False
+        with self._changed:
+            self.connected = False
+            self._changed.notify_all()
         print("Mock Bluetooth: Disconnected")
 
 def discover_devices():
-    # Simulate discovering CHROMA_ESP32
-    return ["MOCK_CHROMA_ADDR"]
+    # Simulate discovering the CHROMA units
+    return list(MOCK_DEVICES)
 
 def lookup_name(addr):
-    if addr == "MOCK_CHROMA_ADDR":
-        return "CHROMA_ESP32"
-    return None
+    return MOCK_DEVICES.get(addr)
 
 RFCOMM = "RFCOMM"  # Mock constant
@@ -0,0 +1,280 @@
+"""
+Quantized and reduced-input model variants.
+
+Build variants of model.pt, score them on a labeled set, and pick the most
+accurate one that fits the latency budget on the current device.
+
+    python model_variants.py build                    # export FP32/FP16/INT8 ONNX variants
+    python model_variants.py evaluate datasets/val    # accuracy + latency report
+
+The labeled set uses the YOLO layout: images/*.jpg and labels/*.txt with
+one "class cx cy w h" line per light, coordinates normalized to 0-1.
+The manifest (MODEL_VARIANTS_MANIFEST) lists every variant together with
+the scores from the last evaluation.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+from config import (MODEL_PATH, MODEL_VARIANTS_DIR, MODEL_VARIANTS_MANIFEST, MODEL_VARIANT_SIZES,
+                    VARIANT_SELECTION_CACHE, LATENCY_BUDGET_MS, CONFIDENCE_THRESHOLD)
+from inference_backends import create_backend, export_onnx
+from latency import summarize
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def load_manifest(path=MODEL_VARIANTS_MANIFEST):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(manifest, path=MODEL_VARIANTS_MANIFEST):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def backend_kwargs(variant):
+    """Constructor arguments for create_backend from a manifest entry."""
+    if variant['backend'] == 'onnx':
+        return {'onnx_path': variant['path'], 'imgsz': variant['imgsz'], 'auto_export': False}
+    return {'model_path': variant['path'], 'imgsz': variant['imgsz']}
+
+
+def build_variants(model_path=MODEL_PATH, out_dir=MODEL_VARIANTS_DIR, sizes=MODEL_VARIANT_SIZES, logger=None):
+    """Export FP32, FP16 and INT8 ONNX variants of model_path at each input size."""
+    os.makedirs(out_dir, exist_ok=True)
+    variants = []
+    for imgsz in sizes:
+        fp32_path = os.path.join(out_dir, f'model_fp32_{imgsz}.onnx')
+        export_onnx(model_path, fp32_path, imgsz, logger)
+        variants.append({'name': f'fp32-{imgsz}', 'backend': 'onnx', 'path': fp32_path,
+                         'precision': 'fp32', 'imgsz': imgsz})
+
+        try:
+            import onnx
+            from onnxconverter_common import float16
+            fp16_path = os.path.join(out_dir, f'model_fp16_{imgsz}.onnx')
+            fp16_model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+            onnx.save(fp16_model, fp16_path)
+            variants.append({'name': f'fp16-{imgsz}', 'backend': 'onnx', 'path': fp16_path,
+                             'precision': 'fp16', 'imgsz': imgsz})
+        except ImportError:
+            if logger:
+                logger.warning("onnx/onnxconverter-common not installed, skipping FP16 variants")
+
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        int8_path = os.path.join(out_dir, f'model_int8_{imgsz}.onnx')
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+        variants.append({'name': f'int8-{imgsz}', 'backend': 'onnx', 'path': int8_path,
+                         'precision': 'int8', 'imgsz': imgsz})
+
+    manifest = {'source': model_path, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'variants': variants}
+    save_manifest(manifest)
+    return manifest
+
+
+def load_labeled_set(directory):
+    """Yield (image, labels) where labels is an N x 5 array of (cls, x1, y1, x2, y2) in pixels."""
+    image_dir = os.path.join(directory, 'images')
+    label_dir = os.path.join(directory, 'labels')
+    for name in sorted(os.listdir(image_dir)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        image = cv2.imread(os.path.join(image_dir, name))
+        if image is None:
+            continue
+        h, w = image.shape[:2]
+        label_path = os.path.join(label_dir, os.path.splitext(name)[0] + '.txt')
+        rows = np.loadtxt(label_path, ndmin=2) if os.path.exists(label_path) else np.zeros((0, 5))
+        labels = np.zeros((len(rows), 5), dtype=np.float32)
+        if len(rows):
+            cls, cx, cy, bw, bh = rows.T
+            labels[:, 0] = cls
+            labels[:, 1] = (cx - bw / 2) * w
+            labels[:, 2] = (cy - bh / 2) * h
+            labels[:, 3] = (cx + bw / 2) * w
+            labels[:, 4] = (cy + bh / 2) * h
+        yield image, labels
+
+
+def box_iou(a, b):
+    """IoU matrix between xyxy boxes a (N x 4) and b (M x 4)."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod((br - tl).clip(0), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+
+def match_detections(predictions, labels, iou_threshold=0.5):
+    """Greedy matching by confidence. Returns (true_positives, false_positives, false_negatives)."""
+    if len(predictions) == 0:
+        return 0, 0, len(labels)
+    if len(labels) == 0:
+        return 0, len(predictions), 0
+    ious = box_iou(predictions[:, :4], labels[:, 1:])
+    matched = np.zeros(len(labels), dtype=bool)
+    tp = 0
+    for i in np.argsort(-predictions[:, 4]):
+        candidates = (ious[i] >= iou_threshold) & ~matched & (labels[:, 0] == predictions[i, 5])
+        if candidates.any():
+            matched[np.argmax(np.where(candidates, ious[i], -1))] = True
+            tp += 1
+    return tp, len(predictions) - tp, int((~matched).sum())
+
+
+def evaluate_variant(variant, dataset_dir, logger, conf=CONFIDENCE_THRESHOLD):
+    """Accuracy and latency of one variant on a labeled set."""
+    backend = create_backend(logger, variant['backend'], **backend_kwargs(variant))
+    tp = fp = fn = 0
+    state_hits = state_total = 0
+    latencies = []
+    for image, labels in load_labeled_set(dataset_dir):
+        start = time.perf_counter()
+        predictions = backend.predict([image], conf)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        t, f, n = match_detections(predictions, labels)
+        tp, fp, fn = tp + t, fp + f, fn + n
+        if len(labels):
+            # The app acts on the largest light; check its color is what the model reports most confidently
+            areas = (labels[:, 3] - labels[:, 1]) * (labels[:, 4] - labels[:, 2])
+            expected = labels[np.argmax(areas), 0]
+            state_total += 1
+            if len(predictions) and predictions[np.argmax(predictions[:, 4]), 5] == expected:
+                state_hits += 1
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'state_accuracy': state_hits / state_total if state_total else None,
+        'latency_ms': summarize(latencies[1:] or latencies),  # first call includes warm-up
+    }
+
+
+def measure_latency(variant, logger, runs=10, shape=(480, 640, 3)):
+    """p95 latency in ms of a variant on this device, using a blank frame."""
+    backend = create_backend(logger, variant['backend'], **backend_kwargs(variant))
+    frame = np.zeros(shape, dtype=np.uint8)
+    backend.predict([frame], CONFIDENCE_THRESHOLD)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        backend.predict([frame], CONFIDENCE_THRESHOLD)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 95)), backend
+
+
+def device_fingerprint():
+    return f"{platform.system()}-{platform.machine()}-{os.cpu_count()}"
+
+
+def select_variant(logger, manifest=None, budget_ms=LATENCY_BUDGET_MS, cache_path=VARIANT_SELECTION_CACHE):
+    """Pick the most accurate variant whose on-device p95 latency fits budget_ms.
+
+    Measured latencies are cached per device, so only the first start on a
+    device pays for timing the candidates. Returns (variant, backend) where
+    backend is already loaded when it had to be measured, or (None, None)
+    without a manifest.
+    """
+    manifest = manifest or load_manifest()
+    if not manifest or not manifest.get('variants'):
+        return None, None
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    device_cache = cache.setdefault(device_fingerprint(), {})
+
+    def accuracy(variant):
+        scores = variant.get('scores', {})
+        return (scores.get('f1') or 0.0, variant['imgsz'])
+    ranked = sorted(manifest['variants'], key=accuracy, reverse=True)
+
+    fastest = None
+    for variant in ranked:
+        backend = None
+        latency = device_cache.get(variant['name'])
+        if latency is None:
+            try:
+                latency, backend = measure_latency(variant, logger)
+            except Exception as e:
+                logger.warning("Variant %s unavailable: %s", variant['name'], e)
+                continue
+            device_cache[variant['name']] = latency
+        if fastest is None or latency < fastest[1]:
+            fastest = (variant, latency)
+        if latency <= budget_ms:
+            logger.info("Selected model variant %s (%.0f ms p95, budget %s ms)", variant['name'], latency, budget_ms)
+            _save_selection_cache(cache, cache_path)
+            return variant, backend
+    _save_selection_cache(cache, cache_path)
+    if fastest is None:
+        return None, None
+    logger.warning("No variant fits %s ms, using fastest: %s (%.0f ms)", budget_ms, fastest[0]['name'], fastest[1])
+    return fastest[0], None
+
+
+def _save_selection_cache(cache, cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build and compare quantized model variants.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='export ONNX variants of model.pt')
+    build.add_argument('--model', default=MODEL_PATH)
+    build.add_argument('--sizes', type=int, nargs='+', default=MODEL_VARIANT_SIZES)
+    evaluate = sub.add_parser('evaluate', help='score every variant on a labeled set')
+    evaluate.add_argument('dataset', help='directory with images/ and labels/')
+    args = parser.parse_args(argv)
+
+    import logging
+    from logger import setup_logger
+    logger = setup_logger(level=logging.WARNING)
+
+    if args.command == 'build':
+        manifest = build_variants(args.model, sizes=args.sizes, logger=logger)
+        print(f"Built {len(manifest['variants'])} variants, manifest at {MODEL_VARIANTS_MANIFEST}")
+        return 0
+
+    manifest = load_manifest()
+    if not manifest:
+        print(f"No manifest at {MODEL_VARIANTS_MANIFEST}, run 'build' first")
+        return 1
+    print(f"{'variant':<12} {'precision':>9} {'recall':>7} {'f1':>6} {'state':>6} {'p50 ms':>7} {'p95 ms':>7}")
+    for variant in manifest['variants']:
+        scores = evaluate_variant(variant, args.dataset, logger)
+        variant['scores'] = scores
+        latency = scores['latency_ms'] or {}
+        state = scores['state_accuracy']
+        print(f"{variant['name']:<12} {scores['precision']:>9.3f} {scores['recall']:>7.3f} {scores['f1']:>6.3f} "
+              f"{state if state is not None else float('nan'):>6.3f} "
+              f"{latency.get('p50', 0):>7.1f} {latency.get('p95', 0):>7.1f}")
+    manifest['evaluated'] = {'dataset': args.dataset, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                             'device': device_fingerprint()}
+    save_manifest(manifest)
+    print(f"Scores saved to {MODEL_VARIANTS_MANIFEST}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import queue
+import threading
+import time
+from config import FPS, DECISION_QUEUE_SIZE
+from metrics import REGISTRY
+
+CAPTURE_MS = REGISTRY.histogram('capture_ms', 'Camera read time in milliseconds')
+INFERENCE_MS = REGISTRY.histogram('inference_ms', 'Inference stage time per frame in milliseconds')
+FRAME_LATENCY_MS = REGISTRY.histogram('frame_latency_ms', 'Capture to inference result in milliseconds')
+FRAMES_CAPTURED = REGISTRY.counter('frames_captured_total', 'Frames read from the camera')
+FRAMES_PROCESSED = REGISTRY.counter('frames_processed_total', 'Frames that went through inference')
+FRAMES_DROPPED = REGISTRY.counter('frames_dropped_total', 'Frames or results replaced by newer ones')
+DECISIONS_DROPPED = REGISTRY.counter('decisions_dropped_total', 'Finished frames dropped before the decision stage took them')
+INFERENCE_ERRORS = REGISTRY.counter('inference_errors_total', 'Frames whose detection raised an exception')
+CAPTURE_FAILURES = REGISTRY.counter('capture_failures_total', 'Failed camera reads')
+FRAME_QUEUE_DEPTH = REGISTRY.gauge('frame_queue_depth', 'Frames waiting for inference')
+
+
+class LatestQueue:
+    """Bounded queue that drops the oldest item instead of blocking the producer."""
+
+    def __init__(self, maxsize=1, drop_counter=None):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.drop_counter = drop_counter
+
+    def put(self, item):
+        """Put an item, discarding the oldest queued item if the queue is full."""
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                    if self.drop_counter is not None:
+                        self.drop_counter.inc()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """Block until an item is available. Raises queue.Empty on timeout."""
+        return self._queue.get(timeout=timeout)
+
+    def get_nowait(self):
+        """Return the next item or None if the queue is empty."""
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def clear(self):
+        while self.get_nowait() is not None:
+            pass
+
+
+class FramePacket:
+    """A captured frame and everything the later stages attach to it."""
+
+    def __init__(self, frame_id, frame, captured_at):
+        self.frame_id = frame_id
+        self.frame = frame
+        self.captured_at = captured_at
+        self.detections = []
+        self.inference_time = 0.0
+        self.completed_at = None
+
+    @property
+    def latency(self):
+        """Seconds from capture to the end of inference."""
+        if self.completed_at is None:
+            return None
+        return self.completed_at - self.captured_at
+
+
+class FramePipeline:
+    """Capture -> inference -> UI pipeline connected by drop-oldest queues.
+
+    The capture thread reads the camera and the inference thread runs the
+    detector, so a slow model never blocks the UI thread. The frame and
+    display queues hold a single item: a stage that falls behind always picks
+    up the newest frame and the stale ones are dropped instead of piling up.
+    Finished frames also go to a longer decision queue, so the light state
+    sees every inference result even when the display skips some.
+    """
+
+    def __init__(self, cap, detector, logger, fps=FPS, governor=None, recorder=None, power=None):
+        self.cap = cap
+        self.detector = detector
+        self.logger = logger
+        self.fps = fps
+        self.governor = governor
+        self.power = power
+        self.recorder = recorder
+        self.frame_queue = LatestQueue(maxsize=1, drop_counter=FRAMES_DROPPED)
+        self.result_queue = LatestQueue(maxsize=1, drop_counter=FRAMES_DROPPED)
+        self.decision_queue = LatestQueue(maxsize=DECISION_QUEUE_SIZE, drop_counter=DECISIONS_DROPPED)
+        self.capture_failed = False
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._next_frame_id = 0
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        """Start the capture and inference threads."""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self.frame_queue.clear()
+        self.result_queue.clear()
+        self.decision_queue.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name='capture', daemon=True),
+            threading.Thread(target=self._inference_loop, name='inference', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        self.logger.info("Frame pipeline started")
+
+    def stop(self, timeout=2.0):
+        """Signal both stages to stop and wait for them to exit."""
+        self._stop_event.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+        self.frame_queue.clear()
+        self.result_queue.clear()
+        self.decision_queue.clear()
+        self.logger.info("Frame pipeline stopped")
+
+    def get_latest(self):
+        """Return the newest finished FramePacket, or None if nothing new is ready."""
+        return self.result_queue.get_nowait()
+
+    def get_completed(self):
+        """Return every FramePacket finished since the last call, oldest first."""
+        packets = []
+        packet = self.decision_queue.get_nowait()
+        while packet is not None:
+            packets.append(packet)
+            packet = self.decision_queue.get_nowait()
+        return packets
+
+    def _capture_loop(self):
+        while not self._stop_event.is_set():
+            if self.power and self.power.watching:
+                fps = self.power.watch_fps
+            else:
+                fps = self.governor.fps if self.governor else self.fps
+            interval = 1.0 / fps if fps else 0.0
+            started = time.monotonic()
+            try:
+                ret, frame = self.cap.read()
+            except Exception as e:
+                self.logger.error("Capture error: %s", e)
+                ret, frame = False, None
+            CAPTURE_MS.observe((time.monotonic() - started) * 1000)
+            if ret and frame is not None:
+                self.capture_failed = False
+                if self.recorder:
+                    self.recorder.record(frame, started)
+                packet = FramePacket(self._next_frame_id, frame, started)
+                self._next_frame_id += 1
+                self.frame_queue.put(packet)
+                FRAMES_CAPTURED.inc()
+                FRAME_QUEUE_DEPTH.set(self.frame_queue.qsize())
+            else:
+                self.capture_failed = True
+                CAPTURE_FAILURES.inc()
+            # Pace the camera to the configured rate; a blocking read already
+            # counts towards the interval.
+            remaining = interval - (time.monotonic() - started)
+            if remaining > 0:
+                self._stop_event.wait(remaining)
+
+    def _inference_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                packet = self.frame_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            started = time.monotonic()
+            try:
+                packet.detections = self.detector.detect_traffic_lights(packet.frame)
+            except Exception:
+                # One bad frame must not take the worker down with it
+                self.logger.exception("Inference error on frame %d", packet.frame_id)
+                INFERENCE_ERRORS.inc()
+                continue
+            packet.completed_at = time.monotonic()
+            packet.inference_time = packet.completed_at - started
+            FRAMES_PROCESSED.inc()
+            INFERENCE_MS.observe(packet.inference_time * 1000)
+            FRAME_LATENCY_MS.observe(packet.latency * 1000)
+            # The governor times the model itself; watch-mode frames never reach it
+            if self.governor and not (self.power and self.power.watching):
+                self.governor.observe(packet.detections, packet.frame.shape)
+            self.decision_queue.put(packet)
+            self.result_queue.put(packet)
@@ -0,0 +1,134 @@
+import time
+from config import WATCH_FPS, WATCH_WAKE_THRESHOLD, WATCH_CHECK_INTERVAL, IDLE_TIMEOUT
+from color_gate import find_color_blobs
+from detection_cache import frame_signature, signature_distance
+from detector import EMPTY_DETECTIONS, detections_to_dicts
+from metrics import REGISTRY
+
+ACTIVE = 'active'
+WATCH = 'watch'
+POWER_SECONDS = {state: REGISTRY.counter(f'power_{state}_seconds_total', f'Seconds spent in the {state} power state')
+                 for state in (ACTIVE, WATCH)}
+POWER_WAKEUPS = REGISTRY.counter('power_wakeups_total', 'Switches from watch mode back to full detection')
+POWER_WATCHING = REGISTRY.gauge('power_watching', '1 while in low-power watch mode, 0 during full detection')
+
+
+class PowerManager:
+    """Drops to a low-power watch mode when no light has been seen for a while.
+
+    After `idle_after` seconds without a detection the wrapped detector is no
+    longer called and the capture rate drops to `watch_fps`. Each watch frame
+    only gets two cheap checks: a block signature compared with the previous
+    watch frame (the camera moved or something in view changed) and the
+    color gate's lit-lamp search (more lamps than when watching started).
+    Either one switches straight back to full detection on the same frame.
+    Every `check_interval` seconds one frame goes through the model anyway,
+    so a light that appears without a visible change is still found.
+
+    Exposes the same detect_traffic_lights/detect_batch interface as
+    TrafficLightDetector and sits in front of the rest of the stack.
+    """
+
+    def __init__(self, detector, logger, idle_after=IDLE_TIMEOUT, watch_fps=WATCH_FPS,
+                 wake_threshold=WATCH_WAKE_THRESHOLD, check_interval=WATCH_CHECK_INTERVAL, on_wake=None,
+                 clock=time.monotonic):
+        self.detector = detector
+        self.logger = logger
+        self.idle_after = idle_after
+        self.watch_fps = watch_fps
+        self.wake_threshold = wake_threshold
+        self.check_interval = check_interval
+        self.on_wake = on_wake
+        self.clock = clock
+        self.seconds = {ACTIVE: 0.0, WATCH: 0.0}
+        self.wakeups = 0
+        self.reset()
+
+    @property
+    def model(self):
+        return self.detector.model
+
+    @property
+    def class_names(self):
+        return self.detector.class_names
+
+    @property
+    def watching(self):
+        return self.state == WATCH
+
+    def reset(self):
+        """Start over in full detection, e.g. when a new camera is opened."""
+        now = self.clock()
+        self.state = ACTIVE
+        self.last_seen = now
+        self.last_tick = now
+        self.last_check = now
+        self.signature = None
+        self.baseline_lamps = 0
+        POWER_WATCHING.set(0)
+
+    def report(self):
+        """Seconds spent in each power state and the number of wake-ups."""
+        return dict(self.seconds, state=self.state, wakeups=self.wakeups)
+
+    def detect_traffic_lights(self, frame):
+        return detections_to_dicts(self.detect_batch([frame])[0], self.class_names)
+
+    def detect_batch(self, frames):
+        return [self._detect(frame) for frame in frames]
+
+    def _detect(self, frame):
+        now = self.clock()
+        elapsed = now - self.last_tick
+        self.seconds[self.state] += elapsed
+        POWER_SECONDS[self.state].inc(elapsed)
+        self.last_tick = now
+
+        if self.state == WATCH:
+            reason, boxes = self._check(frame, now)
+            if reason is None:
+                return EMPTY_DETECTIONS
+            self._wake(now, reason)
+            if boxes is not None:
+                return boxes
+
+        boxes = self.detector.detect_batch([frame])[0]
+        if len(boxes):
+            self.last_seen = now
+        elif now - self.last_seen >= self.idle_after:
+            self._watch(frame, now)
+        return boxes
+
+    def _check(self, frame, now):
+        """Cheap checks on a watch frame; returns (wake reason or None, detections if the model ran)."""
+        signature = frame_signature(frame)
+        previous, self.signature = self.signature, signature
+        if previous is not None and signature_distance(signature, previous) > self.wake_threshold:
+            return 'scene changed', None
+        if len(find_color_blobs(frame)) > self.baseline_lamps:
+            return 'lit lamp appeared', None
+        if now - self.last_check >= self.check_interval:
+            self.last_check = now
+            boxes = self.detector.detect_batch([frame])[0]
+            if len(boxes):
+                return 'periodic check found a light', boxes
+        return None, None
+
+    def _watch(self, frame, now):
+        self.logger.info("No light for %.0fs, switching to watch mode", now - self.last_seen)
+        self.state = WATCH
+        self.signature = frame_signature(frame)
+        # Lamps already in view (a tail light, a shop sign) should not keep waking detection up
+        self.baseline_lamps = len(find_color_blobs(frame))
+        self.last_check = now
+        POWER_WATCHING.set(1)
+
+    def _wake(self, now, reason):
+        self.logger.info("Leaving watch mode: %s", reason)
+        self.state = ACTIVE
+        self.last_seen = now
+        self.wakeups += 1
+        POWER_WAKEUPS.inc()
+        POWER_WATCHING.set(0)
+        if self.on_wake:
+            self.on_wake(now)
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+from kivy.graphics.texture import Texture
+
+BOX_COLOR = (0, 255, 0)
+
+
+class PreviewRenderer:
+    """Uploads camera frames into one reusable texture on an Image widget.
+
+    The texture is only recreated when the frame size changes. OpenCV rows
+    run top to bottom while Kivy textures run bottom to top, so the texture's
+    UV coordinates are flipped once instead of flipping every frame's pixels.
+    Annotations are drawn straight into the frame, which the pipeline hands
+    over and never reads again, so a frame is uploaded without any copy.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.texture = None
+
+    def render(self, frame, detections):
+        self.annotate(frame, detections)
+        height, width = frame.shape[:2]
+        if self.texture is None or self.texture.size != (width, height):
+            self.texture = Texture.create(size=(width, height), colorfmt='bgr')
+            self.texture.flip_vertical()
+            self.image.texture = self.texture
+        # reshape(-1) is a view for contiguous frames, so this uploads the camera buffer as is
+        self.texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+        self.image.canvas.ask_update()
+
+    @staticmethod
+    def annotate(frame, detections):
+        for detection in detections:
+            x1, y1, x2, y2 = (int(v) for v in detection['bbox'])
+            # Draw bounding box
+            cv2.rectangle(frame, (x1, y1), (x2, y2), BOX_COLOR, 2)
+            # Draw label
+            label = f"{detection['color']}: {detection['confidence']:.2f}"
+            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, BOX_COLOR, 2)
+
+    def reset(self):
+        self.texture = None
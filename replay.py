@@ -0,0 +1,54 @@
+"""
+Replay a recording through detection and the light state logic without a UI.
+
+Every frame is processed in order (nothing is dropped), so the same
+recording and settings always produce the same decisions.
+
+    python replay.py recordings/20260101-120000 --fast --decisions out.jsonl
+"""
+
+import argparse
+import logging
+import sys
+from config import TRACKING_ENABLED, COLOR_GATE_ENABLED, DETECTION_CACHE_ENABLED
+from engine import DetectionEngine, build_detection_stack
+from frame_source import ReplaySource
+from logger import setup_logger
+from settings import SETTINGS, SettingsError
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recording and log the resulting decisions.')
+    parser.add_argument('recording', help='recording directory written by FrameRecorder')
+    parser.add_argument('--fast', action='store_true', help='run as fast as possible instead of in real time')
+    parser.add_argument('--decisions', default='decisions.jsonl', help="JSON-lines output of decisions, '-' for stdout")
+    parser.add_argument('--no-gate', action='store_true', help='run the model even on frames with no lit lamps')
+    parser.add_argument('--no-tracking', action='store_true', help='run full detection on every frame')
+    parser.add_argument('--no-cache', action='store_true', help='detect again even when the scene has not changed')
+    args = parser.parse_args(argv)
+
+    logger = setup_logger(level=logging.WARNING)
+    try:
+        SETTINGS.load()
+    except SettingsError as e:
+        print(f"Invalid settings: {e}", file=sys.stderr)
+        return 1
+    stack = build_detection_stack(logger, gate=COLOR_GATE_ENABLED and not args.no_gate,
+                                  tracking=TRACKING_ENABLED and not args.no_tracking,
+                                  cache=DETECTION_CACHE_ENABLED and not args.no_cache)
+    if not stack.ready:
+        print("Model failed to load, see logs/app.log")
+        return 1
+
+    engine = DetectionEngine(stack, logger, governor=False)
+    source = ReplaySource(args.recording, realtime=not args.fast)
+    try:
+        frames, elapsed = engine.run(source, decisions_path=args.decisions)
+    finally:
+        source.release()
+    print(f"Replayed {frames} frames in {elapsed:.1f}s, decisions written to {args.decisions}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""
+Runtime settings that can be changed without restarting detection.
+
+config.py holds the defaults. They can be overridden by a JSON file
+(SETTINGS_PATH) and then by environment variables named with
+SETTINGS_ENV_PREFIX. Every value is type-checked and range-checked before
+anything is applied, so a bad edit never leaves a half-updated
+configuration. When the file changes on disk it is reloaded, and subscribers
+are told about each value that actually changed.
+
+    echo '{"CONFIDENCE_THRESHOLD": 0.6, "FPS": 12}' > settings.json
+    TRAFFICLIGHT_IDLE_TIMEOUT=60 python main.py
+"""
+
+import asyncio
+import json
+import os
+import threading
+import weakref
+from config import (CONFIDENCE_THRESHOLD, FPS, FPS_MIN, FPS_MAX, LATENCY_BUDGET_MS, AUDIO_INTERVAL_RED,
+                    IDLE_TIMEOUT, BLUETOOTH_TIMEOUT, BLUETOOTH_CONNECT_TIMEOUT, BLUETOOTH_WRITE_TIMEOUT,
+                    STATE_CONFIRM_FRAMES, STATE_SWITCH_MARGIN, TRACKING_DETECT_INTERVAL,
+                    COLOR_GATE_FORCE_INTERVAL, DETECTION_CACHE_THRESHOLD, DETECTION_CACHE_MAX_AGE, WATCH_FPS,
+                    WATCH_WAKE_THRESHOLD, WATCH_CHECK_INTERVAL, SETTINGS_PATH, SETTINGS_ENV_PREFIX, SETTINGS_POLL_INTERVAL)
+
+
+class SettingsError(ValueError):
+    pass
+
+
+class Setting:
+    """A named, typed value with an allowed range."""
+
+    def __init__(self, name, kind, default, minimum=None, maximum=None):
+        self.name = name
+        self.kind = kind
+        self.minimum = minimum
+        self.maximum = maximum
+        self.default = self.coerce(default)
+
+    def coerce(self, value):
+        """Convert value (possibly a string from the environment) to this setting's type, or raise."""
+        if isinstance(value, str):
+            text = value.strip()
+            if self.kind is bool:
+                if text.lower() not in ('1', '0', 'true', 'false', 'yes', 'no', 'on', 'off'):
+                    raise SettingsError(f"{self.name}: {value!r} is not a boolean")
+                value = text.lower() in ('1', 'true', 'yes', 'on')
+            else:
+                try:
+                    value = self.kind(text)
+                except ValueError:
+                    raise SettingsError(f"{self.name}: {value!r} is not a valid {self.kind.__name__}")
+        # bool is an int subclass; true/false in a numeric field is a typo, not a number
+        if isinstance(value, bool) != (self.kind is bool):
+            raise SettingsError(f"{self.name}: expected {self.kind.__name__}, got {value!r}")
+        if self.kind is float and isinstance(value, int):
+            value = float(value)
+        if not isinstance(value, self.kind):
+            raise SettingsError(f"{self.name}: expected {self.kind.__name__}, got {value!r}")
+        if self.minimum is not None and value < self.minimum:
+            raise SettingsError(f"{self.name}: {value} is below the minimum {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise SettingsError(f"{self.name}: {value} is above the maximum {self.maximum}")
+        return value
+
+
+SCHEMA = [
+    Setting('CONFIDENCE_THRESHOLD', float, CONFIDENCE_THRESHOLD, 0.0, 1.0),
+    Setting('FPS', int, FPS, 1, 60),
+    Setting('FPS_MIN', int, FPS_MIN, 1, 60),
+    Setting('FPS_MAX', int, FPS_MAX, 1, 60),
+    Setting('LATENCY_BUDGET_MS', float, LATENCY_BUDGET_MS, 1.0, 10000.0),
+    Setting('AUDIO_INTERVAL_RED', float, AUDIO_INTERVAL_RED, 0.0, 3600.0),
+    Setting('IDLE_TIMEOUT', float, IDLE_TIMEOUT, 1.0, 86400.0),
+    Setting('BLUETOOTH_TIMEOUT', float, BLUETOOTH_TIMEOUT, 0.5, 120.0),
+    Setting('BLUETOOTH_CONNECT_TIMEOUT', float, BLUETOOTH_CONNECT_TIMEOUT, 0.5, 300.0),
+    Setting('BLUETOOTH_WRITE_TIMEOUT', float, BLUETOOTH_WRITE_TIMEOUT, 0.05, 60.0),
+    Setting('STATE_CONFIRM_FRAMES', int, STATE_CONFIRM_FRAMES, 1, 60),
+    Setting('STATE_SWITCH_MARGIN', float, STATE_SWITCH_MARGIN, 0.0, 1.0),
+    Setting('TRACKING_DETECT_INTERVAL', int, TRACKING_DETECT_INTERVAL, 1, 300),
+    Setting('COLOR_GATE_FORCE_INTERVAL', int, COLOR_GATE_FORCE_INTERVAL, 1, 10000),
+    Setting('DETECTION_CACHE_THRESHOLD', int, DETECTION_CACHE_THRESHOLD, 0, 255),
+    Setting('DETECTION_CACHE_MAX_AGE', float, DETECTION_CACHE_MAX_AGE, 0.0, 60.0),
+    Setting('WATCH_FPS', int, WATCH_FPS, 1, 60),
+    Setting('WATCH_WAKE_THRESHOLD', int, WATCH_WAKE_THRESHOLD, 0, 255),
+    Setting('WATCH_CHECK_INTERVAL', float, WATCH_CHECK_INTERVAL, 0.5, 3600.0),
+]
+
+
+def check_consistency(values):
+    """Rules that involve more than one setting."""
+    if not values['FPS_MIN'] <= values['FPS'] <= values['FPS_MAX']:
+        raise SettingsError(f"Need FPS_MIN <= FPS <= FPS_MAX, got "
+                            f"{values['FPS_MIN']} / {values['FPS']} / {values['FPS_MAX']}")
+
+
+class SettingsStore:
+    """Validated settings with change notification.
+
+    Subscribers are called as callback(name, value) on the thread that made
+    the change (the I/O loop for file reloads), so they should only do quick
+    work such as assigning an attribute.
+    """
+
+    def __init__(self, schema=SCHEMA, path=SETTINGS_PATH, env_prefix=SETTINGS_ENV_PREFIX):
+        self.schema = {setting.name: setting for setting in schema}
+        self.path = path
+        self.env_prefix = env_prefix
+        self._values = {name: setting.default for name, setting in self.schema.items()}
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._watch = None
+        self._mtime = None
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def get(self, name, default=None):
+        return self._values.get(name, default)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def update(self, values):
+        """Validate and apply several values at once; returns the ones that changed."""
+        with self._lock:
+            merged = dict(self._values)
+            for name, value in values.items():
+                if name not in self.schema:
+                    raise SettingsError(f"Unknown setting {name}")
+                merged[name] = self.schema[name].coerce(value)
+            check_consistency(merged)
+            changed = {name: value for name, value in merged.items() if value != self._values[name]}
+            self._values = merged
+            subscribers = list(self._subscribers)
+        for name, value in changed.items():
+            for names, callback in subscribers:
+                if names is None or name in names:
+                    callback(name, value)
+        return changed
+
+    def set(self, name, value):
+        return self.update({name: value})
+
+    def subscribe(self, callback, *names):
+        """Call callback(name, value) when any of names (or any setting) changes; returns an unsubscribe function."""
+        entry = (frozenset(names) if names else None, callback)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def bind(self, target, attribute, name):
+        """Set target.attribute to the setting now and whenever it changes.
+
+        Only a weak reference to target is kept, so binding does not keep
+        short-lived objects alive.
+        """
+        setattr(target, attribute, self[name])
+        ref = weakref.ref(target)
+
+        def apply(_, value):
+            obj = ref()
+            if obj is None:
+                unsubscribe()
+            else:
+                setattr(obj, attribute, value)
+        unsubscribe = self.subscribe(apply, name)
+
+    def sources(self):
+        """Overrides from the settings file and the environment, environment last."""
+        values = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    overrides = json.load(f)
+            except (OSError, ValueError) as e:
+                raise SettingsError(f"Cannot read {self.path}: {e}")
+            if not isinstance(overrides, dict):
+                raise SettingsError(f"{self.path} must contain a JSON object")
+            values.update(overrides)
+        for name in self.schema:
+            env_value = os.environ.get(self.env_prefix + name)
+            if env_value is not None:
+                values[name] = env_value
+        return values
+
+    def load(self):
+        """Re-read defaults, file and environment; returns the values that changed."""
+        self._mtime = self._file_mtime()
+        values = {name: setting.default for name, setting in self.schema.items()}
+        values.update(self.sources())
+        return self.update(values)
+
+    def watch(self, logger, loop=None, interval=SETTINGS_POLL_INTERVAL):
+        """Reload whenever the settings file changes; checks run as a task on the I/O loop."""
+        if loop is None:
+            from event_loop import IO_LOOP
+            loop = IO_LOOP
+        self.stop_watching()
+        self._watch = loop.submit(self._watch_loop(logger, interval))
+
+    def stop_watching(self):
+        if self._watch is not None:
+            self._watch.cancel()
+            self._watch = None
+
+    async def _watch_loop(self, logger, interval):
+        while True:
+            await asyncio.sleep(interval)
+            if self._file_mtime() == self._mtime:
+                continue
+            try:
+                changed = self.load()
+            except SettingsError as e:
+                # Keep running on the last good values until the file is fixed
+                logger.error("Settings not reloaded: %s", e)
+                continue
+            if changed:
+                logger.info("Settings reloaded: %s", changed)
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+
+# Shared store for the app
+SETTINGS = SettingsStore()
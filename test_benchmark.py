@@ -0,0 +1,47 @@
+"""
+Test script for the offline benchmark.
+Runs a stand-in detector over synthetic frames and checks that warm-up is
+left out in whole batches and that the frame count, throughput and stage
+timings only cover the measured frames.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from benchmark import run_benchmark
+from fakes import RED_BOX, FakeDetector, make_frame
+
+
+class TimedDetector(FakeDetector):
+    """FakeDetector that reports a fixed inference time per call like the real backends."""
+
+    last_timings = {'inference': 4.0}
+
+
+def frames(count):
+    return ((make_frame(), 1.0) for _ in range(count))
+
+
+def test_warmup_does_not_split_a_batch():
+    detector = TimedDetector(box=RED_BOX)
+    report = run_benchmark(detector, frames(12), batch_size=4, warmup=3)
+    # The first batch reaches the third frame, so all four of its frames are warm-up
+    assert [len(call) for call in detector.calls] == [4, 4, 4]
+    assert report['frames'] == 8 and report['detections'] == 8
+    assert report['fps'] > 0
+    # 4 ms for a batch of four frames is 1 ms per frame
+    assert report['stages_ms']['inference']['max'] == 1.0
+
+
+def test_max_frames_counts_measured_frames():
+    detector = TimedDetector(box=RED_BOX)
+    report = run_benchmark(detector, frames(20), batch_size=4, warmup=3, max_frames=4)
+    assert report['frames'] == 4 and detector.frames == 8
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
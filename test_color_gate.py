@@ -0,0 +1,60 @@
+"""
+Test script for the color pre-filter.
+Checks that dark frames skip the model, lit lamps pass it, crops are mapped
+back to frame coordinates and contradicting classes are rejected.
+"""
+
+import sys
+import os
+import logging
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from color_gate import GatedDetector, find_color_blobs
+from fakes import RED, GREEN, CLASS_IDS, FakeDetector, make_frame
+
+
+def test_dark_frame_skips_model():
+    detector = FakeDetector()
+    gate = GatedDetector(detector, logging.getLogger('test'), force_interval=100)
+    gate.detect_batch([make_frame()])  # first frame is always a full detection
+    results = gate.detect_batch([make_frame() for _ in range(5)])
+    assert len(detector.calls) == 1
+    assert all(len(boxes) == 0 for boxes in results)
+
+
+def test_lit_lamp_passes_gate():
+    blobs = find_color_blobs(make_frame(RED))
+    assert len(blobs) == 1
+    x1, y1, x2, y2 = blobs[0]
+    assert x1 <= 320 <= x2 and y1 <= 200 <= y2
+
+    detector = FakeDetector()
+    gate = GatedDetector(detector, logging.getLogger('test'), force_interval=100)
+    gate.detect_batch([make_frame()])
+    gate.detect_batch([make_frame(RED)])
+    assert len(detector.calls) == 2
+
+
+def test_crops_are_mapped_back():
+    # Box in crop coordinates; the crop starts well inside the frame
+    detector = FakeDetector(box=[5, 5, 25, 25, 0.9, CLASS_IDS['Red']])
+    gate = GatedDetector(detector, logging.getLogger('test'), mode='crops', force_interval=100)
+    gate.frames_since_full = 0
+    boxes = gate.detect_batch([make_frame(RED)])[0]
+    assert detector.calls[0][0][0] < 480  # a crop, not the full frame
+    assert len(boxes) == 1 and boxes[0][0] > 200 and boxes[0][1] > 100
+
+
+def test_contradicting_class_is_rejected():
+    box = [300, 180, 340, 220, 0.9, CLASS_IDS['Red']]
+    gate = GatedDetector(FakeDetector(box=box), logging.getLogger('test'))
+    assert len(gate.detect_batch([make_frame(RED)])[0]) == 1
+    gate.reset()
+    assert len(gate.detect_batch([make_frame(GREEN)])[0]) == 0
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,72 @@
+"""
+Test script for the detection cache.
+Checks that a still scene reuses detections, that noise is tolerated but a
+small lamp changing color is not, and that age and size limits are applied.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from detection_cache import CachedDetector
+from fakes import RED, GREEN, YELLOW, make_frame, make_layer
+
+
+def make_cache(**kwargs):
+    return make_layer(CachedDetector, box=[300, 180, 340, 220, 0.9, 0], **kwargs)
+
+
+def lamp(color):
+    """A small lamp, so only a few signature blocks see the color change."""
+    return make_frame(color, radius=6)
+
+
+def test_still_scene_is_reused():
+    cache, detector, clock = make_cache()
+    for i in range(10):
+        detections = cache.detect_traffic_lights(make_frame(RED, radius=6, noise=4, seed=i))
+        clock.now += 1 / 15
+        assert detections and detections[0]['color'] == 'Red'
+    # Ten frames span 0.6 s, inside the default maximum age
+    assert detector.frames == 1
+    assert cache.hits == 9 and cache.misses == 1
+
+
+def test_small_color_change_is_detected():
+    cache, detector, _ = make_cache()
+    cache.detect_batch([lamp(RED)])
+    cache.detect_batch([lamp(GREEN)])
+    assert detector.frames == 2
+
+
+def test_max_age_forces_detection():
+    cache, detector, clock = make_cache(max_age=0.5)
+    cache.detect_batch([lamp(RED)])
+    clock.now += 0.4
+    cache.detect_batch([lamp(RED)])
+    clock.now += 0.2
+    cache.detect_batch([lamp(RED)])
+    assert detector.frames == 2
+
+
+def test_least_recently_used_is_evicted():
+    cache, detector, _ = make_cache(size=2)
+    red, green, yellow = lamp(RED), lamp(GREEN), lamp(YELLOW)
+    cache.detect_batch([red, green])
+    cache.detect_batch([red])  # red is now the most recently used
+    cache.detect_batch([yellow])  # evicts green
+    assert detector.frames == 3
+    cache.detect_batch([red])
+    assert detector.frames == 3
+    cache.detect_batch([green])
+    assert detector.frames == 4
+    cache.reset()
+    cache.detect_batch([red])
+    assert detector.frames == 5
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,136 @@
+"""
+Test script for the multi-device registry.
+Uses an in-memory transport to check parallel fan-out, per-device ack
+tracking, the scan cache, that reconnecting units get the current state and
+that units are only read from when they echo packets.
+"""
+
+import sys
+import os
+import asyncio
+import logging
+import tempfile
+import time
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from device_registry import DeviceRegistry
+
+WRITE_DELAY = 0.05
+
+
+class FakeTransport:
+    units = [('ADDR_WRIST', 'CHROMA_ESP32_WRIST'), ('ADDR_BELT', 'CHROMA_ESP32_BELT'), ('ADDR_VEST', 'CHROMA_ESP32_VEST')]
+    scans = 0
+    failing = set()
+
+    def __init__(self, logger, address):
+        self.address = address
+        self.connected = False
+        self.writes = []
+        self.reads = 0
+
+    @staticmethod
+    async def discover(logger):
+        FakeTransport.scans += 1
+        return list(FakeTransport.units)
+
+    async def connect(self):
+        if self.address in FakeTransport.failing:
+            raise Exception("unreachable")
+        self.connected = True
+
+    async def write(self, data):
+        await asyncio.sleep(WRITE_DELAY)
+        self.writes.append(data)
+
+    async def receive(self):
+        self.reads += 1
+        # Nothing is ever echoed; blocks until the reader is cancelled
+        await asyncio.Event().wait()
+
+    async def close(self):
+        self.connected = False
+
+
+def test_broadcast_is_parallel():
+    async def run(cache_path):
+        registry = DeviceRegistry(logging.getLogger('test'), FakeTransport, cache_path)
+        assert len(await registry.ensure_connected()) >= 1
+        await asyncio.sleep(0)  # let the remaining connect tasks finish
+        assert len(registry.connected_devices) == 3
+        started = time.monotonic()
+        assert await registry.broadcast(b'RED\n', state=True) == 3
+        elapsed = time.monotonic() - started
+        # Three devices cost about one write, not three
+        assert elapsed < 2 * WRITE_DELAY
+        for status in registry.status():
+            assert status['acked'] == 1 and status['last_latency_ms'] >= WRITE_DELAY * 1000 * 0.5
+        await registry.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(os.path.join(directory, 'bt.json')))
+
+
+def test_cache_skips_scan():
+    async def run(cache_path):
+        FakeTransport.scans = 0
+        registry = DeviceRegistry(logging.getLogger('test'), FakeTransport, cache_path)
+        await registry.ensure_connected()
+        await registry.close()
+        restarted = DeviceRegistry(logging.getLogger('test'), FakeTransport, cache_path)
+        assert set(restarted.devices) == {address for address, _ in FakeTransport.units}
+        await restarted.ensure_connected()
+        await restarted.close()
+        assert FakeTransport.scans == 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(os.path.join(directory, 'bt.json')))
+
+
+def test_reconnected_device_gets_current_state():
+    async def run(cache_path):
+        FakeTransport.failing = {'ADDR_BELT'}
+        registry = DeviceRegistry(logging.getLogger('test'), FakeTransport, cache_path)
+        await registry.ensure_connected()
+        await asyncio.sleep(0)
+        assert await registry.broadcast(b'RED\n', state=True) == 2
+        belt = registry.devices['ADDR_BELT']
+        assert belt.failures == 1 and not belt.connected
+
+        FakeTransport.failing = set()
+        belt.next_attempt = 0.0
+        await registry.ensure_connected()
+        while belt.connect_task is not None:
+            await asyncio.sleep(0.01)
+        assert belt.transport.writes == [b'RED\n']
+        await registry.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(os.path.join(directory, 'bt.json')))
+
+
+def test_echoes_are_read_only_when_enabled():
+    async def run(cache_path, read_echoes):
+        FakeTransport.failing = set()
+        registry = DeviceRegistry(logging.getLogger('test'), FakeTransport, cache_path)
+        registry.read_echoes = read_echoes
+        await registry.ensure_connected()
+        while any(device.connect_task is not None for device in registry.devices.values()):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0)
+        reads = [device.transport.reads for device in registry.devices.values()]
+        readers = [device.reader_task is not None for device in registry.devices.values()]
+        await registry.close()
+        return reads, readers
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Text-protocol units never echo, so nothing waits on them
+        assert asyncio.run(run(os.path.join(directory, 'text.json'), False)) == ([0, 0, 0], [False] * 3)
+        assert asyncio.run(run(os.path.join(directory, 'binary.json'), True)) == ([1, 1, 1], [True] * 3)
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,180 @@
+"""
+Test script for the UI-independent detection engine.
+Runs scripted detections through DetectionEngine, both frame by frame and
+through the live pipeline, and checks the decisions and actuator calls.
+Also checks that the engine and the headless runner import without Kivy, cv2,
+NumPy or an inference runtime.
+"""
+
+import sys
+import os
+import json
+import logging
+import subprocess
+import tempfile
+import time
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+import numpy as np
+from engine import DetectionEngine, DetectionStack
+from fakes import RED, GREEN, RED_BOX, GREEN_BOX, ScriptedDetector, ListSource, make_frame
+
+BLANK = np.zeros((48, 64, 3), dtype=np.uint8)
+
+
+class RecordingBluetooth:
+    def __init__(self):
+        self.commands = []
+
+    def send_vibration_command(self, command, trace=None):
+        self.commands.append((command, trace))
+
+
+def make_script():
+    return [None] * 5 + [RED_BOX] * 10 + [GREEN_BOX] * 10
+
+
+def blank_source(count=25):
+    return ListSource([BLANK] * count)
+
+
+def test_run_is_deterministic():
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = []
+        for run in range(2):
+            path = os.path.join(directory, f'decisions{run}.jsonl')
+            bluetooth = RecordingBluetooth()
+            engine = DetectionEngine(DetectionStack(ScriptedDetector(make_script())), logging.getLogger('test'),
+                                     bluetooth_manager=bluetooth, governor=False)
+            frames, _ = engine.run(blank_source(), decisions_path=path)
+            assert frames == 25
+            assert [command for command, _ in bluetooth.commands] == ['RED', 'GREEN']
+            # Traces only make sense for live frames
+            assert all(trace is None for _, trace in bluetooth.commands)
+            with open(path) as f:
+                entries = [json.loads(line) for line in f]
+            outputs.append([(e['event'], e['value'], e['frame'], e['timestamp']) for e in entries])
+        assert outputs[0] == outputs[1]
+        assert [(event, value) for event, value, _, _ in outputs[0]] == [('vibration', 'RED'), ('audio', 'red'),
+                                                                        ('vibration', 'GREEN')]
+
+
+def brightness(frame):
+    """Script key for video frames: a round trip keeps a flat frame's level but not single pixels."""
+    return int(round(frame.mean() / 8))
+
+
+def write_clip(path, count, fps=15):
+    import cv2
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (64, 48))
+    for index in range(count):
+        writer.write(np.full((48, 64, 3), index * 8, dtype=np.uint8))
+    writer.release()
+
+
+def test_video_decisions_do_not_depend_on_host_speed():
+    from frame_source import open_source
+    with tempfile.TemporaryDirectory() as directory:
+        clip = os.path.join(directory, 'clip.avi')
+        write_clip(clip, 25)
+        outputs = []
+        for delay in (0.0, 0.02):
+            path = os.path.join(directory, f'decisions-{delay}.jsonl')
+            engine = DetectionEngine(DetectionStack(ScriptedDetector(make_script(), key=brightness, delay=delay)), logging.getLogger('test'),
+                                     governor=False, watch=False)
+            source, live = open_source(clip)
+            assert not live
+            frames, _ = engine.run(source, decisions_path=path)
+            source.release()
+            assert frames == 25
+            with open(path) as f:
+                # 'time' is when the line was written, the rest is the decision
+                outputs.append([{k: v for k, v in json.loads(line).items() if k != 'time'} for line in f])
+        assert outputs[0] == outputs[1]
+        assert [(e['event'], e['value']) for e in outputs[0]] == [('vibration', 'RED'), ('audio', 'red'),
+                                                                  ('vibration', 'GREEN')]
+        assert outputs[0][0]['timestamp'] > 0
+
+
+def test_run_with_default_layers_does_not_depend_on_host_speed():
+    from color_gate import GatedDetector
+    from detection_cache import CachedDetector
+    from tracker import TrafficLightTracker
+    logger = logging.getLogger('test')
+    frames = [make_frame(RED)] * 15 + [make_frame(GREEN)] * 25
+    script = [RED_BOX] * 15 + [GREEN_BOX] * 25
+    outputs = []
+    for delay in (0.0, 0.04):
+        detector = ScriptedDetector(script)
+        stack = DetectionStack(detector)
+        stack.gate = GatedDetector(detector, logger)
+        stack.tracker = TrafficLightTracker(stack.head, logger)
+        stack.cache = CachedDetector(stack.head, logger)
+        bluetooth = RecordingBluetooth()
+        engine = DetectionEngine(stack, logger, bluetooth_manager=bluetooth, governor=False, watch=False)
+        assert engine.run(ListSource(frames, delay=delay))[0] == 40
+        outputs.append(([command for command, _ in bluetooth.commands], len(detector.calls), stack.cache.hits))
+        # Live detection goes back to the wall clock
+        assert stack.cache.clock is time.monotonic
+    assert outputs[0] == outputs[1]
+    # 2.6 s of capture time: at least one re-detection after max_age
+    assert outputs[0][0] == ['RED', 'GREEN'] and outputs[0][1] > 1
+
+
+def test_live_pipeline_decides():
+    bluetooth = RecordingBluetooth()
+    engine = DetectionEngine(DetectionStack(ScriptedDetector(make_script())), logging.getLogger('test'),
+                             bluetooth_manager=bluetooth, governor=False)
+    source = blank_source()
+    engine.start(source)
+    engine.pipeline.fps = 200
+    try:
+        deadline = time.monotonic() + 5
+        while len(bluetooth.commands) < 2 and time.monotonic() < deadline:
+            engine.poll()
+            time.sleep(0.002)
+    finally:
+        engine.stop()
+    assert [command for command, _ in bluetooth.commands] == ['RED', 'GREEN']
+    _, trace = bluetooth.commands[0]
+    assert trace is not None and trace.decided >= trace.captured >= trace.onset
+    assert not engine.running
+
+
+def test_live_pipeline_survives_errors_and_decides_on_every_frame():
+    detector = ScriptedDetector(make_script(), failing={3, 7})
+    engine = DetectionEngine(DetectionStack(detector), logging.getLogger('test'), governor=False, watch=False)
+    processed = []
+    process = engine.process
+    engine.process = lambda packet: processed.append(packet.frame_id) or process(packet)
+    source = blank_source()
+    engine.start(source)
+    engine.pipeline.fps = 60
+    try:
+        deadline = time.monotonic() + 5
+        while (source.isOpened() or engine.pipeline.frame_queue.qsize()) and time.monotonic() < deadline:
+            # Poll slower than frames finish, so the display skips results
+            time.sleep(0.05)
+            engine.poll()
+        time.sleep(0.2)
+        engine.poll()
+    finally:
+        engine.stop()
+    assert detector.failed and 3 not in processed and 7 not in processed
+    # Every finished frame reached the decision stage, in order
+    assert len(processed) == detector.frames and processed == sorted(processed)
+
+
+def test_imports_without_ui_or_model_runtime():
+    code = ("import sys, engine, headless; "
+            "print(sorted(m for m in ('kivy', 'cv2', 'torch', 'onnxruntime', 'pygame', 'numpy') if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]', output
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,105 @@
+"""
+Test script for the background asyncio loop.
+Checks timeouts, cancellation and that the Bluetooth writer coalesces a
+burst of commands into the latest one per slot over a single connection.
+"""
+
+import sys
+import os
+import asyncio
+import logging
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from concurrent.futures import TimeoutError as FutureTimeout
+from bluetooth_manager import BluetoothManager
+from device_registry import DeviceRegistry
+from event_loop import EventLoop
+
+
+class SlowTransport:
+    """Records writes; each write takes a little while so commands pile up."""
+
+    instances = []
+
+    def __init__(self, logger, address):
+        self.address = address
+        self.connected = False
+        self.connects = 0
+        self.writes = []
+        self.first_write = threading.Event()
+        SlowTransport.instances.append(self)
+
+    @staticmethod
+    async def discover(logger):
+        return [('TEST_ADDR', 'CHROMA_ESP32')]
+
+    async def connect(self):
+        self.connects += 1
+        self.connected = True
+
+    async def write(self, data):
+        self.first_write.set()
+        await asyncio.sleep(0.05)
+        self.writes.append(data.decode().strip())
+
+    async def close(self):
+        self.connected = False
+
+
+def test_submit_timeout_and_cancel():
+    loop = EventLoop(name='test-loop').start()
+    try:
+        assert loop.submit(asyncio.sleep(0, result=42)).result(1) == 42
+        try:
+            loop.submit(asyncio.sleep(5), timeout=0.05).result(1)
+            assert False, "expected a timeout"
+        except (asyncio.TimeoutError, FutureTimeout):
+            pass
+        fired = threading.Event()
+        timer = loop.call_later(0.05, fired.set)
+        timer.cancel()
+        time.sleep(0.1)
+        assert not fired.is_set()
+    finally:
+        loop.stop()
+    assert not loop.running
+
+
+def test_bluetooth_writer_coalesces_on_one_session():
+    loop = EventLoop(name='test-bt').start()
+    cache = tempfile.TemporaryDirectory()
+    logger = logging.getLogger('test')
+    manager = BluetoothManager(logger, loop=loop)
+    manager.bluetooth_available = True
+    manager._create_registry = lambda: DeviceRegistry(logger, SlowTransport, os.path.join(cache.name, 'bt.json'))
+    try:
+        manager.send_vibration_command('RED')
+        deadline = time.monotonic() + 1
+        while not SlowTransport.instances and time.monotonic() < deadline:
+            time.sleep(0.01)
+        transport = SlowTransport.instances[-1]
+        assert transport.first_write.wait(1)
+        for command in ['YELLOW', 'GREEN', 'RED', 'VIB_OFF', 'VIB_ON']:
+            manager.send_vibration_command(command)
+        deadline = time.monotonic() + 2
+        while len(transport.writes) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The burst is coalesced per slot and sent as one write
+        assert transport.writes == ['RED', 'RED\nVIB_ON']
+        assert transport.connects == 1
+        assert manager.last_vibration_color == 'RED'
+        manager.close()
+        assert not transport.connected
+    finally:
+        loop.stop()
+        cache.cleanup()
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
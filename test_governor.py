@@ -0,0 +1,136 @@
+"""
+Test script for the adaptive rate/resolution governor.
+Feeds scripted detections and latencies with a fake clock and checks that
+the capture rate drops without lights, rises for close or changing lights,
+and that the input size steps down while inference is over budget, also
+when a tracker answers most frames without the model.
+"""
+
+import sys
+import os
+import logging
+from contextlib import contextmanager
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+import governor
+from config import FPS, FPS_MIN, FPS_MAX, GOVERNOR_IDLE_AFTER, GOVERNOR_ACTIVE_HOLD, GOVERNOR_COOLDOWN_FRAMES
+from fakes import RED, RED_BOX, FakeClock, FakeDetector, make_frame
+from tracker import TrafficLightTracker
+
+FRAME_SHAPE = (480, 640, 3)
+FAR_RED = {'color': 'Red', 'confidence': 0.9, 'bbox': (300, 180, 310, 200)}
+FAR_GREEN = dict(FAR_RED, color='Green')
+NEAR_RED = {'color': 'Red', 'confidence': 0.9, 'bbox': (250, 100, 350, 300)}
+
+
+@contextmanager
+def headroom(cpu_load=0.1, temperature=40.0):
+    """Pretend the device reports this load and temperature."""
+    saved = governor.read_cpu_load, governor.read_temperature
+    governor.read_cpu_load, governor.read_temperature = lambda: cpu_load, lambda: temperature
+    try:
+        yield
+    finally:
+        governor.read_cpu_load, governor.read_temperature = saved
+
+
+def make_governor(detector=None, **kwargs):
+    detector, clock = detector or FakeDetector(), FakeClock()
+    return governor.AdaptiveGovernor(detector, logging.getLogger('test'), **kwargs), detector, clock
+
+
+def observe(gov, clock, detections, inference_ms=20.0, seconds=0.1):
+    gov.observe(detections, FRAME_SHAPE, inference_ms, now=clock())
+    clock.now += seconds
+
+
+def test_rate_drops_without_lights():
+    with headroom():
+        gov, _, clock = make_governor()
+        assert gov.fps == FPS
+        observe(gov, clock, [])
+        assert gov.fps == FPS_MIN
+        observe(gov, clock, [FAR_RED])
+        assert gov.fps == FPS
+        # Stays up for a while after the light goes out of view
+        observe(gov, clock, [], seconds=GOVERNOR_IDLE_AFTER - 1)
+        observe(gov, clock, [])
+        assert gov.fps == FPS
+        clock.now += 1
+        observe(gov, clock, [])
+        assert gov.fps == FPS_MIN
+
+
+def test_rate_rises_for_near_or_changing_lights():
+    with headroom():
+        gov, _, clock = make_governor()
+        observe(gov, clock, [NEAR_RED])
+        assert gov.fps == FPS_MAX
+        clock.now += GOVERNOR_ACTIVE_HOLD
+        observe(gov, clock, [FAR_RED])
+        assert gov.fps == FPS
+        observe(gov, clock, [FAR_GREEN])
+        assert gov.fps == FPS_MAX
+
+
+def test_throttling_caps_the_rate():
+    with headroom(temperature=90.0):
+        gov, _, clock = make_governor()
+        observe(gov, clock, [NEAR_RED])
+        assert gov.throttled and gov.fps == FPS
+
+
+def test_input_size_follows_latency_budget():
+    with headroom():
+        gov, detector, clock = make_governor(latency_budget_ms=50, imgsz_options=[320, 416, 640])
+        assert gov.imgsz == 640
+        for _ in range(GOVERNOR_COOLDOWN_FRAMES - 1):
+            observe(gov, clock, [FAR_RED], inference_ms=80)
+        # Nothing changes before the cooldown is over
+        assert gov.imgsz == 640
+        observe(gov, clock, [FAR_RED], inference_ms=80)
+        assert gov.imgsz == detector.imgsz == 416
+        for _ in range(GOVERNOR_COOLDOWN_FRAMES):
+            observe(gov, clock, [FAR_RED], inference_ms=80)
+        assert gov.imgsz == 320
+        # Smallest size reached: stays there however slow it gets
+        for _ in range(GOVERNOR_COOLDOWN_FRAMES):
+            observe(gov, clock, [FAR_RED], inference_ms=80)
+        assert gov.imgsz == 320
+        # Plenty of headroom: steps back up
+        for _ in range(GOVERNOR_COOLDOWN_FRAMES):
+            observe(gov, clock, [FAR_RED], inference_ms=10)
+        assert gov.imgsz == 416
+
+
+def test_tracked_frames_do_not_hide_a_slow_model():
+    with headroom():
+        detector = FakeDetector(box=RED_BOX)
+        detector.last_call_ms = 120.0
+        tracker = TrafficLightTracker(detector, logging.getLogger('test'), detect_interval=5)
+        gov, _, clock = make_governor(detector, latency_budget_ms=50, imgsz_options=[320, 416, 640])
+        frame = make_frame(RED)
+        for _ in range(6 * GOVERNOR_COOLDOWN_FRAMES):
+            gov.observe(tracker.detect_traffic_lights(frame), frame.shape, now=clock())
+            clock.now += 0.1
+        # Five of every six frames are tracked in no time; the model still takes 120 ms
+        assert detector.model_calls == GOVERNOR_COOLDOWN_FRAMES
+        assert gov.imgsz == detector.imgsz == 416
+
+
+def test_boost_holds_max_rate():
+    with headroom():
+        gov, _, clock = make_governor()
+        gov.boost(clock())
+        assert gov.fps == FPS_MAX
+        observe(gov, clock, [], seconds=GOVERNOR_ACTIVE_HOLD)
+        assert gov.fps == FPS_MAX
+        observe(gov, clock, [])
+        assert gov.fps == FPS_MIN
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,71 @@
+"""
+Test script for the binary haptic protocol.
+Round-trips packets through the encoder and decoder, and through the mock
+Bluetooth socket in loopback.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+import mock_bluetooth as bluetooth
+from haptic_protocol import (Command, PacketEncoder, ProtocolError, decode_packet, encode_packet,
+                             is_packet, MAX_PACKET_SIZE)
+
+
+def test_round_trip():
+    data = encode_packet([Command('RED', 255, 400), Command('VIB_ON')], seq=7)
+    assert data == bytes([0x12, 0x07, 0x81, 0xFF, 0x28, 0x10])
+    assert is_packet(data) and not is_packet(b'RED\n')
+    packet = decode_packet(data)
+    assert packet.seq == 7
+    assert packet.commands == [Command('RED', 255, 400), Command('VIB_ON')]
+
+
+def test_malformed_packets_are_rejected():
+    for data in [b'\x11', b'\x21\x00\x01', b'\x12\x00\x01', b'\x11\x00\x55', b'\x11\x00\x01\x02']:
+        try:
+            decode_packet(data)
+            assert False, f"{data!r} should not decode"
+        except ProtocolError:
+            pass
+    try:
+        encode_packet([Command('RED', 300)], 0)
+        assert False, "intensity 300 should not encode"
+    except ProtocolError:
+        pass
+
+
+def test_encoder_numbers_and_splits_batches():
+    encoder = PacketEncoder({'RED': (255, 400)})
+    encoder.seq = 255
+    packets = encoder.encode(['RED', 'VIB_OFF'])
+    assert [seq for seq, _ in packets] == [255]
+    assert encoder.seq == 0  # wraps after 255
+
+    # Too many parameterized commands for one write are split across packets
+    encoder = PacketEncoder({name: (200, 100) for name in ('RED', 'GREEN')})
+    packets = encoder.encode(['RED', 'GREEN'] * 4)
+    assert len(packets) > 1
+    assert all(len(data) <= MAX_PACKET_SIZE for _, data in packets)
+    assert sum(len(decode_packet(data).commands) for _, data in packets) == 8
+
+
+def test_mock_loopback():
+    sock = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
+    sock.connect(('MOCK_CHROMA_ADDR', 1))
+    for seq, data in PacketEncoder().encode(['GREEN', 'VIB_ON']):
+        sock.send(data)
+        ack = decode_packet(sock.recv())
+        assert ack.seq == seq and ack.commands[0].name == 'ACK'
+    assert [c.name for c in sock.received[0].commands] == ['GREEN', 'VIB_ON']
+    sock.settimeout(0.01)
+    assert sock.recv() == b''
+    sock.close()
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,100 @@
+"""
+Test script for the NumPy pre- and post-processing of the ONNX backend.
+Checks NMS on synthetic boxes, class-aware suppression in the YOLOv8 output
+decoding, and that letterboxed coordinates map back to the original frame.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+import numpy as np
+from inference_backends import letterbox, preprocess_batch, non_max_suppression, postprocess
+
+NUM_CLASSES = 4
+
+
+def raw_output(anchors):
+    """YOLOv8-style (1, 4 + classes, anchors) output from (cx, cy, w, h, cls, score) rows in input pixels."""
+    output = np.zeros((1, 4 + NUM_CLASSES, len(anchors)), dtype=np.float32)
+    for i, (cx, cy, w, h, cls, score) in enumerate(anchors):
+        output[0, :4, i] = (cx, cy, w, h)
+        output[0, 4 + cls, i] = score
+    return output
+
+
+def to_input(box, scale, pad):
+    """xyxy box in frame pixels -> (cx, cy, w, h) in letterboxed input pixels."""
+    x1, y1, x2, y2 = np.asarray(box, dtype=np.float32) * scale + (pad[0], pad[1], pad[0], pad[1])
+    return (x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1
+
+
+def test_nms_suppresses_overlapping_boxes():
+    boxes = np.array([[10, 10, 50, 90], [12, 12, 52, 92], [200, 10, 240, 90]], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7], dtype=np.float32)
+    keep = non_max_suppression(boxes, scores, 0.45)
+    # The weaker of the two overlapping boxes goes, the separate one stays
+    assert list(keep) == [1, 2]
+    # Below the IoU threshold nothing is suppressed
+    assert sorted(non_max_suppression(boxes, scores, 0.99)) == [0, 1, 2]
+    assert len(non_max_suppression(np.zeros((0, 4), dtype=np.float32), np.zeros(0), 0.45)) == 0
+
+
+def test_letterbox_pads_to_square_and_keeps_aspect():
+    frame = np.full((480, 640, 3), 200, dtype=np.uint8)
+    image, scale, (pad_x, pad_y) = letterbox(frame, 320)
+    assert image.shape == (320, 320, 3)
+    assert scale == 0.5 and (pad_x, pad_y) == (0, 40)
+    assert (image[:pad_y] == 114).all() and (image[-pad_y:] == 114).all()
+    assert (image[pad_y:320 - pad_y] == 200).all()
+
+
+def test_preprocess_is_normalized_rgb_nchw():
+    frame = np.zeros((32, 32, 3), dtype=np.uint8)
+    frame[:, :, 2] = 255  # red in BGR
+    batch, metas = preprocess_batch([frame], 32)
+    assert batch.shape == (1, 3, 32, 32) and batch.dtype == np.float32
+    assert batch[0, 0].min() == 1.0 and batch[0, 2].max() == 0.0
+    assert metas == [(1.0, (0, 0), (32, 32))]
+
+
+def test_postprocess_maps_boxes_back_to_the_frame():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    _, metas = preprocess_batch([frame], 320)
+    scale, pad, _ = metas[0]
+    box = (300, 180, 340, 260)
+    output = raw_output([(*to_input(box, scale, pad), 0, 0.9),
+                         (*to_input((0, 0, 20, 20), scale, pad), 1, 0.3)])
+    detections = postprocess(output, metas, conf_threshold=0.5)[0]
+    # The low-confidence anchor is dropped, the other one comes back in frame pixels
+    assert detections.shape == (1, 6)
+    assert np.allclose(detections[0, :4], box, atol=1e-3)
+    assert np.isclose(detections[0, 4], 0.9) and detections[0, 5] == 0
+
+
+def test_postprocess_nms_is_class_aware():
+    frame = np.zeros((320, 320, 3), dtype=np.uint8)
+    _, metas = preprocess_batch([frame], 320)
+    output = raw_output([(100, 100, 40, 80, 0, 0.9),  # Red
+                         (102, 101, 40, 80, 0, 0.8),  # Red, same light
+                         (101, 100, 40, 80, 1, 0.85)])  # Green on top of it
+    detections = postprocess(output, metas, conf_threshold=0.5)[0]
+    # Same-class duplicates collapse, a different class in the same place survives
+    assert sorted(detections[:, 5].tolist()) == [0, 1]
+    assert np.isclose(detections[detections[:, 5] == 0][0, 4], 0.9)
+
+
+def test_postprocess_clips_to_the_frame():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    _, metas = preprocess_batch([frame], 640)
+    scale, pad, _ = metas[0]
+    cx, cy, w, h = to_input((620, 460, 660, 500), scale, pad)
+    detections = postprocess(raw_output([(cx, cy, w, h, 3, 0.9)]), metas, conf_threshold=0.5)[0]
+    assert detections[0, 2] == 640 and detections[0, 3] == 480
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
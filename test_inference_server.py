@@ -0,0 +1,205 @@
+"""
+Test script for the process-pool inference server.
+Runs two synthetic streams through two worker processes with a stand-in
+detector and checks every frame is routed back to the right stream's state,
+in frame order for files, that frames held by a worker that dies go to
+another one, and that each stream gets its own color gate.
+"""
+
+import sys
+import os
+import functools
+import logging
+import tempfile
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+import time
+import numpy as np
+from config import CLASS_NAMES
+from inference_server import InferenceServer, SharedFrameSlots, StreamDetectors
+from light_state import LightStateTracker
+
+
+class ColorDetector:
+    """Reports one Red or Green light depending on the frame's dominant channel."""
+
+    model = True
+    class_names = CLASS_NAMES
+
+    def detect_batch(self, frames):
+        results = []
+        for frame in frames:
+            cls = 0 if frame[:, :, 2].mean() > frame[:, :, 1].mean() else 1  # Red / Green
+            results.append(np.array([[10, 10, 30, 50, 0.9, cls]], dtype=np.float32))
+        return results
+
+
+def make_color_detector():
+    return ColorDetector()
+
+
+class CrashingDetector(ColorDetector):
+    """Kills its worker process on a frame with a blue channel, once per marker file or always without one."""
+
+    def __init__(self, marker):
+        self.marker = marker
+
+    def detect_batch(self, frames):
+        if frames[0][:, :, 0].mean() > 0 and not (self.marker and os.path.exists(self.marker)):
+            if self.marker:
+                open(self.marker, 'w').close()
+            os._exit(3)
+        return super().detect_batch(frames)
+
+
+def make_crashing_detector(marker=None):
+    return CrashingDetector(marker)
+
+
+class IndexDetector(ColorDetector):
+    """Reports the index stamped in a frame's first pixel as the box's x1, and is slow on even frames."""
+
+    def detect_batch(self, frames):
+        index = int(frames[0][0, 0, 0])
+        if index % 2 == 0:
+            # Lets the other worker overtake, so results come back out of order
+            time.sleep(0.03)
+        boxes = super().detect_batch(frames)
+        boxes[0][0, 0] = index
+        return boxes
+
+
+def make_index_detector():
+    return IndexDetector()
+
+
+class RoutedFrames(LightStateTracker):
+    """Light state that records the frame index of every result applied to it."""
+
+    def __init__(self):
+        super().__init__()
+        self.frames = []
+
+    def update(self, detections, now):
+        self.frames.append(int(detections[0]['bbox'][0]))
+        return super().update(detections, now)
+
+
+class ListSource:
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+
+def solid(bgr, count):
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[:] = bgr
+    return [frame] * count
+
+
+def test_streams_are_routed_independently():
+    decisions = []
+    server = InferenceServer(logging.getLogger('test'), workers=2, detector_factory=make_color_detector,
+                             on_decision=lambda stream, state, frame: decisions.append((stream, state)), gate=False)
+    server.add_stream('a', ListSource(solid((0, 0, 255), 15) + solid((0, 255, 0), 15)), drop_frames=False)
+    server.add_stream('b', ListSource(solid((0, 255, 0), 20)), drop_frames=False)
+    try:
+        server.start()
+        assert server.wait(timeout=30)
+    finally:
+        server.stop()
+    stats = server.stats()
+    assert stats['a']['frames'] == 30 and stats['b']['frames'] == 20
+    assert stats['a']['state'] == 'GREEN' and stats['b']['state'] == 'GREEN'
+    assert [state for stream, state in decisions if stream == 'a'] == ['RED', 'GREEN']
+    assert [state for stream, state in decisions if stream == 'b'] == ['GREEN']
+
+
+def test_file_results_are_routed_in_frame_order():
+    frames = solid((0, 0, 255), 15) + solid((0, 255, 0), 15)
+    for index, frame in enumerate(frames):
+        frames[index] = frame.copy()
+        frames[index][0, 0, 0] = index
+    server = InferenceServer(logging.getLogger('test'), workers=2, detector_factory=make_index_detector, gate=False)
+    server.add_stream('a', ListSource(frames), drop_frames=False)
+    routed = server.streams['a'].light_state = RoutedFrames()
+    try:
+        server.start()
+        assert server.wait(timeout=30)
+    finally:
+        server.stop()
+    # Every frame reaches the light state once, in order, whichever worker finished first
+    assert routed.frames == list(range(30))
+    assert routed.transitions == 2 and routed.state == 'GREEN'
+
+
+def test_frames_of_a_dead_worker_are_requeued():
+    with tempfile.TemporaryDirectory() as directory:
+        factory = functools.partial(make_crashing_detector, os.path.join(directory, 'crashed'))
+        server = InferenceServer(logging.getLogger('test'), workers=2, detector_factory=factory, gate=False)
+        frames = solid((0, 0, 255), 10) + solid((255, 0, 255), 1) + solid((0, 0, 255), 9)
+        server.add_stream('a', ListSource(frames), drop_frames=False)
+        try:
+            server.start()
+            assert server.wait(timeout=30)
+        finally:
+            server.stop()
+    stats = server.stats()['a']
+    assert stats['frames'] == 20 and stats['state'] == 'RED'
+
+
+def test_wait_raises_when_every_worker_died():
+    server = InferenceServer(logging.getLogger('test'), workers=1, detector_factory=make_crashing_detector, gate=False)
+    server.add_stream('a', ListSource(solid((0, 0, 255), 5) + solid((255, 0, 255), 1) + solid((0, 0, 255), 5)),
+                      drop_frames=False)
+    try:
+        server.start()
+        try:
+            server.wait(timeout=30)
+            assert False, 'wait() should fail once no worker is left'
+        except RuntimeError:
+            pass
+        deadline = time.monotonic() + 5
+        while not server.streams['a'].finished and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The frames the worker held and the one the capture thread could not send gave their slots back
+        slots = server.streams['a'].slots
+        assert [slots.acquire(0) for _ in range(server.slots_per_stream)].count(None) == 0
+    finally:
+        server.stop()
+
+
+def test_each_stream_gets_its_own_gate():
+    detectors = StreamDetectors(ColorDetector(), logging.getLogger('test'), gate=True)
+    a, b = detectors.get('a'), detectors.get('b')
+    assert a is not b and detectors.get('a') is a
+    assert a.detector is b.detector
+    # One stream's frames do not move the other's next full-frame check
+    a.detect_batch(solid((0, 0, 0), 3))
+    assert b.frames_since_full == b.force_interval
+    assert StreamDetectors(ColorDetector(), logging.getLogger('test'), gate=False).get('a').__class__ is ColorDetector
+
+
+def test_slots_are_exclusive():
+    slots = SharedFrameSlots((4, 4, 3), 2)
+    try:
+        first, second = slots.acquire(0), slots.acquire(0)
+        assert {first, second} == {0, 1}
+        assert slots.acquire(0) is None
+        slots.write(first, np.full((4, 4, 3), 7, dtype=np.uint8))
+        assert slots.views[first].mean() == 7
+        slots.release(first)
+        assert slots.acquire(0) == first
+    finally:
+        slots.close()
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,77 @@
+"""
+Test script for end-to-end latency measurement.
+Sends a traced command through BluetoothManager to the mock units in binary
+mode, with a simulated link delay, and checks every stage is measured.
+"""
+
+import sys
+import os
+import logging
+import subprocess
+import tempfile
+import time
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+import latency
+import mock_bluetooth
+from bluetooth_manager import BluetoothManager, MockTransport
+from device_registry import DeviceRegistry
+from event_loop import EventLoop
+from latency import LatencyTrace, report
+
+
+def test_trace_is_completed_by_echo():
+    directory = tempfile.TemporaryDirectory()
+    log_path = os.path.join(directory.name, 'latency.jsonl')
+    saved_path, saved_delay = latency.LATENCY.path, mock_bluetooth.SIMULATED_DELAY
+    latency.LATENCY.path = log_path
+    mock_bluetooth.SIMULATED_DELAY = 0.05
+    loop = EventLoop(name='test-latency').start()
+    logger = logging.getLogger('test')
+    manager = BluetoothManager(logger, loop=loop, protocol='binary')
+    manager.bluetooth_available = True
+    manager._create_registry = lambda: DeviceRegistry(logger, MockTransport, os.path.join(directory.name, 'bt.json'))
+    try:
+        now = time.monotonic()
+        trace = LatencyTrace('RED', onset=now - 0.2, captured=now - 0.1, inferred=now - 0.05, decided=now)
+        manager.send_vibration_command('RED', trace=trace)
+        deadline = time.monotonic() + 3
+        while trace.acked is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert trace.acked is not None and trace.seq == 0
+        stages = trace.stages_ms()
+        assert set(stages) == {'confirm', 'inference', 'handoff', 'queue', 'write', 'ack', 'total'}
+        assert stages['ack'] >= 40
+        assert abs(stages['confirm'] - 100) < 1
+        manager.close()
+    finally:
+        loop.stop()
+        latency.LATENCY.close()
+        latency.LATENCY.path, mock_bluetooth.SIMULATED_DELAY = saved_path, saved_delay
+
+    summary = report(log_path)
+    assert summary['total']['n'] == 1 and summary['ack']['p50'] >= 40
+    directory.cleanup()
+
+
+def test_partial_trace_stages():
+    trace = LatencyTrace('GREEN', onset=1.0, captured=1.2, inferred=1.25, decided=1.3)
+    stages = trace.stages_ms()
+    assert 'write' not in stages and 'ack' not in stages
+    assert abs(stages['total'] - 300) < 1e-6
+
+
+def test_report_needs_no_detector_stack():
+    code = "import sys, latency; print(sorted(m for m in ('cv2', 'detector', 'benchmark') if m in sys.modules))"
+    output = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]', output
+    assert latency.summarize([]) is None
+    assert latency.summarize([1.0, 2.0, 3.0])['p50'] == 2.0
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,74 @@
+"""
+Test script for the light state smoothing.
+Feeds synthetic detection sequences through LightStateTracker and checks
+which transitions reach the actuators and how quickly.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from light_state import LightStateTracker, select_primary
+
+
+def light(color, conf=0.9, bbox=(100, 100, 130, 180)):
+    return {'color': color, 'confidence': conf, 'bbox': bbox}
+
+
+def run(tracker, frames):
+    return [tracker.update(detections, now=i / 15) for i, detections in enumerate(frames)]
+
+
+def test_primary_light_is_largest_confident_box():
+    near = light('Red', 0.8, (0, 0, 60, 150))
+    far = light('Green', 0.9, (300, 10, 310, 35))
+    off = light('Off', 0.99, (0, 0, 200, 400))
+    assert select_primary([far, near, off]) is near
+    assert select_primary([off]) is None
+
+
+def test_single_transition_per_phase():
+    tracker = LightStateTracker()
+    transitions = run(tracker, [[light('Red')]] * 10)
+    assert [t for t in transitions if t] == ['RED']
+    assert tracker.state == 'RED'
+
+
+def test_one_frame_glitch_is_ignored():
+    tracker = LightStateTracker()
+    run(tracker, [[light('Red')]] * 8)
+    transitions = run(tracker, [[light('Green')]] + [[light('Red')]] * 5)
+    assert not any(transitions)
+    assert tracker.state == 'RED'
+
+
+def test_several_lights_send_one_state():
+    tracker = LightStateTracker()
+    frame = [light('Red', 0.9, (0, 0, 40, 100)), light('Yellow', 0.8, (200, 0, 210, 20)),
+             light('Green', 0.7, (300, 0, 305, 10))]
+    transitions = run(tracker, [frame] * 6)
+    assert [t for t in transitions if t] == ['RED']
+
+
+def test_color_change_latency():
+    tracker = LightStateTracker()
+    run(tracker, [[light('Red')]] * 8)
+    transitions = run(tracker, [[light('Green')]] * 8)
+    switched_at = next(i for i, t in enumerate(transitions) if t == 'GREEN')
+    # A full window of red must be outvoted, but within half a second at 15 FPS
+    assert switched_at <= 7
+    assert tracker.last_decision_latency is not None
+
+
+def test_lights_disappearing_turns_off():
+    tracker = LightStateTracker()
+    run(tracker, [[light('Yellow')]] * 8)
+    transitions = run(tracker, [[]] * 20)
+    assert [t for t in transitions if t] == ['OFF']
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
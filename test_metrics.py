@@ -0,0 +1,86 @@
+"""
+Test script for the telemetry subsystem.
+Checks metric recording and export, the local metrics endpoint, and that
+setup_logger does not stack handlers when called repeatedly.
+"""
+
+import sys
+import os
+import json
+import logging
+import urllib.request
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from metrics import MetricsRegistry, MetricsServer
+from logger import setup_logger
+
+
+def test_histogram_quantiles():
+    registry = MetricsRegistry()
+    hist = registry.histogram('inference_ms', buckets=(10, 20, 50, 100))
+    for value in [5] * 90 + [40] * 9 + [400]:
+        hist.observe(value)
+    snap = hist.snapshot()
+    assert snap['count'] == 100
+    assert snap['p50'] == 10  # upper bound of the bucket holding the quantile
+    assert snap['p95'] == 50
+    assert registry.histogram('small_ms', buckets=(10,)).quantile(0.5) is None
+    assert snap['max'] == 400
+    assert hist.quantile(1.0) == 400
+
+
+def test_registry_returns_same_metric():
+    registry = MetricsRegistry()
+    registry.counter('frames_total').inc()
+    registry.counter('frames_total').inc(2)
+    assert registry.snapshot()['frames_total'] == 3
+    try:
+        registry.gauge('frames_total')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Registering a counter name as a gauge should fail")
+
+
+def test_prometheus_export():
+    registry = MetricsRegistry()
+    registry.gauge('frame_queue_depth', 'Frames waiting').set(1)
+    hist = registry.histogram('capture_ms', buckets=(1, 10))
+    hist.observe(0.5)
+    hist.observe(5)
+    text = registry.to_prometheus()
+    assert '# TYPE frame_queue_depth gauge' in text
+    assert 'frame_queue_depth 1' in text
+    assert 'capture_ms_bucket{le="1"} 1' in text
+    assert 'capture_ms_bucket{le="10"} 2' in text
+    assert 'capture_ms_bucket{le="+Inf"} 2' in text
+    assert 'capture_ms_count 2' in text
+
+
+def test_metrics_endpoint():
+    registry = MetricsRegistry()
+    registry.counter('bluetooth_commands_sent_total').inc(4)
+    server = MetricsServer(0, registry).start()
+    try:
+        base = f'http://127.0.0.1:{server.port}'
+        with urllib.request.urlopen(base + '/metrics.json', timeout=5) as response:
+            assert json.load(response)['bluetooth_commands_sent_total'] == 4
+        with urllib.request.urlopen(base + '/metrics', timeout=5) as response:
+            assert b'bluetooth_commands_sent_total 4' in response.read()
+    finally:
+        server.stop()
+
+
+def test_setup_logger_is_idempotent():
+    first = setup_logger('metrics_test_logger', logging.WARNING)
+    second = setup_logger('metrics_test_logger', logging.DEBUG)
+    assert first is second
+    assert len(second.handlers) == 1
+    assert second.level == logging.DEBUG
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,89 @@
+"""
+Test script for the low-power watch mode.
+Checks that detection drops to watch mode after the idle time, that watch
+frames skip the model, that motion, new lamps and the periodic check wake it
+up, and that time is accounted per power state.
+"""
+
+import sys
+import os
+import logging
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from fakes import make_frame, make_layer
+from pipeline import FramePipeline
+from power import PowerManager
+
+
+def make_power(**kwargs):
+    woken = []
+    power, detector, clock = make_layer(PowerManager, idle_after=30, check_interval=10, on_wake=woken.append,
+                                        **kwargs)
+    return power, detector, clock, woken
+
+
+def idle_into_watch(power, clock, frame):
+    for _ in range(31):
+        power.detect_batch([frame])
+        clock.now += 1
+    assert power.watching
+
+
+def test_idle_enters_watch_and_skips_model():
+    power, detector, clock, _ = make_power()
+    frame = make_frame()
+    idle_into_watch(power, clock, frame)
+    calls = detector.frames
+    for _ in range(5):
+        assert len(power.detect_batch([frame])[0]) == 0
+        clock.now += 0.5
+    assert detector.frames == calls
+    report = power.report()
+    assert report['state'] == 'watch' and report['active'] == 30 and report['watch'] == 3
+
+
+def test_motion_wakes_detection():
+    power, detector, clock, woken = make_power()
+    idle_into_watch(power, clock, make_frame())
+    power.detect_batch([make_frame()])
+    calls = detector.frames
+    power.detect_batch([make_frame(shift=120)])
+    assert not power.watching and detector.frames == calls + 1
+    assert woken == [clock.now] and power.wakeups == 1
+
+
+def test_new_lamp_wakes_but_existing_lamp_does_not():
+    power, detector, clock, _ = make_power(wake_threshold=255)
+    idle_into_watch(power, clock, make_frame(lamps=[(500, 100)]))
+    power.detect_batch([make_frame(lamps=[(500, 100)])])
+    assert power.watching
+    power.detect_batch([make_frame(lamps=[(500, 100), (300, 80)])])
+    assert not power.watching
+
+
+def test_periodic_check_finds_light():
+    power, detector, clock, _ = make_power()
+    frame = make_frame()
+    idle_into_watch(power, clock, frame)
+    detector.box = [300, 180, 340, 260, 0.9, 0]
+    clock.now += 5
+    assert len(power.detect_batch([frame])[0]) == 0
+    clock.now += 6
+    calls = detector.frames
+    assert len(power.detect_batch([frame])[0]) == 1
+    # The check's result is used directly instead of running the model twice
+    assert not power.watching and detector.frames == calls + 1
+
+
+def test_pipeline_slows_capture_while_watching():
+    power, _, clock, _ = make_power()
+    pipeline = FramePipeline(None, power, logging.getLogger('test'), fps=15, power=power)
+    idle_into_watch(power, clock, make_frame())
+    assert pipeline.power.watching and power.watch_fps < pipeline.fps
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,76 @@
+"""
+Test script for recording and replay.
+Records synthetic frames into chunked files, plays them back and checks the
+frames, timestamps and decision log round-trip.
+"""
+
+import sys
+import os
+import json
+import logging
+import tempfile
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+import numpy as np
+from frame_source import FrameRecorder, ReplaySource, DecisionLog, iter_recording
+
+
+def make_frame(value):
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[:, :, 2] = value
+    return frame
+
+
+def test_record_and_replay_round_trip():
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = FrameRecorder(directory, logging.getLogger('test'), chunk_frames=4, queue_size=64)
+        for i in range(10):
+            recorder.record(make_frame(i * 20), 100.0 + i / 15)
+        recorder.close()
+
+        with open(os.path.join(directory, 'index.json')) as f:
+            index = json.load(f)
+        assert index['frames'] == 10
+        assert [chunk['frames'] for chunk in index['chunks']] == [4, 4, 2]
+
+        source = ReplaySource(directory, realtime=False)
+        timestamps = []
+        while True:
+            ret, frame = source.read()
+            if not ret:
+                break
+            assert frame.shape == (48, 64, 3)
+            # JPEG is lossy but a flat color survives within a few levels
+            assert abs(int(frame[:, :, 2].mean()) - len(timestamps) * 20) <= 3
+            timestamps.append(source.timestamp)
+        assert timestamps == [100.0 + i / 15 for i in range(10)]
+        assert not source.isOpened()
+
+
+def test_recorder_drops_instead_of_blocking():
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = FrameRecorder(directory, logging.getLogger('test'), queue_size=1)
+        for i in range(50):
+            recorder.record(make_frame(0), float(i))
+        recorder.close()
+        assert recorder.frames_written + recorder.frames_dropped == 50
+        assert len(list(iter_recording(directory))) == recorder.frames_written
+
+
+def test_decision_log():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'decisions.jsonl')
+        log = DecisionLog(path)
+        log.log('vibration', 'RED', frame=3)
+        log.log('audio', 'red', frame=3)
+        log.close()
+        with open(path) as f:
+            entries = [json.loads(line) for line in f]
+        assert [(e['event'], e['value'], e['frame']) for e in entries] == [('vibration', 'RED', 3), ('audio', 'red', 3)]
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,122 @@
+"""
+Test script for runtime settings.
+Checks validation, file and environment overrides, subscriber notification
+and live reload of the settings file from the event loop.
+"""
+
+import sys
+import os
+import gc
+import json
+import logging
+import tempfile
+import time
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from event_loop import EventLoop
+from settings import SettingsStore, SettingsError
+
+
+class Target:
+    pass
+
+
+def make_store(directory, overrides=None):
+    path = os.path.join(directory, 'settings.json')
+    if overrides is not None:
+        with open(path, 'w') as f:
+            json.dump(overrides, f)
+    return SettingsStore(path=path, env_prefix='TEST_TRAFFICLIGHT_')
+
+
+def test_validation_is_all_or_nothing():
+    with tempfile.TemporaryDirectory() as directory:
+        store = make_store(directory)
+        threshold = store['CONFIDENCE_THRESHOLD']
+        for bad in [{'CONFIDENCE_THRESHOLD': 1.5}, {'FPS': 'fast'}, {'FPS': True}, {'NOT_A_SETTING': 1},
+                    {'CONFIDENCE_THRESHOLD': 0.5, 'FPS_MIN': 40}]:
+            try:
+                store.update(bad)
+                raise AssertionError(f"{bad} was accepted")
+            except SettingsError:
+                pass
+        assert store['CONFIDENCE_THRESHOLD'] == threshold
+        assert store.set('FPS_MAX', 30) == {'FPS_MAX': 30}
+        assert store.set('FPS_MAX', 30) == {}
+
+
+def test_file_and_environment_overrides():
+    with tempfile.TemporaryDirectory() as directory:
+        store = make_store(directory, {'CONFIDENCE_THRESHOLD': 0.55, 'FPS': 10})
+        os.environ['TEST_TRAFFICLIGHT_FPS'] = '12'
+        try:
+            store.load()
+        finally:
+            del os.environ['TEST_TRAFFICLIGHT_FPS']
+        assert store['CONFIDENCE_THRESHOLD'] == 0.55
+        assert store['FPS'] == 12 and isinstance(store['FPS'], int)
+
+
+def test_subscribers_and_bind():
+    with tempfile.TemporaryDirectory() as directory:
+        store = make_store(directory)
+        seen = []
+        unsubscribe = store.subscribe(lambda name, value: seen.append((name, value)), 'IDLE_TIMEOUT')
+        target = Target()
+        store.bind(target, 'conf_threshold', 'CONFIDENCE_THRESHOLD')
+        store.update({'IDLE_TIMEOUT': 60, 'CONFIDENCE_THRESHOLD': 0.4})
+        assert seen == [('IDLE_TIMEOUT', 60.0)]
+        assert target.conf_threshold == 0.4
+        unsubscribe()
+        store.set('IDLE_TIMEOUT', 90)
+        assert len(seen) == 1
+
+        # Bound objects are not kept alive by the store
+        del target
+        gc.collect()
+        store.set('CONFIDENCE_THRESHOLD', 0.45)
+        assert len(store._subscribers) == 0
+
+
+def test_file_changes_are_reloaded():
+    with tempfile.TemporaryDirectory() as directory:
+        store = make_store(directory, {'CONFIDENCE_THRESHOLD': 0.6})
+        store.load()
+        target = Target()
+        store.bind(target, 'conf_threshold', 'CONFIDENCE_THRESHOLD')
+        loop = EventLoop(name='test-settings').start()
+        try:
+            store.watch(logging.getLogger('test'), loop=loop, interval=0.02)
+
+            def rewrite(values):
+                with open(store.path, 'w') as f:
+                    json.dump(values, f)
+                # Make sure the modification time moves even on coarse filesystems
+                stat = os.stat(store.path)
+                os.utime(store.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+            def wait_for(condition):
+                deadline = time.monotonic() + 2
+                while not condition() and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                return condition()
+
+            rewrite({'CONFIDENCE_THRESHOLD': 0.35})
+            assert wait_for(lambda: target.conf_threshold == 0.35)
+
+            # An invalid edit keeps the last good values
+            rewrite({'CONFIDENCE_THRESHOLD': 7})
+            time.sleep(0.1)
+            assert target.conf_threshold == 0.35
+            rewrite({'CONFIDENCE_THRESHOLD': 0.5})
+            assert wait_for(lambda: target.conf_threshold == 0.5)
+        finally:
+            store.stop_watching()
+            loop.stop()
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
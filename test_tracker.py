@@ -0,0 +1,84 @@
+"""
+Test script for the tracker between full detections.
+Checks that the model runs once every detect_interval tracked frames, that a
+light that moves a little is followed without it, and that a lost match or a
+color change brings a full detection back early.
+"""
+
+import sys
+import os
+import logging
+sys.path.append(os.path.dirname(__file__))  # Add current directory to path for imports
+
+from fakes import RED, GREEN, CLASS_IDS, RED_BOX, FakeDetector, make_frame
+from tracker import TrafficLightTracker
+
+
+def make_tracker(detect_interval=5):
+    detector = FakeDetector(box=RED_BOX)
+    return TrafficLightTracker(detector, logging.getLogger('test'), detect_interval=detect_interval), detector
+
+
+def full_detection_frames(tracker, detector, frames):
+    """Indices of the frames that went through the model."""
+    detected = []
+    for index, frame in enumerate(frames):
+        before = detector.frames
+        tracker.update(frame)
+        if detector.frames > before:
+            detected.append(index)
+    return detected
+
+
+def test_full_detection_every_interval():
+    tracker, detector = make_tracker(detect_interval=5)
+    frames = [make_frame(RED)] * 13
+    # Five tracked frames between keyframes
+    assert full_detection_frames(tracker, detector, frames) == [0, 6, 12]
+    assert tracker.full_detections == 3 and tracker.tracked_frames == 10
+
+
+def test_moving_light_is_followed():
+    tracker, detector = make_tracker()
+    tracker.update(make_frame(RED))
+    boxes = tracker.update(make_frame(RED, center=(324, 203)))
+    assert detector.frames == 1
+    assert list(boxes[0, :4]) == [304, 183, 344, 223]
+    # Confidence scales with the match score; a clean match keeps it
+    assert boxes[0, 4] > 0.85 and boxes[0, 5] == CLASS_IDS['Red']
+
+
+def test_lost_match_forces_detection():
+    tracker, detector = make_tracker()
+    frames = [make_frame(RED), make_frame(RED), make_frame(), make_frame(RED)]
+    # The lamp vanishing drops the match score below min_score on frame 2
+    assert full_detection_frames(tracker, detector, frames) == [0, 2]
+
+
+def test_color_change_reported_then_confirmed():
+    tracker, detector = make_tracker()
+    tracker.update(make_frame(RED))
+    boxes = tracker.update(make_frame(GREEN))
+    # The new color is reported straight away from the HSV check...
+    assert detector.frames == 1 and boxes[0, 5] == CLASS_IDS['Green']
+    # ...and the model confirms it on the next frame
+    tracker.update(make_frame(GREEN))
+    assert detector.frames == 2
+
+
+def test_reset_and_empty_scene_detect_every_frame():
+    tracker, detector = make_tracker()
+    tracker.update(make_frame(RED))
+    tracker.reset()
+    tracker.update(make_frame(RED))
+    assert detector.frames == 2
+    # Nothing to track: every frame is a full detection
+    detector.box = None
+    assert full_detection_frames(tracker, detector, [make_frame()] * 3) == [0, 1, 2]
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f"{name} PASSED")
@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+from config import (CLASS_NAMES, TRACKING_DETECT_INTERVAL, TRACKING_MIN_SCORE,
+                    TRACKING_SEARCH_MARGIN)
+from detector import detections_to_dicts, EMPTY_DETECTIONS
+from light_color import classify_light_color
+
+CLASS_IDS = {name: cls for cls, name in CLASS_NAMES.items()}
+
+
+class Track:
+    """A traffic light followed between full detections."""
+
+    def __init__(self, box, template):
+        self.box = box  # x1, y1, x2, y2, conf, cls
+        self.template = template
+
+
+class TrafficLightTracker:
+    """Runs full-frame detection every few frames and tracks lights in between.
+
+    Between keyframes each known light is located again by template matching
+    in a small window around its last position, and its color is re-read from
+    the cropped box with an HSV classifier. A full detection is forced when a
+    match gets weak, a light's color changes, or no lights are being tracked.
+    Exposes the same detect_traffic_lights/detect_batch interface as
+    TrafficLightDetector so it can be dropped into the frame pipeline.
+    """
+
+    def __init__(self, detector, logger, detect_interval=TRACKING_DETECT_INTERVAL,
+                 min_score=TRACKING_MIN_SCORE, search_margin=TRACKING_SEARCH_MARGIN):
+        self.detector = detector
+        self.logger = logger
+        self.detect_interval = detect_interval
+        self.min_score = min_score
+        self.search_margin = search_margin
+        self.tracks = []
+        self.frames_since_detection = 0
+        self.force_detection = True
+        self.full_detections = 0
+        self.tracked_frames = 0
+
+    @property
+    def model(self):
+        return self.detector.model
+
+    @property
+    def class_names(self):
+        return self.detector.class_names
+
+    def reset(self):
+        self.tracks = []
+        self.force_detection = True
+
+    def detect_traffic_lights(self, frame):
+        return detections_to_dicts(self.update(frame), self.class_names)
+
+    def detect_batch(self, frames):
+        return [self.update(frame) for frame in frames]
+
+    def update(self, frame):
+        """Return the N x 6 detections for this frame, detecting or tracking as needed."""
+        if (self.force_detection or not self.tracks
+                or self.frames_since_detection >= self.detect_interval):
+            return self._detect(frame)
+        boxes = self._track(frame)
+        if boxes is None:
+            return self._detect(frame)
+        self.frames_since_detection += 1
+        self.tracked_frames += 1
+        return boxes
+
+    def _detect(self, frame):
+        boxes = self.detector.detect_batch([frame])[0]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.tracks = []
+        for box in boxes:
+            x1, y1, x2, y2 = self._clip(box[:4], frame.shape)
+            if x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            self.tracks.append(Track(box.copy(), gray[y1:y2, x1:x2].copy()))
+        self.frames_since_detection = 0
+        self.force_detection = False
+        self.full_detections += 1
+        return boxes
+
+    def _track(self, frame):
+        """Follow every track in a small search window. Returns None if any is lost."""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        boxes = np.empty((len(self.tracks), 6), dtype=np.float32)
+        for i, track in enumerate(self.tracks):
+            x1, y1, x2, y2 = track.box[:4]
+            mx = (x2 - x1) * self.search_margin
+            my = (y2 - y1) * self.search_margin
+            sx1, sy1, sx2, sy2 = self._clip((x1 - mx, y1 - my, x2 + mx, y2 + my), frame.shape)
+            window = gray[sy1:sy2, sx1:sx2]
+            th, tw = track.template.shape
+            if window.shape[0] < th or window.shape[1] < tw:
+                return None
+            scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+            if score < self.min_score:
+                self.logger.debug("Track lost (score %.2f), running full detection", score)
+                return None
+
+            nx1, ny1 = sx1 + dx, sy1 + dy
+            track.box[:4] = (nx1, ny1, nx1 + tw, ny1 + th)
+            color, _ = classify_light_color(frame[ny1:ny1 + th, nx1:nx1 + tw])
+            cls = CLASS_IDS.get(color, int(track.box[5]))
+            if cls != int(track.box[5]):
+                # Color change: report it now and confirm with the model next frame
+                track.box[5] = cls
+                self.force_detection = True
+            boxes[i] = track.box
+            boxes[i, 4] = track.box[4] * score
+        return boxes if len(boxes) else EMPTY_DETECTIONS
+
+    @staticmethod
+    def _clip(box, shape):
+        h, w = shape[:2]
+        x1, y1, x2, y2 = box
+        return (int(max(0, min(w, x1))), int(max(0, min(h, y1))),
+                int(max(0, min(w, x2))), int(max(0, min(h, y2))))